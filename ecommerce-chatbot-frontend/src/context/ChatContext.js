@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useState } from 'react';
-import api from '../services/api';
+import api, { streamChatMessage } from '../services/api';
 import { v4 as uuidv4 } from 'uuid';
 
 const ChatContext = createContext();
@@ -15,6 +15,7 @@ export const useChat = () => {
 export const ChatProvider = ({ children }) => {
   const [currentSession, setCurrentSession] = useState(null);
   const [messages, setMessages] = useState([]);
+  const [previousCursor, setPreviousCursor] = useState(null);
   const [sessions, setSessions] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
@@ -22,6 +23,7 @@ export const ChatProvider = ({ children }) => {
   const createNewSession = () => {
     setCurrentSession(null);
     setMessages([]);
+    setPreviousCursor(null);
     setError(null);
   };
 
@@ -39,19 +41,39 @@ export const ChatProvider = ({ children }) => {
     setLoading(true);
     setError(null);
 
+    // The reply streams in: intent first, then text chunks, then product cards
+    const botId = uuidv4();
+    const updateBotMessage = (update) => {
+      setMessages(prev => prev.map(msg => (msg.id === botId ? update(msg) : msg)));
+    };
+
     try {
-      const response = await api.post('/chatbot/message/', {
-        message,
-        session_id: currentSession?.session_id
+      let sessionId = currentSession?.session_id;
+      await streamChatMessage({ message, session_id: sessionId }, (event, data) => {
+        if (event === 'intent') {
+          sessionId = data.session_id;
+          setMessages(prev => [...prev, {
+            id: botId,
+            message_type: 'bot',
+            content: '',
+            metadata: { intent: data.intent, products: [] },
+            timestamp: new Date().toISOString()
+          }]);
+        } else if (event === 'message') {
+          updateBotMessage(msg => ({ ...msg, content: msg.content + data.delta }));
+        } else if (event === 'product') {
+          updateBotMessage(msg => ({
+            ...msg,
+            metadata: { ...msg.metadata, products: [...msg.metadata.products, data] }
+          }));
+        } else if (event === 'error') {
+          updateBotMessage(msg => ({ ...msg, content: data.detail }));
+        }
       });
-
-      const { session_id, bot_response } = response.data;
       
       if (!currentSession) {
-        setCurrentSession({ session_id });
+        setCurrentSession({ session_id: sessionId });
       }
-
-      setMessages(prev => [...prev, bot_response]);
       
       // Refresh sessions list
       await loadSessions();
@@ -87,6 +109,7 @@ export const ChatProvider = ({ children }) => {
       const response = await api.get(`/chatbot/sessions/${sessionId}/`);
       setCurrentSession(response.data);
       setMessages(response.data.messages || []);
+      setPreviousCursor(response.data.previous_cursor || null);
       setError(null);
     } catch (error) {
       setError('Failed to load chat session.');
@@ -96,6 +119,24 @@ export const ChatProvider = ({ children }) => {
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!currentSession || !previousCursor) return;
+    try {
+      setLoading(true);
+      const response = await api.get(`/chatbot/sessions/${currentSession.session_id}/messages/`, {
+        params: { before: previousCursor }
+      });
+      setMessages(prev => [...response.data.messages, ...prev]);
+      setPreviousCursor(response.data.previous_cursor);
+      setError(null);
+    } catch (error) {
+      setError('Failed to load earlier messages.');
+      console.error('Failed to load earlier messages:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const deleteSession = async (sessionId) => {
     try {
       await api.delete(`/chatbot/sessions/${sessionId}/delete/`);
@@ -120,6 +161,8 @@ export const ChatProvider = ({ children }) => {
     sendMessage,
     loadSessions,
     loadSession,
+    loadOlderMessages,
+    hasOlderMessages: Boolean(previousCursor),
     deleteSession,
     createNewSession
   };
@@ -15,6 +15,8 @@ const Chat = () => {
     sendMessage,
     loadSessions,
     loadSession,
+    loadOlderMessages,
+    hasOlderMessages,
     deleteSession,
     createNewSession
   } = useChat();
@@ -106,10 +108,10 @@ const Chat = () => {
                   onClick={() => handleSessionSelect(session.session_id)}
                 >
                   <div className="session-preview">
-                    {session.messages[0]?.content.substring(0, 50)}...
+                    {session.last_message ? `${session.last_message.substring(0, 50)}...` : 'New chat'}
                   </div>
                   <div className="session-meta">
-                    <span>{new Date(session.created_at).toLocaleDateString()}</span>
+                    <span>{new Date(session.last_activity || session.created_at).toLocaleDateString()}</span>
                     <button
                       onClick={(e) => handleDeleteSession(session.session_id, e)}
                       className="delete-session-btn"
@@ -165,7 +167,17 @@ const Chat = () => {
                 <p>How can I help you today?</p>
               </div>
             ) : (
-              messages.map((msg) => (
+              <>
+              {hasOlderMessages && (
+                <button
+                  onClick={loadOlderMessages}
+                  className="btn btn-secondary btn-sm"
+                  disabled={loading}
+                >
+                  Load earlier messages
+                </button>
+              )}
+              {messages.map((msg) => (
                 <div
                   key={msg.id}
                   className={`message ${msg.message_type}`}
@@ -196,7 +208,8 @@ const Chat = () => {
                     })}
                   </div>
                 </div>
-              ))
+              ))}
+              </>
             )}
             
             {loading && (
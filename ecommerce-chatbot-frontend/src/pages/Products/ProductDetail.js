@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';  // Added Link here
-import api from '../../services/api';
+import api, { assetUrl } from '../../services/api';
 import { toast } from 'react-toastify';
 import './ProductDetail.css';
 
@@ -60,7 +60,7 @@ const ProductDetail = () => {
           <div className="product-gallery">
             {product.image_url ? (
               <div className="main-image">
-                <img src={product.image_url} alt={product.name} />
+                <img src={assetUrl(product.image_url)} alt={product.name} />
               </div>
             ) : (
               <div className="main-image placeholder">
@@ -155,7 +155,7 @@ const ProductDetail = () => {
                 <div key={product.id} className="related-product-card">
                   <Link to={`/products/${product.id}`} className="related-product-image">
                     {product.image_url ? (
-                      <img src={product.image_url} alt={product.name} />
+                      <img src={assetUrl(product.thumbnail_url || product.image_url)} alt={product.name} />
                     ) : (
                       <div className="image-placeholder">
                         <span>🛍️</span>
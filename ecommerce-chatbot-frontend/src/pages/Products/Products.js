@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
-import api from '../../services/api';
+import api, { assetUrl } from '../../services/api';
 import { toast } from 'react-toastify';
 import './Products.css';
 
@@ -328,7 +328,7 @@ const Products = () => {
                   <div key={product.id} className="product-card">
                     <div className="product-image">
                       {product.image_url ? (
-                        <img src={product.image_url} alt={product.name} />
+                        <img src={assetUrl(product.thumbnail_url || product.image_url)} alt={product.name} />
                       ) : (
                         <div className="image-placeholder">
                           <span>🛍️</span>
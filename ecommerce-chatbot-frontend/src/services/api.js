@@ -24,6 +24,28 @@ api.interceptors.request.use(
   }
 );
 
+// Exchange the stored refresh token for a new access token; on failure clear the session and go to login
+const refreshAccessToken = async () => {
+  try {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (!refreshToken) {
+      return null;
+    }
+    const response = await axios.post(`${API_BASE_URL}/authentication/token/refresh/`, {
+      refresh: refreshToken,
+    });
+
+    const { access } = response.data;
+    localStorage.setItem('accessToken', access);
+    return access;
+  } catch (refreshError) {
+    localStorage.removeItem('accessToken');
+    localStorage.removeItem('refreshToken');
+    window.location.href = '/login';
+    throw refreshError;
+  }
+};
+
 // Response interceptor to handle token refresh
 api.interceptors.response.use(
   (response) => response,
@@ -33,24 +55,10 @@ api.interceptors.response.use(
     if (error.response?.status === 401 && !originalRequest._retry) {
       originalRequest._retry = true;
 
-      try {
-        const refreshToken = localStorage.getItem('refreshToken');
-        if (refreshToken) {
-          const response = await axios.post(`${API_BASE_URL}/authentication/token/refresh/`, {
-            refresh: refreshToken,
-          });
-
-          const { access } = response.data;
-          localStorage.setItem('accessToken', access);
-
-          originalRequest.headers.Authorization = `Bearer ${access}`;
-          return api(originalRequest);
-        }
-      } catch (refreshError) {
-        localStorage.removeItem('accessToken');
-        localStorage.removeItem('refreshToken');
-        window.location.href = '/login';
-        return Promise.reject(refreshError);
+      const access = await refreshAccessToken();
+      if (access) {
+        originalRequest.headers.Authorization = `Bearer ${access}`;
+        return api(originalRequest);
       }
     }
 
@@ -63,4 +71,49 @@ api.interceptors.response.use(
   }
 );
 
+// Product images are served by the API host; resolve relative asset URLs against it
+export const assetUrl = (url) => (url && url.startsWith('/') ? new URL(url, API_BASE_URL).href : url);
+
+// Send a chat message to the streaming endpoint, calling onEvent(name, data) for each SSE frame
+export const streamChatMessage = async (body, onEvent) => {
+  const send = (token) => fetch(`${API_BASE_URL}/chatbot/message/stream/`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Authorization: `Bearer ${token}`,
+    },
+    body: JSON.stringify(body),
+  });
+
+  // fetch bypasses the axios interceptors, so refresh an expired token and retry once here
+  let response = await send(localStorage.getItem('accessToken'));
+  if (response.status === 401) {
+    const access = await refreshAccessToken();
+    if (access) {
+      response = await send(access);
+    }
+  }
+  if (!response.ok || !response.body) {
+    throw new Error(`Chat stream failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    const frames = buffer.split('\n\n');
+    buffer = frames.pop();
+    frames.forEach((frame) => {
+      const event = frame.match(/^event: (.*)$/m);
+      const data = frame.match(/^data: (.*)$/m);
+      if (event && data) {
+        onEvent(event[1], JSON.parse(data[1]));
+      }
+    });
+  }
+};
+
 export default api;
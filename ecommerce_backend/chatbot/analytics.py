@@ -0,0 +1,211 @@
+"""Hourly intent and search analytics, folded incrementally from UserIntent.
+
+Each run reads only the UserIntent rows after the ``intents`` watermark,
+adds them to the hourly ``IntentRollup`` and ``SearchTermRollup`` rows and
+moves the watermark, all in one transaction. The watermark is advanced
+with a compare-and-set, so a concurrent run that folded the same rows
+first makes this one roll back instead of counting them twice. Dashboards
+read the rollups only; their size depends on the time range, not on how
+many turns were logged.
+"""
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from products.models import Category
+from .models import AnalyticsWatermark, IntentRollup, SearchTermRollup, UserIntent
+from .persistence import retry_on_lock
+
+WATERMARK = 'intents'
+INTENT_COUNTERS = ('count', 'low_confidence_count', 'confidence_sum', 'search_count', 'zero_result_count')
+
+class WatermarkMoved(Exception):
+    """Another run folded the same rows first"""
+
+def truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+def price_band(price, edges=None) -> str:
+    """Label of the PRODUCT_FACET_PRICE_EDGES band a requested price falls in, e.g. '50-100' or '1000+'"""
+    edges = edges or settings.PRODUCT_FACET_PRICE_EDGES
+    index = bisect_left(edges, price)
+    if index == 0:
+        return f'0-{edges[0]}'
+    if index == len(edges):
+        return f'{edges[-1]}+'
+    return f'{edges[index - 1]}-{edges[index]}'
+
+def search_terms(parameters: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(dimension, value) pairs a turn asked for; the price band is that of the highest price named"""
+    terms = []
+    if parameters.get('brand'):
+        terms.append(('brand', str(parameters['brand'])[:100]))
+    if parameters.get('category') is not None:
+        terms.append(('category', str(parameters['category'])))
+    price = parameters.get('max_price', parameters.get('min_price'))
+    if isinstance(price, (int, float)):
+        terms.append(('price_band', price_band(price)))
+    return terms
+
+def aggregate(rows) -> Tuple[Dict, Counter]:
+    """Per-(hour, intent) counters and per-(hour, dimension, value) counts for a batch of intent rows"""
+    intents = defaultdict(lambda: dict.fromkeys(INTENT_COUNTERS, 0))
+    terms = Counter()
+    for created_at, intent_type, confidence, parameters, result_count in rows:
+        hour = truncate_hour(created_at)
+        counters = intents[hour, intent_type]
+        counters['count'] += 1
+        counters['confidence_sum'] += confidence
+        if confidence < settings.CHAT_ANALYTICS_LOW_CONFIDENCE:
+            counters['low_confidence_count'] += 1
+        if result_count is not None:
+            counters['search_count'] += 1
+            if result_count == 0:
+                counters['zero_result_count'] += 1
+        for dimension, value in search_terms(parameters or {}):
+            terms[hour, dimension, value] += 1
+    return intents, terms
+
+def merge_intents(intents: Dict):
+    existing = {
+        (rollup.hour, rollup.intent_type): rollup
+        for rollup in IntentRollup.objects.filter(hour__in={hour for hour, _ in intents})
+    }
+    created, updated = [], []
+    for key, counters in intents.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(IntentRollup(hour=key[0], intent_type=key[1], **counters))
+            continue
+        for name, value in counters.items():
+            setattr(rollup, name, getattr(rollup, name) + value)
+        updated.append(rollup)
+    IntentRollup.objects.bulk_create(created)
+    IntentRollup.objects.bulk_update(updated, INTENT_COUNTERS)
+
+def merge_terms(terms: Counter):
+    existing = {
+        (rollup.hour, rollup.dimension, rollup.value): rollup
+        for rollup in SearchTermRollup.objects.filter(hour__in={hour for hour, _, _ in terms})
+    }
+    created, updated = [], []
+    for key, count in terms.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(SearchTermRollup(hour=key[0], dimension=key[1], value=key[2], count=count))
+        else:
+            rollup.count += count
+            updated.append(rollup)
+    SearchTermRollup.objects.bulk_create(created)
+    SearchTermRollup.objects.bulk_update(updated, ['count'])
+
+def fold_batch(batch_size: int) -> int:
+    """Fold the next ``batch_size`` intents after the watermark; returns how many were folded"""
+    def fold():
+        with transaction.atomic():
+            watermark, _ = AnalyticsWatermark.objects.get_or_create(name=WATERMARK)
+            rows = list(
+                UserIntent.objects.filter(id__gt=watermark.last_id).order_by('id')
+                .values_list('id', 'created_at', 'intent_type', 'confidence', 'parameters', 'result_count')[:batch_size]
+            )
+            if not rows:
+                return 0
+            intents, terms = aggregate(row[1:] for row in rows)
+            merge_intents(intents)
+            merge_terms(terms)
+            moved = AnalyticsWatermark.objects.filter(name=WATERMARK, last_id=watermark.last_id).update(
+                last_id=rows[-1][0]
+            )
+            if not moved:
+                raise WatermarkMoved
+            return len(rows)
+    try:
+        return retry_on_lock(fold)
+    except WatermarkMoved:
+        return 0
+
+def fold_intents(batch_size: Optional[int] = None, max_batches: Optional[int] = None) -> int:
+    """Fold every new intent, or at most ``max_batches`` batches of them; returns how many were folded"""
+    batch_size = batch_size or settings.CHAT_ANALYTICS_BATCH_SIZE
+    total, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        folded = fold_batch(batch_size)
+        total += folded
+        batches += 1
+        if folded < batch_size:
+            break
+    return total
+
+def rate(part: int, whole: int) -> Optional[float]:
+    return round(part / whole, 4) if whole else None
+
+def dashboard(since, until, top: int = 10) -> Dict[str, Any]:
+    """Rollup figures for the hours in [since, until), read from the rollup tables only"""
+    intents = IntentRollup.objects.filter(hour__gte=truncate_hour(since), hour__lt=until)
+    by_intent = intents.values('intent_type').annotate(
+        turns=Sum('count'), low_confidence=Sum('low_confidence_count'), confidence=Sum('confidence_sum'),
+    ).order_by('-turns', 'intent_type')
+    hourly = intents.values('hour').annotate(
+        turns=Sum('count'), low_confidence=Sum('low_confidence_count'),
+        searches=Sum('search_count'), zero_results=Sum('zero_result_count'),
+    ).order_by('hour')
+    totals = intents.aggregate(
+        turns=Sum('count'), low_confidence=Sum('low_confidence_count'),
+        searches=Sum('search_count'), zero_results=Sum('zero_result_count'),
+    )
+    totals = {name: value or 0 for name, value in totals.items()}
+
+    terms = SearchTermRollup.objects.filter(hour__gte=truncate_hour(since), hour__lt=until)
+    ranked = defaultdict(list)
+    for row in terms.values('dimension', 'value').annotate(total=Sum('count')).order_by('dimension', '-total', 'value'):
+        ranked[row['dimension']].append((row['value'], row['total']))
+    category_ids = [int(value) for value, _ in ranked['category'][:top] if value.isdigit()]
+    category_names = dict(Category.objects.filter(id__in=category_ids).values_list('id', 'name'))
+    watermark = AnalyticsWatermark.objects.filter(name=WATERMARK).first()
+
+    return {
+        'since': truncate_hour(since),
+        'until': until,
+        'turns': totals['turns'],
+        'low_confidence_rate': rate(totals['low_confidence'], totals['turns']),
+        'searches': totals['searches'],
+        'zero_result_rate': rate(totals['zero_results'], totals['searches']),
+        'intents': [
+            {
+                'intent_type': row['intent_type'],
+                'count': row['turns'],
+                'low_confidence_rate': rate(row['low_confidence'], row['turns']),
+                'avg_confidence': round(row['confidence'] / row['turns'], 4) if row['turns'] else None,
+            }
+            for row in by_intent
+        ],
+        'hourly': [
+            {
+                'hour': row['hour'],
+                'turns': row['turns'],
+                'low_confidence_rate': rate(row['low_confidence'], row['turns']),
+                'searches': row['searches'],
+                'zero_result_rate': rate(row['zero_results'], row['searches']),
+            }
+            for row in hourly
+        ],
+        'top_brands': [{'brand': value, 'count': count} for value, count in ranked['brand'][:top]],
+        'top_categories': [
+            {'id': int(value), 'name': category_names.get(int(value)), 'count': count}
+            for value, count in ranked['category'][:top] if value.isdigit()
+        ],
+        'price_bands': sorted(
+            ({'band': value, 'count': count} for value, count in ranked['price_band']),
+            key=lambda band: float(band['band'].split('-')[0].rstrip('+')),
+        ),
+        'folded_through': watermark.last_id if watermark else 0,
+        'folded_at': watermark.updated_at if watermark else None,
+    }
+
+def default_window(now, hours: int = 24) -> Tuple[Any, Any]:
+    """The last ``hours`` whole hours plus the current one"""
+    until = truncate_hour(now) + timedelta(hours=1)
+    return until - timedelta(hours=hours + 1), until
@@ -0,0 +1,129 @@
+# Async chat endpoints for ASGI servers: plain coroutine views, since DRF views are sync-only.
+# Reads use the async ORM. Search is read-only and runs in a thread pool so concurrent turns search
+# in parallel; the transactional turn write still goes through the single thread-sensitive executor.
+# Every turn's write is serialized there, so on SQLite these endpoints do not beat the DRF ones on
+# throughput (bench_chat: about the same at 8-32 users, slower for a single user); they trade that
+# for flatter tail latency. The DRF endpoints stay the default.
+import json
+import uuid
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from authentication.authentication import AsyncJWTAuthentication
+from products.serializers import ProductFieldset
+from .context import Conversation
+from .models import ChatSession
+from .persistence import persist_turn
+from .serializers import ChatInputSerializer, ChatSessionSummarySerializer
+from .utils import ChatbotNLP
+from .views import (
+    archived_session_payload, generate_reply, message_page_payload, message_paginator, searches, session_summaries,
+    turn_payload,
+)
+
+authenticator = AsyncJWTAuthentication()
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+def async_api_view(methods):
+    """Method check, JWT authentication and DRF-style error responses for a coroutine view"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            try:
+                auth = await authenticator.aauthenticate(request)
+                if auth is None:
+                    return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+                request.user, request.auth = auth
+                return await view(request, *args, **kwargs)
+            except APIException as e:
+                return json_response(e.detail, status=e.status_code)
+            except ChatSession.DoesNotExist:
+                return json_response({'error': 'Chat session not found'}, status=404)
+        # Token-authenticated, so no CSRF cookie is involved
+        wrapped.csrf_exempt = True
+        return wrapped
+    return decorator
+
+def off_request_thread(func):
+    """``sync_to_async`` for read-only steps that may run in parallel with other requests.
+
+    Pool threads keep their own database connections, so they are released
+    the way a request's are when it finishes, honouring ``CONN_MAX_AGE``.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+def request_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise ValidationError({'detail': 'Malformed JSON body.'})
+
+@async_api_view(['POST'])
+async def chat_message(request):
+    """Process a chatbot message; async counterpart of ``views.chat_message``"""
+    serializer = ChatInputSerializer(data=request_json(request))
+    serializer.is_valid(raise_exception=True)
+
+    user_message = serializer.validated_data['message']
+    session_id = serializer.validated_data.get('session_id') or str(uuid.uuid4())
+    fieldset = ProductFieldset.from_params(serializer.validated_data, default='compact')
+
+    intent, confidence, turn_intent = 'other', 0.0, None
+    try:
+        parsed = await ChatbotNLP.aparse(user_message)
+        intent, confidence = parsed.intent, parsed.confidence
+        turn_intent = {'intent_type': intent, 'confidence': confidence, 'parameters': parsed.search_params}
+        conversation = Conversation(request.user, session_id)
+        if searches(parsed, conversation):
+            bot_response, bot_metadata = await off_request_thread(generate_reply)(parsed, fieldset, conversation)
+        else:
+            bot_response, bot_metadata = generate_reply(parsed, fieldset, conversation)
+    except Exception as e:
+        bot_response = "I'm experiencing some technical difficulties. Please try again in a moment."
+        bot_metadata = {'intent': 'error', 'error': str(e)}
+
+    chat_session, user_msg, bot_msg = await sync_to_async(persist_turn)(
+        request.user, session_id, user_message, bot_response, bot_metadata, intent=turn_intent
+    )
+    return json_response(turn_payload(chat_session, user_msg, bot_msg, intent, confidence))
+
+@async_api_view(['GET'])
+async def chat_sessions(request):
+    """Get the user's chat session summaries"""
+    sessions = session_summaries(request.user).filter(is_active=True).order_by('-updated_at')
+    rows = [session async for session in sessions]
+    return json_response({'sessions': ChatSessionSummarySerializer(rows, many=True).data})
+
+@async_api_view(['GET'])
+async def chat_session_detail(request, session_id):
+    """Get a chat session summary with its latest page of messages, or an archived session in full"""
+    session = await session_summaries(request.user).filter(session_id=session_id).afirst()
+    if session is None:
+        payload = await sync_to_async(archived_session_payload)(request.user, session_id)
+        if payload is None:
+            raise ChatSession.DoesNotExist
+        return json_response(payload)
+    paginator = message_paginator(request.GET)
+    page = await paginator.apaginate(session.messages.all(), request.GET.get('before'))
+    return json_response({**ChatSessionSummarySerializer(session).data, **message_page_payload(*page)})
+
+@async_api_view(['GET'])
+async def chat_session_messages(request, session_id):
+    """Page backward through a session's messages; pass ``before`` to fetch older ones"""
+    session = await ChatSession.objects.aget(session_id=session_id, user=request.user)
+    paginator = message_paginator(request.GET)
+    page = await paginator.apaginate(session.messages.all(), request.GET.get('before'))
+    return json_response(message_page_payload(*page))
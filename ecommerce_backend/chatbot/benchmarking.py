@@ -0,0 +1,110 @@
+"""API benchmark suite: the catalog and chat endpoints driven through the Django test client.
+
+Used by the ``bench_api`` management command, which seeds throwaway
+databases at several catalog sizes, and by the ``benchmark``-tagged test.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import Client
+from rest_framework_simplejwt.tokens import RefreshToken
+from products.benchmarking import measure_requests
+from products.cache import bump_catalog_version, catalog_cache
+from products.models import Category
+from products.search_cache import search_cache
+from products.search_index import search_index
+from products.snapshot import catalog_snapshot
+from products.stats import rebuild_catalog_stats
+from .context import LocalContextStore, conversation_contexts
+from .gazetteer import catalog_gazetteer
+from .management.commands.bench_intents import build_corpus
+from .models import ChatMessage, ChatSession
+
+SEARCHES = [
+    {'query': 'wireless headphones'},
+    {'query': 'laptop', 'max_price': 1000},
+    {'query': 'waterproof jacket', 'in_stock': True, 'sort_by': 'price'},
+    {'max_price': 500, 'sort_by': '-rating'},
+    {'query': 'smart watch', 'facets': True},
+]
+LISTINGS = [
+    {},
+    {'page': 3},
+    {'sort_by': 'price', 'min_price': 50, 'max_price': 400},
+    {'sort_by': '-rating', 'in_stock': 'true'},
+    {'featured': 'true'},
+]
+
+def seed_chat_history(user, sessions=20, messages=40, seed=42):
+    """Give ``user`` sessions of alternating user and bot messages"""
+    corpus = build_corpus(sessions * messages, seed)
+    for index in range(sessions):
+        session = ChatSession.objects.create(user=user, session_id=f'bench-history-{user.pk}-{index}')
+        ChatMessage.objects.bulk_create([
+            ChatMessage(
+                session=session,
+                message_type='user' if turn % 2 == 0 else 'bot',
+                content=corpus[index * messages + turn],
+            )
+            for turn in range(messages)
+        ])
+
+class ApiBenchmark:
+    """Measure each endpoint against whatever the current database holds.
+
+    ``prepare`` brings the derived data (search index, stats, in-memory
+    snapshot) in line with products inserted in bulk. With ``cold`` the
+    catalog caches are emptied before every request, so the numbers show
+    the work behind a cache miss rather than a repeated hit.
+    """
+
+    def __init__(self, repeat=50, cold=False, seed=42, sessions=20, messages=40):
+        self.repeat = repeat
+        self.cold = cold
+        self.seed = seed
+        self.sessions = sessions
+        self.messages = messages
+
+    def prepare(self):
+        search_index.rebuild()
+        with transaction.atomic():
+            rebuild_catalog_stats()
+        bump_catalog_version()
+        catalog_snapshot.invalidate()
+        catalog_gazetteer.invalidate()
+        search_cache.clear()
+
+        user, created = get_user_model().objects.get_or_create(username='bench', defaults={'email': 'bench@example.com'})
+        if created:
+            seed_chat_history(user, self.sessions, self.messages, self.seed)
+        self.anonymous = Client()
+        self.client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def reset_caches(self):
+        catalog_cache().clear()
+        search_cache.clear()
+        if isinstance(conversation_contexts, LocalContextStore):
+            conversation_contexts.clear()
+
+    def endpoints(self):
+        """(name, send, requests) for every endpoint in the suite"""
+        category_ids = list(Category.objects.values_list('id', flat=True)[:5])
+        searches = SEARCHES + [{'category': category_id, 'sort_by': 'price'} for category_id in category_ids]
+        chat_messages = build_corpus(max(self.repeat, 1), self.seed)
+        return [
+            ('search_products', lambda body: self.anonymous.post(
+                '/api/products/search/', body, content_type='application/json'), searches),
+            ('ProductListView', lambda params: self.anonymous.get('/api/products/', params), LISTINGS),
+            ('CategoryListView', lambda params: self.anonymous.get('/api/products/categories/', params), [{}]),
+            ('get_brands', lambda params: self.anonymous.get('/api/products/brands/', params), [{}, {'stats': 'true'}]),
+            ('chat_message', lambda message: self.client.post(
+                '/api/chatbot/message/', {'message': message, 'session_id': 'bench-live'},
+                content_type='application/json'), chat_messages),
+            ('chat_sessions', lambda params: self.client.get('/api/chatbot/sessions/', params), [{}]),
+        ]
+
+    def run(self):
+        before = self.reset_caches if self.cold else None
+        return {
+            name: measure_requests(send, requests, self.repeat, before=before)
+            for name, send, requests in self.endpoints()
+        }
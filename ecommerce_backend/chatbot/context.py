@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from .utils import ParsedMessage
+
+@dataclass(frozen=True)
+class ConversationContext:
+    """What a session's last search left behind for follow-up messages.
+
+    ``filters`` are the merged search filters, ``product_ids`` every match
+    in ranked order (up to ``CHAT_CONTEXT_MAX_CANDIDATES``) and ``complete``
+    whether that list holds all matches, so later filters can narrow it
+    without going back to the full catalog. ``reference_price`` is the
+    median price of the products shown, which "cheaper" and "pricier"
+    are relative to.
+    """
+    parsed: ParsedMessage
+    filters: Dict[str, Any]
+    product_ids: Tuple[int, ...]
+    complete: bool
+    reference_price: Optional[float] = None
+
+class LocalContextStore:
+    """Conversation contexts in this process: an LRU bounded by entry count with per-entry expiry"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[ConversationContext]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, context = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return context
+
+    def set(self, key: str, context: ConversationContext):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, context)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class CacheContextStore:
+    """Conversation contexts in a Django cache, shared by every worker using it; the cache does the eviction"""
+
+    KEY_PREFIX = 'chatbot:context:'
+
+    def __init__(self, alias: str, ttl: float):
+        self.alias = alias
+        self.ttl = ttl
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self, key: str) -> Optional[ConversationContext]:
+        return self.cache.get(self.KEY_PREFIX + key)
+
+    def set(self, key: str, context: ConversationContext):
+        self.cache.set(self.KEY_PREFIX + key, context, timeout=self.ttl)
+
+    def delete(self, key: str):
+        self.cache.delete(self.KEY_PREFIX + key)
+
+def build_context_store():
+    if settings.CHAT_CONTEXT_STORE == 'cache':
+        return CacheContextStore(settings.CHAT_CONTEXT_CACHE_ALIAS, settings.CHAT_CONTEXT_TTL)
+    return LocalContextStore(settings.CHAT_CONTEXT_MAX_ENTRIES, settings.CHAT_CONTEXT_TTL)
+
+conversation_contexts = build_context_store()
+
+class Conversation:
+    """One chat session's handle on the context store.
+
+    The stored context is read at most once and kept on the handle, so a
+    WebSocket connection can hold one for its whole lifetime.
+    """
+
+    def __init__(self, user, session_id: str, store=None):
+        self.key = f'{user.pk}:{session_id}'
+        self.store = store if store is not None else conversation_contexts
+
+    @cached_property
+    def context(self) -> Optional[ConversationContext]:
+        return self.store.get(self.key)
+
+    def follows_up(self, parsed: ParsedMessage) -> bool:
+        """Whether the message should be answered as a search because of the previous one.
+
+        It refines that search when it is a ``follow_up``; otherwise it names
+        other products and is searched for on its own.
+        """
+        return parsed.narrows_search and self.context is not None
+
+    def save(self, context: ConversationContext):
+        self.store.set(self.key, context)
+        self.context = context
+
+    def forget(self):
+        self.store.delete(self.key)
+        self.context = None
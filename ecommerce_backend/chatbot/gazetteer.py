@@ -0,0 +1,147 @@
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Tuple
+from django.conf import settings
+from products.models import Category, Product
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text: str) -> Tuple[str, ...]:
+    return tuple(TOKEN_PATTERN.findall(text.lower()))
+
+class GazetteerMatch(NamedTuple):
+    categories: Tuple[int, ...]
+    brands: Tuple[str, ...]
+
+class CatalogGazetteer:
+    """In-memory dictionary of category and brand names for entity extraction.
+
+    Names are indexed as word tuples under their first word, so resolving a
+    message is one scan over its words with a few dict lookups each, however
+    many brands the catalog holds. The index is loaded lazily once per worker,
+    patched or invalidated by model signals, and reloaded after ``max_age``
+    seconds so workers that missed a signal converge as well.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._version = 0
+        # (version, entries, max phrase length per first word, loaded at) swapped as one tuple
+        self._state = None
+
+    @staticmethod
+    def category_aliases(name: str) -> List[Tuple[str, ...]]:
+        """Full name, each significant word, and singular/plural forms of both"""
+        words = tokenize(name)
+        aliases = [words] + [(word,) for word in words if len(word) > 3 and len(words) > 1]
+        for alias in list(aliases):
+            last = alias[-1]
+            variant = last[:-1] if last.endswith('s') else last + 's'
+            aliases.append(alias[:-1] + (variant,))
+        return aliases
+
+    def invalidate(self):
+        """Drop the index; the next lookup reloads it from the database"""
+        with self._lock:
+            self._state = None
+
+    def add_brand(self, brand: str):
+        """Register a brand without reloading; a no-op until the index is loaded"""
+        words = tokenize(brand)
+        with self._lock:
+            if self._state is None or not words:
+                return
+            _, entries, max_lengths, loaded_at = self._state
+            if ('brand', brand) in entries.get(words, ()):
+                return
+            entries = {key: list(value) for key, value in entries.items()}
+            max_lengths = dict(max_lengths)
+            self._add(entries, max_lengths, words, ('brand', brand))
+            self._version += 1
+            self._state = (self._version, entries, max_lengths, loaded_at)
+
+    @staticmethod
+    def _add(entries: Dict, max_lengths: Dict, words: Tuple[str, ...], entry: Tuple[str, object]):
+        if not words:
+            return
+        existing = entries.setdefault(words, [])
+        if entry[0] == 'brand' and any(kind == 'brand' for kind, _ in existing):
+            return
+        if entry not in existing:
+            existing.append(entry)
+        max_lengths[words[0]] = max(max_lengths.get(words[0], 0), len(words))
+
+    @staticmethod
+    def _sources():
+        categories = Category.objects.values_list('id', 'name')
+        brands = Product.objects.filter(is_active=True).values_list('brand', flat=True).distinct().order_by('brand')
+        return categories, brands
+
+    def _build(self, categories, brands):
+        entries, max_lengths = {}, {}
+        for category_id, name in categories:
+            for alias in self.category_aliases(name):
+                self._add(entries, max_lengths, alias, ('category', category_id))
+        for brand in brands:
+            self._add(entries, max_lengths, tokenize(brand), ('brand', brand))
+        return entries, max_lengths
+
+    def _load(self):
+        return self._build(*self._sources())
+
+    def _stale(self, state) -> bool:
+        return state is None or time.monotonic() - state[3] > self.max_age
+
+    def refresh(self) -> Tuple[int, Dict, Dict]:
+        """Return (version, entries, max lengths), loading the index if missing or expired"""
+        state = self._state
+        if self._stale(state):
+            with self._lock:
+                state = self._state
+                if self._stale(state):
+                    entries, max_lengths = self._load()
+                    self._version += 1
+                    state = self._state = (self._version, entries, max_lengths, time.monotonic())
+        return state[:3]
+
+    async def arefresh(self) -> Tuple[int, Dict, Dict]:
+        """``refresh`` for async callers, loading through the async ORM"""
+        state = self._state
+        if self._stale(state):
+            categories, brands = self._sources()
+            entries, max_lengths = self._build(
+                [row async for row in categories], [brand async for brand in brands]
+            )
+            with self._lock:
+                self._version += 1
+                state = self._state = (self._version, entries, max_lengths, time.monotonic())
+        return state[:3]
+
+    @property
+    def version(self) -> int:
+        return self.refresh()[0]
+
+    def resolve(self, message: str) -> GazetteerMatch:
+        """Find every category and brand mentioned in the message, longest names first"""
+        _, entries, max_lengths = self.refresh()
+        tokens = tokenize(message)
+        categories, brands = [], []
+        position = 0
+        while position < len(tokens):
+            longest = min(max_lengths.get(tokens[position], 0), len(tokens) - position)
+            for length in range(longest, 0, -1):
+                found = entries.get(tokens[position:position + length])
+                if found:
+                    for kind, value in found:
+                        target = categories if kind == 'category' else brands
+                        if value not in target:
+                            target.append(value)
+                    position += length
+                    break
+            else:
+                position += 1
+        return GazetteerMatch(tuple(categories), tuple(brands))
+
+catalog_gazetteer = CatalogGazetteer(max_age=settings.CHATBOT_GAZETTEER_MAX_AGE)
@@ -0,0 +1,55 @@
+import json
+import platform
+import django
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from products.benchmarking import isolated_database, seed_catalog
+from chatbot.benchmarking import ApiBenchmark
+
+class Command(BaseCommand):
+    help = 'Measure latency, queries and response size of every API endpoint at several catalog sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000],
+                            help='Catalog sizes to measure (e.g. 1000 100000 1000000)')
+        parser.add_argument('--repeat', type=int, default=50, help='Requests per endpoint and size')
+        parser.add_argument('--sessions', type=int, default=20, help='Chat sessions in the seeded history')
+        parser.add_argument('--messages', type=int, default=40, help='Messages per seeded chat session')
+        parser.add_argument('--cold', action='store_true', help='Empty the catalog caches before every request')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='bench_api.json', help='JSON file the results are written to')
+
+    def handle(self, *args, **options):
+        benchmark = ApiBenchmark(
+            repeat=options['repeat'], cold=options['cold'], seed=options['seed'],
+            sessions=options['sessions'], messages=options['messages'],
+        )
+        runs = []
+        with override_settings(ALLOWED_HOSTS=['testserver']), isolated_database():
+            seeded = 0
+            for size in sorted(options['sizes']):
+                self.stdout.write(f'Seeding {size:,} products...')
+                seed_catalog(size - seeded, seed=options['seed'] + size)
+                seeded = size
+                benchmark.prepare()
+
+                endpoints = benchmark.run()
+                runs.append({'catalog_size': size, 'endpoints': endpoints})
+                for name, result in endpoints.items():
+                    self.stdout.write(
+                        f'  {size:>9,} {name:>16}: p50 {result["p50_ms"]:8.2f} ms  p95 {result["p95_ms"]:8.2f} ms  '
+                        f'p99 {result["p99_ms"]:8.2f} ms  {result["queries_per_request"]:5.1f} queries  '
+                        f'{result["bytes_per_request"]:>8,} bytes'
+                    )
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'options': {key: options[key] for key in ('repeat', 'sessions', 'messages', 'cold', 'seed')},
+            'runs': runs,
+        }
+        with open(options['output'], 'w') as output:
+            json.dump(report, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {options["output"]}'))
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from products.benchmarking import isolated_database, percentile, seed_catalog
+from .bench_intents import build_corpus
+
+class Command(BaseCommand):
+    help = 'Compare concurrent chat turn throughput of the WSGI (DRF) and ASGI (async) endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', default=[1, 8, 32],
+                            help='Concurrent chat users to simulate')
+        parser.add_argument('--turns', type=int, default=20, help='Turns sent by each user')
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        # A file database, so concurrent connections wait on locks the way a deployment does
+        with tempfile.TemporaryDirectory() as directory, override_settings(ALLOWED_HOSTS=['testserver']), \
+                isolated_database(name=os.path.join(directory, 'bench_chat.sqlite3')):
+            seed_catalog(options['products'], seed=options['seed'])
+            for users in options['users']:
+                headers = [self.auth_header(f'bench-{users}-{index}') for index in range(users)]
+                corpus = build_corpus(users * options['turns'], options['seed'])
+                scripts = [corpus[index::users] for index in range(users)]
+                for label, run in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    started = time.perf_counter()
+                    timings = sorted(run(headers, scripts, label))
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{users:>4} users {label}: {len(timings) / elapsed:8.1f} turns/sec  '
+                        f'p50 {percentile(timings, 0.5):7.1f} ms  p95 {percentile(timings, 0.95):7.1f} ms'
+                    )
+
+    @staticmethod
+    def auth_header(username):
+        user = get_user_model().objects.create_user(
+            username=username, email=f'{username}@example.com', password='bench-pass'
+        )
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    @staticmethod
+    def run_wsgi(headers, scripts, label):
+        def converse(header, script):
+            client = Client(HTTP_AUTHORIZATION=header)
+            timings = []
+            try:
+                for message in script:
+                    started = time.perf_counter()
+                    response = client.post('/api/chatbot/message/', {'message': message, 'session_id': f'{label}-{header[-16:]}'},
+                                           content_type='application/json')
+                    assert response.status_code == 200, response.content
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            return timings
+
+        with ThreadPoolExecutor(max_workers=len(scripts)) as executor:
+            results = executor.map(converse, headers, scripts)
+            return [timing for timings in results for timing in timings]
+
+    @staticmethod
+    def run_asgi(headers, scripts, label):
+        async def converse(header, script):
+            client = AsyncClient()
+            timings = []
+            for message in script:
+                started = time.perf_counter()
+                response = await client.post(
+                    '/api/chatbot/async/message/', {'message': message, 'session_id': f'{label}-{header[-16:]}'},
+                    content_type='application/json', headers={'Authorization': header}
+                )
+                assert response.status_code == 200, response.content
+                timings.append((time.perf_counter() - started) * 1000)
+            return timings
+
+        async def main():
+            results = await asyncio.gather(*(converse(header, script) for header, script in zip(headers, scripts)))
+            return [timing for timings in results for timing in timings]
+
+        return asyncio.run(main())
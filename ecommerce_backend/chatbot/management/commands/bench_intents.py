@@ -0,0 +1,112 @@
+import random
+import re
+import time
+from django.core.management.base import BaseCommand
+from chatbot.utils import ChatbotNLP
+
+# The per-pattern loop detect_intent used before INTENT_MATCHER, kept as the baseline
+LEGACY_INTENT_PATTERNS = {
+    'greeting': [
+        r'\b(hi|hello|hey|good morning|good afternoon|good evening)\b',
+        r'\bstart\b',
+    ],
+    'search': [
+        r'\b(search|find|look for|show me|get me)\b',
+        r'\b(products?|items?)\b.*\b(with|having|contains?)\b',
+        r'\bwant\b.*\b(buy|purchase)\b',
+    ],
+    'filter': [
+        r'\b(filter|sort|order by|arrange)\b',
+        r'\b(under|below|above|over)\b.*\$([\d,]+)',
+        r'\b(cheap|expensive|budget|premium)\b',
+    ],
+    'details': [
+        r'\b(details?|info|information|specs?|specifications?)\b',
+        r'\btell me (about|more)\b',
+    ],
+    'comparison': [
+        r'\b(compare|vs|versus|difference)\b',
+        r'\b(better|best|worst)\b',
+    ],
+    'help': [
+        r'\b(help|assist|support)\b',
+        r'\bhow (do|can) i\b',
+    ]
+}
+
+TEMPLATES = [
+    'Hi there',
+    'hello, good morning!',
+    'Find me {item} under ${price}',
+    'show me {brand} {item}',
+    'I want to buy a {item} for my {person}',
+    'Do you have any {item} with {feature}?',
+    'sort the {item} by price',
+    'anything cheap in {item}?',
+    'tell me more about the {brand} {item}',
+    'what are the specs of product {number}',
+    'compare {brand} vs {brand2} {item}',
+    'which {item} is the best for {person}',
+    'how do I return an order',
+    'can you help me',
+    'my order {number} has not arrived yet and I am getting quite worried about it',
+    'ok thanks',
+    'is the {item} waterproof',
+    '{item} between ${price} and ${price2} from {brand} please, ideally with {feature}',
+]
+
+VOCABULARY = {
+    'item': ['laptops', 'phone', 'headphones', 'running shoes', 'smart watch', 'blender', 'jacket'],
+    'brand': ['TechMaster', 'AudioPro', 'Apple', 'Samsung', 'Nike', 'HomeChef'],
+    'brand2': ['Sony', 'Dell', 'Adidas', 'Lenovo'],
+    'feature': ['noise cancelling', 'a long battery life', 'bluetooth', 'a leather strap'],
+    'person': ['son', 'wife', 'office', 'gym sessions'],
+}
+
+def legacy_detect_intent(message):
+    message_lower = message.lower()
+    for intent, patterns in LEGACY_INTENT_PATTERNS.items():
+        for pattern in patterns:
+            if re.search(pattern, message_lower):
+                return intent, 0.8
+    return 'other', 0.3
+
+def build_corpus(size, seed):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        values = {key: rng.choice(options) for key, options in VOCABULARY.items()}
+        values['price'] = rng.randint(20, 2000)
+        values['price2'] = values['price'] + rng.randint(50, 500)
+        values['number'] = rng.randint(1, 9999)
+        corpus.append(rng.choice(TEMPLATES).format(**values))
+    return corpus
+
+class Command(BaseCommand):
+    help = 'Benchmark intent detection throughput against the legacy per-pattern loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000, help='Corpus size')
+        parser.add_argument('--rounds', type=int, default=5, help='Timed passes over the corpus')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        corpus = build_corpus(options['messages'], options['seed'])
+        rounds = options['rounds']
+
+        results = {}
+        for label, detect in (('legacy loop', legacy_detect_intent), ('compiled matcher', ChatbotNLP.detect_intent)):
+            best = float('inf')
+            for _ in range(rounds):
+                started = time.perf_counter()
+                for message in corpus:
+                    detect(message)
+                best = min(best, time.perf_counter() - started)
+            results[label] = len(corpus) / best
+            self.stdout.write(f'{label:>17}: {results[label]:,.0f} messages/sec')
+
+        agreement = sum(
+            legacy_detect_intent(message)[0] == ChatbotNLP.detect_intent(message)[0] for message in corpus
+        ) / len(corpus)
+        self.stdout.write(f'{"speedup":>17}: {results["compiled matcher"] / results["legacy loop"]:.2f}x')
+        self.stdout.write(f'{"top-intent agreement":>17}: {agreement:.1%}')
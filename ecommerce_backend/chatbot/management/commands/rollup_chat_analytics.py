@@ -0,0 +1,17 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from chatbot.analytics import fold_intents
+
+class Command(BaseCommand):
+    help = 'Fold intents logged since the last run into the hourly analytics rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.CHAT_ANALYTICS_BATCH_SIZE,
+                            help='Intents folded per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        folded = fold_intents(options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Folded {folded} intents in {elapsed:.2f}s'))
@@ -0,0 +1,32 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chatbot.retention import archive_sessions, expire_idle_sessions
+
+class Command(BaseCommand):
+    help = 'Mark idle chat sessions inactive and move old inactive ones into compressed archive files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=int, default=settings.CHAT_SESSION_IDLE_DAYS,
+                            help='Days without activity before a session is marked inactive')
+        parser.add_argument('--archive-days', type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+                            help='Days without activity before an inactive session is archived')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Sessions archived and deleted per transaction')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        expired = expire_idle_sessions(now - timedelta(days=options['idle_days']))
+        self.stdout.write(f'Marked {expired} idle sessions inactive')
+
+        sessions = messages = files = 0
+        for batch in archive_sessions(now - timedelta(days=options['archive_days']), options['batch_size']):
+            sessions += batch.sessions
+            messages += batch.messages
+            files += batch.files
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  archived {batch.sessions} sessions ({batch.messages} messages)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {sessions} sessions with {messages} messages into {files} files'
+        ))
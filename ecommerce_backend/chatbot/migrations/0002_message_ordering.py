@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='chatmessage',
+            options={'ordering': ['timestamp', 'id']},
+        ),
+    ]
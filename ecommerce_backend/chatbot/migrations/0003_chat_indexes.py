@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0002_message_ordering'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['session', 'timestamp', 'id'], name='chat_message_session_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', '-updated_at'], name='chat_session_user_active_idx'),
+        ),
+    ]
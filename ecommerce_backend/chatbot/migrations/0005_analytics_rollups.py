@@ -0,0 +1,64 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0004_chat_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IntentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('intent_type', models.CharField(choices=[('search', 'Product Search'), ('filter', 'Filter Products'), ('details', 'Product Details'), ('compare', 'Product Comparison'), ('recommendation', 'Product Recommendation'), ('greeting', 'Greeting'), ('help', 'Help Request'), ('other', 'Other')], max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('low_confidence_count', models.PositiveIntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0)),
+                ('search_count', models.PositiveIntegerField(default=0)),
+                ('zero_result_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['hour', 'intent_type'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTermRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('dimension', models.CharField(choices=[('brand', 'Brand'), ('category', 'Category'), ('price_band', 'Price band')], max_length=20)),
+                ('value', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['hour', 'dimension', '-count'],
+            },
+        ),
+        migrations.AddField(
+            model_name='userintent',
+            name='result_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='searchtermrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'dimension', 'value'), name='search_term_rollup_hour_value'),
+        ),
+        migrations.AddConstraint(
+            model_name='intentrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'intent_type'), name='intent_rollup_hour_intent'),
+        ),
+    ]
@@ -13,6 +13,10 @@ class ChatSession(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['user', '-updated_at'], condition=models.Q(is_active=True),
+                         name='chat_session_user_active_idx'),
+        ]
 
     def __str__(self):
         return f"Session {self.session_id} - {self.user.username}"
@@ -31,7 +35,8 @@ class ChatMessage(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['timestamp']
+        ordering = ['timestamp', 'id']
+        indexes = [models.Index(fields=['session', 'timestamp', 'id'], name='chat_message_session_time_idx')]
 
     def __str__(self):
         return f"{self.message_type}: {self.content[:50]}..."
@@ -53,4 +58,78 @@ class UserIntent(models.Model):
     intent_type = models.CharField(max_length=20, choices=INTENT_TYPES)
     confidence = models.FloatField(default=0.0)
     parameters = models.JSONField(default=dict, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    # Products a search turn showed; None for turns that did not search
+    result_count = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class ChatArchive(models.Model):
+    """Index entry for a session moved out of the chat tables into a compressed archive file.
+
+    Each session is one gzip member of a per-user JSONL file, stored at
+    ``offset``/``length`` so it can be read back without the rest of the file.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_archives')
+    session_id = models.CharField(max_length=100)
+    path = models.CharField(max_length=255)
+    offset = models.PositiveBigIntegerField()
+    length = models.PositiveIntegerField()
+    message_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+        indexes = [models.Index(fields=['user', 'session_id'], name='chat_archive_session_idx')]
+
+    def __str__(self):
+        return f"Archived session {self.session_id} ({self.message_count} messages)"
+
+class IntentRollup(models.Model):
+    """UserIntent counts per hour and intent, folded in incrementally by chatbot.analytics"""
+    hour = models.DateTimeField()
+    intent_type = models.CharField(max_length=20, choices=UserIntent.INTENT_TYPES)
+    count = models.PositiveIntegerField(default=0)
+    low_confidence_count = models.PositiveIntegerField(default=0)
+    confidence_sum = models.FloatField(default=0)
+    # Turns that ran a search, and those whose search showed no products
+    search_count = models.PositiveIntegerField(default=0)
+    zero_result_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['hour', 'intent_type']
+        constraints = [models.UniqueConstraint(fields=['hour', 'intent_type'], name='intent_rollup_hour_intent')]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.intent_type}: {self.count}"
+
+class SearchTermRollup(models.Model):
+    """How often each brand, category and price band was asked for per hour"""
+    DIMENSIONS = [
+        ('brand', 'Brand'),
+        ('category', 'Category'),
+        ('price_band', 'Price band'),
+    ]
+
+    hour = models.DateTimeField()
+    dimension = models.CharField(max_length=20, choices=DIMENSIONS)
+    value = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['hour', 'dimension', '-count']
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'dimension', 'value'], name='search_term_rollup_hour_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.dimension}={self.value}: {self.count}"
+
+class AnalyticsWatermark(models.Model):
+    """Id of the last source row a rollup has folded in"""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
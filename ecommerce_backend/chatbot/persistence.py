@@ -0,0 +1,92 @@
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.utils import timezone
+from .models import ChatMessage, ChatSession, UserIntent
+
+def upsert_session(user, session_id: str) -> ChatSession:
+    """Create the session or touch its ``updated_at`` in one statement, then load it.
+
+    The insert resolves conflicts on the unique ``session_id`` in the database,
+    so concurrent first turns for a new session cannot raise IntegrityError.
+    A session the retention sweeper marked inactive becomes active again.
+    Raises ChatSession.DoesNotExist when the id belongs to another user.
+    """
+    now = timezone.now()
+    ChatSession.objects.bulk_create(
+        [ChatSession(user=user, session_id=session_id, created_at=now, updated_at=now)],
+        update_conflicts=True,
+        unique_fields=['session_id'],
+        update_fields=['updated_at', 'is_active'],
+    )
+    return ChatSession.objects.get(session_id=session_id, user=user)
+
+def retry_on_lock(write):
+    """Run ``write`` (which opens its own transaction), retrying it when the database reports a lock conflict"""
+    for attempt in range(settings.CHAT_TURN_WRITE_ATTEMPTS):
+        try:
+            return write()
+        except OperationalError as e:
+            # SQLite reports write contention as a lock error instead of waiting; retry with backoff
+            if 'locked' not in str(e) or attempt + 1 == settings.CHAT_TURN_WRITE_ATTEMPTS:
+                raise
+            time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+def write_messages(session, user_message, bot_response, bot_metadata, intent=None):
+    user_msg, bot_msg = ChatMessage.objects.bulk_create([
+        ChatMessage(session=session, message_type='user', content=user_message),
+        ChatMessage(session=session, message_type='bot', content=bot_response, metadata=bot_metadata),
+    ])
+    if intent is not None:
+        if bot_metadata.get('intent') == 'search':
+            intent = dict(intent, result_count=len(bot_metadata.get('products', ())))
+        UserIntent.objects.bulk_create([UserIntent(session=session, **intent)])
+    return user_msg, bot_msg
+
+def persist_turn(
+    user,
+    session_id: str,
+    user_message: str,
+    bot_response: str,
+    bot_metadata: Dict[str, Any],
+    intent: Optional[Dict[str, Any]] = None,
+) -> Tuple[ChatSession, ChatMessage, ChatMessage]:
+    """Write one chat turn in a single transaction.
+
+    ``intent`` holds the UserIntent fields (intent_type, confidence,
+    parameters) when the message was understood. Returns the session and
+    the saved user and bot messages. The transaction is retried when the
+    database reports a lock conflict.
+    """
+    def write():
+        with transaction.atomic():
+            session = upsert_session(user, session_id)
+            return (session, *write_messages(session, user_message, bot_response, bot_metadata, intent))
+    return retry_on_lock(write)
+
+def append_turn(
+    session: ChatSession,
+    user_message: str,
+    bot_response: str,
+    bot_metadata: Dict[str, Any],
+    intent: Optional[Dict[str, Any]] = None,
+) -> Tuple[ChatSession, ChatMessage, ChatMessage]:
+    """Write one chat turn to a session the caller already holds, such as a WebSocket connection.
+
+    Skips the upsert and session lookup of ``persist_turn``; the session's
+    ``updated_at`` is touched with a single UPDATE instead. When that UPDATE
+    finds no row because the session was deleted or archived since it was
+    loaded, the session is upserted again. Returns the session the turn was
+    written to, which the caller should hold from then on, and the saved
+    user and bot messages.
+    """
+    def write():
+        with transaction.atomic():
+            current = session
+            current.updated_at, current.is_active = timezone.now(), True
+            if not ChatSession.objects.filter(pk=current.pk).update(updated_at=current.updated_at, is_active=True):
+                current = upsert_session(current.user, current.session_id)
+            return (current, *write_messages(current, user_message, bot_response, bot_metadata, intent))
+    return retry_on_lock(write)
\ No newline at end of file
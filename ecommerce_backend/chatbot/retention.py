@@ -0,0 +1,182 @@
+"""Chat retention: expire idle sessions and move old ones out of the chat tables.
+
+Archived sessions are written to one gzipped JSONL file per user and
+sweep batch in default storage. Every session is its own gzip member, so
+the file as a whole is still a valid ``.jsonl.gz``, while a ``ChatArchive``
+row records where each member starts and ends for reading it back alone.
+Deleting an archived session rewrites its file without that member.
+"""
+import gzip
+import json
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from products.serializers import format_datetime
+from .models import ChatArchive, ChatMessage, ChatSession, UserIntent
+from .persistence import retry_on_lock
+
+SESSION_PREVIEW_LENGTH = 80
+
+@dataclass
+class SweepBatch:
+    sessions: int
+    messages: int
+    files: int
+
+def expire_idle_sessions(idle_before) -> int:
+    """Mark sessions without activity since ``idle_before`` inactive; ``updated_at`` is left as is"""
+    return ChatSession.objects.filter(is_active=True, updated_at__lt=idle_before).update(is_active=False)
+
+def archive_name(user_id: int, archived_at, first_session: int) -> str:
+    return f'{settings.CHAT_ARCHIVE_DIR}/{user_id}/{archived_at:%Y%m%dT%H%M%S}-{first_session}.jsonl.gz'
+
+def session_records(sessions: List[ChatSession]) -> Dict[int, dict]:
+    """Sessions with their messages and intents in the archive's JSON form, by session pk"""
+    records = {
+        session.pk: {
+            'id': session.pk,
+            'session_id': session.session_id,
+            'created_at': format_datetime(session.created_at),
+            'updated_at': format_datetime(session.updated_at),
+            'is_active': False,
+            'messages': [],
+            'intents': [],
+        }
+        for session in sessions
+    }
+    messages = ChatMessage.objects.filter(session__in=records).order_by('session', 'timestamp', 'id').values_list(
+        'session_id', 'id', 'message_type', 'content', 'metadata', 'timestamp'
+    )
+    for session_pk, pk, message_type, content, metadata, timestamp in messages.iterator(chunk_size=2000):
+        records[session_pk]['messages'].append({
+            'id': pk, 'message_type': message_type, 'content': content, 'metadata': metadata,
+            'timestamp': format_datetime(timestamp),
+        })
+    intents = UserIntent.objects.filter(session__in=records).order_by('id').values_list(
+        'session_id', 'intent_type', 'confidence', 'parameters', 'result_count', 'created_at'
+    )
+    for session_pk, intent_type, confidence, parameters, result_count, created_at in intents.iterator(chunk_size=2000):
+        records[session_pk]['intents'].append({
+            'intent_type': intent_type, 'confidence': confidence, 'parameters': parameters,
+            'result_count': result_count, 'created_at': format_datetime(created_at),
+        })
+
+    for record in records.values():
+        messages = record['messages']
+        record['message_count'] = len(messages)
+        record['last_message'] = messages[-1]['content'][:SESSION_PREVIEW_LENGTH] if messages else None
+        record['last_activity'] = messages[-1]['timestamp'] if messages else None
+    return records
+
+def write_archive(user_id: int, sessions: List[ChatSession], records: Dict[int, dict],
+                  archived_at) -> Dict[int, ChatArchive]:
+    """Store one user's sessions as a gzip file and return unsaved index rows for them by session pk"""
+    members, entries, offset = [], {}, 0
+    for session in sessions:
+        line = json.dumps(records[session.pk], ensure_ascii=False, separators=(',', ':')) + '\n'
+        member = gzip.compress(line.encode(), mtime=0)
+        members.append(member)
+        entries[session.pk] = ChatArchive(
+            user_id=user_id, session_id=session.session_id, offset=offset, length=len(member),
+            message_count=records[session.pk]['message_count'],
+            created_at=session.created_at, updated_at=session.updated_at,
+        )
+        offset += len(member)
+    path = default_storage.save(archive_name(user_id, archived_at, sessions[0].pk), ContentFile(b''.join(members)))
+    for entry in entries.values():
+        entry.path = path
+    return entries
+
+def archive_sessions(archive_before, batch_size: int = 500) -> Iterator[SweepBatch]:
+    """Move inactive sessions idle since ``archive_before`` into archive files, a batch at a time.
+
+    Files are written before the rows are deleted. The delete only removes
+    sessions that are still inactive and idle, so a session that gets a
+    new message mid-sweep stays in the tables and its archived copy is
+    never indexed.
+    """
+    last_pk = 0
+    while True:
+        sessions = list(
+            ChatSession.objects.filter(is_active=False, updated_at__lt=archive_before, pk__gt=last_pk)
+            .order_by('pk')[:batch_size]
+        )
+        if not sessions:
+            return
+        last_pk = sessions[-1].pk
+        records = session_records(sessions)
+
+        by_user = defaultdict(list)
+        for session in sessions:
+            by_user[session.user_id].append(session)
+        archived_at = timezone.now()
+        entries = {}
+        for user_id, user_sessions in by_user.items():
+            entries.update(write_archive(user_id, user_sessions, records, archived_at))
+
+        def move():
+            with transaction.atomic():
+                unchanged = set(
+                    ChatSession.objects.filter(pk__in=records, is_active=False, updated_at__lt=archive_before)
+                    .values_list('pk', flat=True)
+                )
+                ChatArchive.objects.bulk_create([entries[pk] for pk in unchanged])
+                ChatMessage.objects.filter(session__in=unchanged).delete()
+                UserIntent.objects.filter(session__in=unchanged).delete()
+                ChatSession.objects.filter(pk__in=unchanged).delete()
+                return unchanged
+
+        unchanged = retry_on_lock(move)
+        yield SweepBatch(
+            sessions=len(unchanged),
+            messages=sum(records[pk]['message_count'] for pk in unchanged),
+            files=len(by_user),
+        )
+
+def archived_session(user, session_id: str) -> Optional[dict]:
+    """The most recently archived copy of a user's session, as stored, or None"""
+    entry = ChatArchive.objects.filter(user=user, session_id=session_id).order_by('-archived_at', '-id').first()
+    if entry is None:
+        return None
+    with default_storage.open(entry.path, 'rb') as stream:
+        stream.seek(entry.offset)
+        member = stream.read(entry.length)
+    return json.loads(gzip.decompress(member))
+
+def rewrite_archive(path: str, dropped) -> None:
+    """Copy the members of ``path`` still indexed, less the ``dropped`` entries, into a new file and re-index them.
+
+    The old file is deleted once the transaction commits, so a rollback
+    leaves the index pointing at it intact.
+    """
+    kept = list(
+        ChatArchive.objects.select_for_update().filter(path=path).exclude(pk__in=dropped).order_by('offset')
+    )
+    if kept:
+        with default_storage.open(path, 'rb') as stream:
+            data = stream.read()
+        members, offset = [], 0
+        for entry in kept:
+            members.append(data[entry.offset:entry.offset + entry.length])
+            entry.offset = offset
+            offset += entry.length
+        new_path = default_storage.save(path, ContentFile(b''.join(members)))
+        for entry in kept:
+            entry.path = new_path
+        ChatArchive.objects.bulk_update(kept, ['path', 'offset'])
+    transaction.on_commit(lambda: default_storage.delete(path))
+
+def delete_archived_session(user, session_id: str) -> int:
+    """Delete every archived copy of a user's session from its index and its file; returns the copies deleted"""
+    with transaction.atomic():
+        entries = list(ChatArchive.objects.select_for_update().filter(user=user, session_id=session_id))
+        dropped = [entry.pk for entry in entries]
+        for path in {entry.path for entry in entries}:
+            rewrite_archive(path, dropped)
+        ChatArchive.objects.filter(pk__in=dropped).delete()
+    return len(entries)
@@ -0,0 +1,158 @@
+from statistics import median
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+from products.models import Product
+from products.search_cache import SearchResult, search_cache, search_params
+from products.search_index import search_index
+from products.snapshot import catalog_snapshot
+from .context import ConversationContext
+from .utils import ParsedMessage
+
+def parsed_filters(parsed: ParsedMessage) -> Dict[str, Any]:
+    return {
+        'query': parsed.query,
+        'category': parsed.category,
+        'min_price': parsed.min_price,
+        'max_price': parsed.max_price,
+        'brand': parsed.brand,
+        'in_stock': False,
+        'order_by': None,
+    }
+
+def refined_filters(context: ConversationContext, parsed: ParsedMessage) -> Dict[str, Any]:
+    """Merge a follow-up message into the previous search's filters; values it names win"""
+    filters = dict(context.filters)
+    for name in ('category', 'min_price', 'max_price', 'brand'):
+        value = getattr(parsed, name)
+        if value is not None:
+            filters[name] = value
+    if 'in_stock' in parsed.refinements:
+        filters['in_stock'] = True
+    if 'top_rated' in parsed.refinements:
+        filters['order_by'] = '-rating'
+    if 'cheaper' in parsed.refinements:
+        filters['order_by'] = 'price'
+        if context.reference_price is not None:
+            filters['max_price'] = round(context.reference_price - 0.01, 2)
+    elif 'pricier' in parsed.refinements:
+        filters['order_by'] = '-price'
+        if context.reference_price is not None:
+            filters['min_price'] = round(context.reference_price + 0.01, 2)
+    return filters
+
+def narrows(previous: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Whether every product matching ``filters`` also matched ``previous``"""
+    for name in ('category', 'brand'):
+        if previous[name] is not None and filters[name] != previous[name]:
+            return False
+    if previous['min_price'] is not None and (filters['min_price'] is None or filters['min_price'] < previous['min_price']):
+        return False
+    if previous['max_price'] is not None and (filters['max_price'] is None or filters['max_price'] > previous['max_price']):
+        return False
+    return filters['query'] == previous['query'] and filters['in_stock'] >= previous['in_stock']
+
+def filter_params(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Filters in the ``search_params`` form stored on bot metadata, without unset values"""
+    return {name: value for name, value in filters.items() if value not in (None, False, '')}
+
+def find_ids(filters: Dict[str, Any], ids: Optional[Sequence[int]], limit: int) -> SearchResult:
+    """Ids of the first ``limit`` products matching ``filters``, best first, and the total when known.
+
+    ``ids`` restricts the search to a previous result set and keeps its
+    order unless the filters name one. Runs on the in-memory catalog
+    snapshot when it is enabled, otherwise as the equivalent ORM query.
+    """
+    query, order_by = filters['query'], filters['order_by']
+    if catalog_snapshot.enabled and (ids is not None or not query or search_index.available):
+        if ids is None and query:
+            ids = search_index.search_ids(query, match_any=True)
+        product_ids, total = catalog_snapshot.query(
+            ids=ids,
+            category=filters['category'],
+            min_price=filters['min_price'],
+            max_price=filters['max_price'],
+            brand=filters['brand'],
+            in_stock=filters['in_stock'],
+            order_by=order_by or ('relevance' if ids is not None else '-rating'),
+            limit=limit,
+        )
+        return SearchResult(tuple(product_ids), total)
+
+    queryset = Product.objects.filter(is_active=True)
+    if ids is not None:
+        queryset = queryset.filter(pk__in=ids)
+    elif query:
+        queryset = search_index.search(queryset, query, match_any=True)
+    if filters['category'] is not None:
+        queryset = queryset.filter(category_id=filters['category'])
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters['brand']:
+        queryset = queryset.filter(brand__icontains=filters['brand'])
+    if filters['in_stock']:
+        queryset = queryset.filter(stock_quantity__gt=0)
+
+    if order_by:
+        queryset = queryset.order_by(order_by, 'id')
+    elif ids is not None:
+        # Keep the previous ranking; the candidate set is bounded, so sort it here
+        rank = {pk: position for position, pk in enumerate(ids)}
+        product_ids = sorted(queryset.values_list('id', flat=True), key=rank.__getitem__)
+        return SearchResult(tuple(product_ids[:limit]), len(product_ids))
+    elif query:
+        queryset = queryset.order_by('search_rank', '-rating', 'id')
+    else:
+        queryset = queryset.order_by('-rating', 'id')
+    return SearchResult.of(queryset, limit)
+
+def match_ids(filters: Dict[str, Any], ids: Optional[Sequence[int]], limit: int) -> Tuple[List[int], bool]:
+    """Up to ``limit`` matching ids and whether they are every match.
+
+    Searches over the whole catalog go through the shared search result
+    cache; narrowing a previous result set is cheap enough to run directly.
+    """
+    if ids is None:
+        order_by = filters['order_by'] or ('relevance' if filters['query'] else '-rating')
+        result = search_cache.get(
+            search_params(filters, order_by, match_any=True),
+            lambda cache_limit: find_ids(filters, None, max(cache_limit, limit)),
+        )
+    else:
+        result = find_ids(filters, ids, limit)
+    return list(result.ids[:limit]), result.total is not None and result.total <= limit
+
+def search_products(
+    parsed: ParsedMessage, context: Optional[ConversationContext] = None, limit: int = 10, queryset=None
+) -> Tuple[List[Product], ConversationContext]:
+    """Products for a chat message and the context it leaves for the next one.
+
+    With the previous search's ``context`` the message is read as a
+    follow-up: its filters are merged in and, when they only narrow the
+    earlier search, just the cached candidate ids are filtered instead of
+    the whole catalog. ``queryset`` is the base product queryset the
+    results are loaded from, e.g. restricted with ``.only()``.
+    """
+    if context is not None:
+        filters = refined_filters(context, parsed)
+        ids = context.product_ids if context.complete and narrows(context.filters, filters) else None
+    else:
+        filters, ids = parsed_filters(parsed), None
+    product_ids, complete = match_ids(filters, ids, max(settings.CHAT_CONTEXT_MAX_CANDIDATES, limit))
+
+    if queryset is None:
+        queryset = Product.objects.select_related('category')
+    products = catalog_snapshot.hydrate(product_ids[:limit], queryset)
+    prices = [float(product.price) for product in products]
+    return products, ConversationContext(
+        parsed=parsed,
+        filters=filters,
+        product_ids=tuple(product_ids),
+        complete=complete,
+        reference_price=median(prices) if prices else None,
+    )
+
+def find_products(parsed: ParsedMessage, limit: int = 10, queryset=None) -> List[Product]:
+    """Products matching a parsed chat message on its own, best matches first"""
+    return search_products(parsed, limit=limit, queryset=queryset)[0]
@@ -17,6 +17,19 @@ class ChatSessionSerializer(serializers.ModelSerializer):
     def get_message_count(self, obj):
         return obj.messages.count()
 
+class ChatSessionSummarySerializer(serializers.ModelSerializer):
+    """Session list entry; the counts and preview come from queryset annotations"""
+    message_count = serializers.IntegerField(read_only=True)
+    last_message = serializers.CharField(read_only=True, allow_null=True)
+    last_activity = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = ChatSession
+        fields = ['id', 'session_id', 'created_at', 'updated_at', 'is_active',
+                  'message_count', 'last_message', 'last_activity']
+
 class ChatInputSerializer(serializers.Serializer):
     message = serializers.CharField(max_length=1000)
-    session_id = serializers.CharField(max_length=100, required=False)
\ No newline at end of file
+    session_id = serializers.CharField(max_length=100, required=False)
+    view = serializers.ChoiceField(choices=['compact', 'full'], required=False)
+    fields = serializers.CharField(required=False, allow_blank=True)
\ No newline at end of file
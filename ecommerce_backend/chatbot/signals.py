@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from products.importing import catalog_imported
+from products.models import Category, Product
+from .gazetteer import catalog_gazetteer
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver(catalog_imported)
+def refresh_gazetteer_categories(sender, **kwargs):
+    catalog_gazetteer.invalidate()
+
+@receiver(post_save, sender=Product)
+def add_gazetteer_brand(sender, instance, **kwargs):
+    if instance.is_active:
+        catalog_gazetteer.add_brand(instance.brand)
+    else:
+        catalog_gazetteer.invalidate()
+
+@receiver(post_delete, sender=Product)
+def remove_gazetteer_brand(sender, instance, **kwargs):
+    catalog_gazetteer.invalidate()
@@ -1,3 +1,813 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import shutil
+import tempfile
+import threading
+from dataclasses import FrozenInstanceError
+from datetime import timedelta
+from io import StringIO
+from threading import Thread
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from products.benchmarking import seed_catalog
+from products.models import Category, Product
+from products.query_plans import full_scans
+from rest_framework_simplejwt.tokens import RefreshToken
+from products.serializers import COMPACT_PRODUCT_FIELDS, ProductFieldset
+from products.search_cache import search_cache
+from products.snapshot import catalog_snapshot
+from .benchmarking import ApiBenchmark
+from .context import Conversation, LocalContextStore, conversation_contexts
+from .gazetteer import catalog_gazetteer
+from . import retention
+from .models import ChatArchive, ChatMessage, ChatSession, IntentRollup, SearchTermRollup, UserIntent
+from .persistence import persist_turn
+from .search import search_products
+from .utils import ChatbotNLP
+from .views import astream_turn, generate_reply
 
-# Create your tests here.
+class IntentDetectionTests(SimpleTestCase):
+    def test_single_intent(self):
+        self.assertEqual(ChatbotNLP.detect_intent('Hello there'), ('greeting', 0.75))
+        self.assertEqual(ChatbotNLP.detect_intent('can you help me')[0], 'help')
+
+    def test_no_match_falls_back_to_other(self):
+        self.assertEqual(ChatbotNLP.detect_intent('ok thanks'), ('other', 0.3))
+
+    def test_ordered_terms(self):
+        self.assertEqual(ChatbotNLP.detect_intent('anything over $500')[0], 'filter')
+        self.assertEqual(ChatbotNLP.detect_intent('$500 or over'), ('other', 0.3))
+        self.assertEqual(ChatbotNLP.detect_intent('how do I pay')[0], 'help')
+
+    def test_ranks_every_matching_intent(self):
+        ranked = ChatbotNLP.rank_intents('Find me cheap laptops under $900, what is the best one?')
+        self.assertEqual([intent for intent, _ in ranked], ['filter', 'search', 'comparison'])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+        self.assertEqual(ranked[1][1], ranked[2][1])
+        # Filter ranks first, but the message still asks for products
+        self.assertTrue(ChatbotNLP.parse('Find me cheap laptops under $900').asks_for_products)
+        self.assertFalse(ChatbotNLP.parse('sort by price').asks_for_products)
+
+class ParsedMessageTests(TestCase):
+    def setUp(self):
+        ChatbotNLP.clear_parse_cache()
+        catalog_gazetteer.invalidate()
+        self.electronics = Category.objects.get(name='Electronics')
+
+    def test_parse_extracts_search_parameters(self):
+        parsed = ChatbotNLP.parse('Find electronics between $100 and $500')
+        self.assertEqual(parsed.intent, 'search')
+        self.assertEqual((parsed.min_price, parsed.max_price), (100, 500))
+        self.assertEqual(parsed.category, self.electronics.id)
+        self.assertEqual(parsed.search_params['category'], self.electronics.id)
+        with self.assertRaises(FrozenInstanceError):
+            parsed.intent = 'other'
+
+    def test_parse_is_memoized_by_normalized_text(self):
+        ChatbotNLP.parse('warm up the gazetteer')
+        with self.assertNumQueries(0):
+            first = ChatbotNLP.parse('Show me  ELECTRONICS')
+            second = ChatbotNLP.parse('show me electronics ')
+        self.assertIs(first, second)
+
+    def test_category_changes_clear_the_cache(self):
+        first = ChatbotNLP.parse('show me electronics')
+        self.electronics.delete()
+        self.assertIsNone(ChatbotNLP.parse('show me electronics').category)
+        self.assertIsNotNone(first.category)
+
+class CatalogGazetteerTests(TestCase):
+    def setUp(self):
+        catalog_gazetteer.invalidate()
+        self.kitchen = Category.objects.get(name='Home & Kitchen')
+
+    def test_resolves_every_mention_in_one_scan(self):
+        catalog_gazetteer.refresh()
+        with self.assertNumQueries(0):
+            match = catalog_gazetteer.resolve('techmaster or audiopro gear for the kitchen, any electronic items')
+        self.assertEqual(match.brands, ('TechMaster', 'AudioPro'))
+        self.assertEqual(match.categories, (self.kitchen.id, Category.objects.get(name='Electronics').id))
+
+    def test_new_brands_are_added_by_signal(self):
+        catalog_gazetteer.refresh()
+        Product.objects.create(
+            name='Kettle', description='Fast kettle', category=self.kitchen,
+            price=30, sku='KET-1', brand='Brew Works'
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(catalog_gazetteer.resolve('a brew works kettle').brands, ('Brew Works',))
+
+class ContextStoreTests(SimpleTestCase):
+    def test_least_recently_used_entries_are_evicted(self):
+        store = LocalContextStore(max_entries=2, ttl=60)
+        store.set('a', 1)
+        store.set('b', 2)
+        store.get('a')
+        store.set('c', 3)
+        self.assertEqual((store.get('a'), store.get('b'), store.get('c')), (1, None, 3))
+
+    def test_entries_expire(self):
+        store = LocalContextStore(max_entries=10, ttl=60)
+        with mock.patch('chatbot.context.time.monotonic', return_value=1000.0):
+            store.set('a', 1)
+        with mock.patch('chatbot.context.time.monotonic', return_value=1059.0):
+            self.assertEqual(store.get('a'), 1)
+        with mock.patch('chatbot.context.time.monotonic', return_value=1060.0):
+            self.assertIsNone(store.get('a'))
+
+class FollowUpSearchTests(TestCase):
+    def setUp(self):
+        ChatbotNLP.clear_parse_cache()
+        catalog_gazetteer.invalidate()
+        catalog_snapshot.invalidate()
+        search_cache.clear()
+        conversation_contexts.clear()
+        self.addCleanup(catalog_snapshot.invalidate)
+        self.user = get_user_model().objects.create_user(
+            username='refiner', email='refiner@example.com', password='secret-pass'
+        )
+        self.client.force_login(self.user)
+        electronics = Category.objects.get(name='Electronics')
+        for index, (price, stock) in enumerate([(20, 0), (30, 5), (40, 5), (60, 0), (80, 5)]):
+            Product.objects.create(
+                name=f'Camp headlamp {index}', category=electronics, price=price, rating=4.0 + index / 10,
+                stock_quantity=stock, sku=f'CAMP-{index}', brand='Glowworm'
+            )
+
+    def send(self, message):
+        response = self.client.post('/api/chatbot/message/', {'message': message, 'session_id': 'camp'})
+        return response.json()['bot_response']['metadata']
+
+    def test_follow_ups_narrow_the_previous_results(self):
+        first = self.send('find a camp headlamp')
+        self.assertEqual(len(first['products']), 5)
+
+        in_stock = self.send('only in stock')
+        self.assertEqual(in_stock['intent'], 'search')
+        self.assertTrue(in_stock['search_params']['in_stock'])
+        self.assertEqual(sorted(p['price'] for p in in_stock['products']), ['30.00', '40.00', '80.00'])
+
+        cheaper = self.send('show me cheaper ones')
+        self.assertEqual([p['price'] for p in cheaper['products']], ['30.00'])
+        self.assertEqual(cheaper['search_params']['order_by'], 'price')
+
+        # A new search starts over
+        self.assertEqual(len(self.send('find a camp headlamp')['products']), 5)
+
+    def test_messages_naming_other_products_start_a_new_search(self):
+        Product.objects.create(
+            name='Trail smartwatch', category=Category.objects.get(name='Electronics'), price=150,
+            rating=4.2, stock_quantity=3, sku='WATCH-TRAIL', brand='Glowworm'
+        )
+        self.send('find a camp headlamp')
+
+        for message in ('I just want to find a smartwatch', 'smartwatch under $200'):
+            reply = self.send(message)
+            self.assertEqual(reply['intent'], 'search')
+            self.assertNotIn('headlamp', reply['search_params']['query'])
+            names = [p['name'] for p in reply['products']]
+            self.assertIn('Trail smartwatch', names)
+            self.assertFalse(any('headlamp' in name for name in names))
+
+        # Refinements now apply to the new search
+        in_stock = self.send('only the glowworm ones in stock')
+        self.assertIn('smartwatch', in_stock['search_params']['query'])
+        self.assertIn('Trail smartwatch', [p['name'] for p in in_stock['products']])
+
+    def test_follow_up_needs_no_new_product_terms(self):
+        self.assertTrue(ChatbotNLP.parse('only the ones under $50').follow_up)
+        self.assertTrue(ChatbotNLP.parse('show me cheaper glowworm ones').follow_up)
+        self.assertFalse(ChatbotNLP.parse('laptops under $2000').follow_up)
+        self.assertFalse(ChatbotNLP.parse('I just want to find a smartwatch').follow_up)
+        self.assertFalse(ChatbotNLP.parse('just looking').refers_back)
+
+    def test_narrowing_filters_only_read_the_cached_candidates(self):
+        context = search_products(ChatbotNLP.parse('find a camp headlamp'))[1]
+        self.assertTrue(context.complete)
+        self.assertEqual(len(context.product_ids), 5)
+        with mock.patch('chatbot.search.search_index.search_ids') as search_ids:
+            with self.assertNumQueries(1):  # loading the page of products
+                products, refined = search_products(ChatbotNLP.parse('only the ones under $50'), context)
+            search_ids.assert_not_called()
+        self.assertEqual(sorted(float(p.price) for p in products), [20.0, 30.0, 40.0])
+        self.assertEqual(refined.filters['max_price'], 50)
+
+        # Widening the price range has to look past the cached candidates
+        products, _ = search_products(ChatbotNLP.parse('just those under $70'), refined)
+        self.assertEqual(len(products), 4)
+
+    def test_context_is_per_user_and_cleared_on_reset(self):
+        self.send('find a camp headlamp')
+        other = get_user_model().objects.create_user(username='other', email='o@example.com', password='x')
+        self.assertIsNone(Conversation(other, 'camp').context)
+        self.assertIsNotNone(Conversation(self.user, 'camp').context)
+        self.client.post('/api/chatbot/sessions/camp/reset/')
+        self.assertIsNone(Conversation(self.user, 'camp').context)
+        self.assertEqual(self.send('only in stock')['intent'], 'error')
+
+class ChatMessageViewTests(TestCase):
+    def setUp(self):
+        ChatbotNLP.clear_parse_cache()
+        catalog_gazetteer.invalidate()
+        catalog_snapshot.invalidate()
+        search_cache.clear()
+        self.addCleanup(catalog_snapshot.invalidate)
+        self.user = get_user_model().objects.create_user(
+            username='shopper', email='shopper@example.com', password='secret-pass'
+        )
+        self.client.force_login(self.user)
+        Product.objects.create(
+            name='Trail headlamp', description='x' * 2000, category=Category.objects.get(name='Electronics'),
+            price=35, rating=4.6, stock_quantity=4, sku='LAMP-TRAIL', brand='Lumen',
+            image_url='data:image/png;base64,' + 'A' * 4000
+        )
+
+    def send(self, **body):
+        response = self.client.post('/api/chatbot/message/', {'message': 'find a trail headlamp', **body})
+        return response.json()['bot_response']
+
+    def test_search_metadata_is_compact_by_default(self):
+        bot_response = self.send()
+        product = bot_response['metadata']['products'][0]
+        self.assertEqual(set(product), set(COMPACT_PRODUCT_FIELDS))
+        self.assertEqual(product['price'], '35.00')
+        self.assertIn('Trail headlamp', bot_response['content'])
+
+    def test_stream_sends_intent_text_and_cards_then_persists(self):
+        response = self.client.post('/api/chatbot/message/stream/', {'message': 'find a trail headlamp'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertFalse(ChatMessage.objects.exists())
+
+        frames = b''.join(response.streaming_content).decode().strip().split('\n\n')
+        events = [(frame.split('\n')[0][len('event: '):], json.loads(frame.split('\n')[1][len('data: '):]))
+                  for frame in frames]
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], 'intent')
+        self.assertEqual(events[0][1]['intent'], 'search')
+        self.assertEqual(names[-2:], ['product', 'done'])
+        self.assertGreater(names.count('message'), 1)
+        text = ''.join(data['delta'] for name, data in events if name == 'message')
+        self.assertIn('Trail headlamp', text)
+
+        bot_msg = ChatMessage.objects.get(message_type='bot')
+        self.assertEqual(bot_msg.content, text)
+        self.assertEqual(bot_msg.metadata['products'], [events[-2][1]])
+        self.assertEqual(bot_msg.session.session_id, events[0][1]['session_id'])
+
+    async def test_stream_sends_frames_as_they_are_ready_under_asgi(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = await self.async_client.post(
+            '/api/chatbot/message/stream/', {'message': 'find a trail headlamp', 'session_id': 'sse-async'},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}'}
+        )
+        self.assertTrue(response.is_async)
+        chunks = aiter(response.streaming_content)
+        first = (await anext(chunks)).decode()
+        self.assertTrue(first.startswith('event: intent\n'))
+        # Nothing has been searched or written yet
+        self.assertFalse(await ChatMessage.objects.aexists())
+
+        rest = b''.join([chunk async for chunk in chunks]).decode()
+        self.assertTrue(rest.endswith('event: done\ndata: {"session_id": "sse-async"}\n\n'))
+        self.assertIn('event: product\n', rest)
+        self.assertEqual(await ChatMessage.objects.filter(session__session_id='sse-async').acount(), 2)
+
+    def test_disconnected_streams_store_the_whole_reply(self):
+        for frames_read in (1, 2):  # before the reply was built, and after its first text chunk
+            session_id = f'sse-gone-{frames_read}'
+            response = self.client.post('/api/chatbot/message/stream/',
+                                        {'message': 'find a trail headlamp', 'session_id': session_id})
+            chunks = iter(response.streaming_content)
+            for _ in range(frames_read):
+                next(chunks)
+            response.close()
+
+            bot_msg = ChatMessage.objects.get(session__session_id=session_id, message_type='bot')
+            self.assertIn('Trail headlamp', bot_msg.content)
+            self.assertEqual(bot_msg.metadata['intent'], 'search')
+            self.assertEqual([card['name'] for card in bot_msg.metadata['products']], ['Trail headlamp'])
+
+    async def test_disconnected_async_streams_store_the_whole_reply(self):
+        frames = astream_turn(self.user, 'sse-async-gone', 'find a trail headlamp',
+                              ProductFieldset.from_params({}, default='compact'))
+        self.assertTrue((await anext(frames)).startswith('event: intent\n'))
+        self.assertTrue((await anext(frames)).startswith('event: message\n'))
+        await frames.aclose()
+
+        bot_msg = await ChatMessage.objects.aget(session__session_id='sse-async-gone', message_type='bot')
+        self.assertEqual(bot_msg.metadata['intent'], 'search')
+        self.assertEqual([card['name'] for card in bot_msg.metadata['products']], ['Trail headlamp'])
+
+    def test_filter_led_messages_search_on_the_first_turn(self):
+        Product.objects.create(
+            name='Ultralight laptop', description='Thin and light', category=Category.objects.get(name='Electronics'),
+            price=799, rating=4.1, stock_quantity=2, sku='LAPTOP-LIGHT', brand='Featherbook'
+        )
+        for index, message in enumerate(['cheap laptops under $900', 'Find me cheap laptops under $900']):
+            response = self.client.post('/api/chatbot/message/', {'message': message, 'session_id': f'first-{index}'})
+            metadata = response.json()['bot_response']['metadata']
+            self.assertEqual(metadata['intent'], 'search', message)
+            self.assertEqual(metadata['search_params']['max_price'], 900)
+            self.assertIn('Ultralight laptop', [p['name'] for p in metadata['products']])
+
+    def test_turns_record_how_many_products_a_search_showed(self):
+        self.send()
+        self.send(message='hello there')
+        counts = list(UserIntent.objects.order_by('id').values_list('intent_type', 'result_count'))
+        self.assertEqual(counts, [('search', 1), ('greeting', None)])
+
+    def test_full_view_and_fields_are_honoured(self):
+        self.assertIn('image_url', self.send(view='full')['metadata']['products'][0])
+        self.assertEqual(self.send(fields='sku')['metadata']['products'], [{'sku': 'LAMP-TRAIL'}])
+
+class ChatHistoryViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='secret-pass'
+        )
+        self.client.force_login(self.user)
+        self.sessions = [ChatSession.objects.create(user=self.user, session_id=f'history-{index}') for index in range(3)]
+        for session in self.sessions:
+            ChatMessage.objects.bulk_create([
+                ChatMessage(session=session, message_type='user' if index % 2 else 'bot', content=f'message {index} ' * 20)
+                for index in range(7)
+            ])
+
+    def test_session_list_is_one_summary_query(self):
+        with self.assertNumQueries(3):  # session + user lookups for auth, then the summaries
+            sessions = self.client.get('/api/chatbot/sessions/').json()['sessions']
+        self.assertEqual(len(sessions), 3)
+        self.assertEqual(sessions[0]['message_count'], 7)
+        self.assertTrue(sessions[0]['last_message'].startswith('message 6'))
+        self.assertLessEqual(len(sessions[0]['last_message']), 80)
+        self.assertNotIn('messages', sessions[0])
+
+    def test_messages_page_backward_from_the_newest(self):
+        url = '/api/chatbot/sessions/history-0/messages/'
+        page = self.client.get(url, {'page_size': 3}).json()
+        self.assertEqual([m['content'].split()[1] for m in page['messages']], ['4', '5', '6'])
+        seen = page['messages']
+        while page['previous_cursor']:
+            page = self.client.get(url, {'page_size': 3, 'before': page['previous_cursor']}).json()
+            seen = page['messages'] + seen
+        self.assertEqual([m['content'].split()[1] for m in seen], [str(index) for index in range(7)])
+
+        detail = self.client.get('/api/chatbot/sessions/history-0/', {'page_size': 2}).json()
+        self.assertEqual((detail['message_count'], len(detail['messages'])), (7, 2))
+        self.assertEqual(self.client.get('/api/chatbot/sessions/history-9/messages/').status_code, 404)
+
+    def test_history_views_use_indexes(self):
+        cursor = self.client.get('/api/chatbot/sessions/history-0/messages/', {'page_size': 3}).json()['previous_cursor']
+        requests = [
+            ('/api/chatbot/sessions/', {}),
+            ('/api/chatbot/sessions/history-0/', {}),
+            ('/api/chatbot/sessions/history-0/messages/', {'before': cursor}),
+        ]
+        for url, params in requests:
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url, params).status_code, 200)
+            scans = full_scans(queries.captured_queries, ['chatbot_chatsession', 'chatbot_chatmessage'])
+            self.assertEqual(scans, [])
+
+@override_settings(CHAT_SESSION_IDLE_DAYS=30, CHAT_ARCHIVE_AFTER_DAYS=90)
+class ChatRetentionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = get_user_model().objects.create_user(
+            username='keeper', email='keeper@example.com', password='secret-pass'
+        )
+        self.other = get_user_model().objects.create_user(
+            username='other', email='other@example.com', password='secret-pass'
+        )
+        self.client.force_login(self.user)
+        for user, session_id, days in [
+            (self.user, 'fresh', 0), (self.user, 'idle', 40), (self.user, 'old', 100), (self.other, 'theirs', 100),
+        ]:
+            for turn in range(3):
+                persist_turn(user, session_id, f'find boots {turn}', f'Here are boots {turn}',
+                             {'intent': 'search', 'products': [{'id': turn, 'name': 'Boot'}]},
+                             intent={'intent_type': 'search', 'confidence': 0.9, 'parameters': {'query': 'boots'}})
+            ChatSession.objects.filter(session_id=session_id).update(updated_at=timezone.now() - timedelta(days=days))
+
+    def sweep(self):
+        stdout = StringIO()
+        call_command('sweep_chat_sessions', stdout=stdout)
+        return stdout.getvalue()
+
+    def test_sweep_expires_then_archives_sessions(self):
+        before = self.client.get('/api/chatbot/sessions/old/', {'page_size': 200}).json()
+        output = self.sweep()
+        self.assertIn('Marked 3 idle sessions inactive', output)
+        self.assertIn('Archived 2 sessions with 12 messages into 2 files', output)
+
+        self.assertEqual(dict(ChatSession.objects.values_list('session_id', 'is_active')), {'fresh': True, 'idle': False})
+        self.assertFalse(ChatMessage.objects.filter(session__session_id__in=['old', 'theirs']).exists())
+        self.assertEqual(UserIntent.objects.count(), 6)
+        listed = self.client.get('/api/chatbot/sessions/').json()['sessions']
+        self.assertEqual([session['session_id'] for session in listed], ['fresh'])
+
+        archived = self.client.get('/api/chatbot/sessions/old/').json()
+        self.assertTrue(archived['archived'])
+        self.assertEqual(archived['messages'], before['messages'])
+        for field in ('id', 'session_id', 'created_at', 'updated_at', 'message_count', 'last_message', 'last_activity'):
+            self.assertEqual(archived[field], before[field], field)
+        self.assertEqual(self.client.get('/api/chatbot/sessions/theirs/').status_code, 404)
+
+        entry = ChatArchive.objects.get(session_id='old')
+        with default_storage.open(entry.path, 'rb') as stream, gzip.open(stream, 'rt') as lines:
+            records = [json.loads(line) for line in lines]
+        self.assertEqual([record['session_id'] for record in records], ['old'])
+        self.assertEqual(len(records[0]['intents']), 3)
+
+        self.assertEqual(self.client.delete('/api/chatbot/sessions/old/delete/').status_code, 200)
+        self.assertEqual(self.client.get('/api/chatbot/sessions/old/').status_code, 404)
+        self.assertEqual(self.sweep().splitlines()[-1], 'Archived 0 sessions with 0 messages into 0 files')
+
+    def test_deleting_an_archived_session_removes_it_from_the_file(self):
+        ChatSession.objects.filter(session_id='idle').update(updated_at=timezone.now() - timedelta(days=100))
+        self.sweep()
+        before = self.client.get('/api/chatbot/sessions/idle/', {'page_size': 200}).json()
+        old_path = ChatArchive.objects.get(session_id='old').path
+        self.assertEqual(ChatArchive.objects.get(session_id='idle').path, old_path)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/api/chatbot/sessions/old/delete/').status_code, 200)
+        self.assertFalse(default_storage.exists(old_path))
+        entry = ChatArchive.objects.get(session_id='idle')
+        with default_storage.open(entry.path, 'rb') as stream:
+            data = stream.read()
+        self.assertNotIn(b'"old"', gzip.decompress(data))
+        self.assertEqual([json.loads(line)['session_id'] for line in gzip.decompress(data).splitlines()], ['idle'])
+        self.assertEqual(self.client.get('/api/chatbot/sessions/idle/', {'page_size': 200}).json(), before)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete('/api/chatbot/sessions/idle/delete/').status_code, 200)
+        self.assertFalse(default_storage.exists(entry.path))
+        self.assertEqual(list(ChatArchive.objects.values_list('session_id', flat=True)), ['theirs'])
+
+    def test_new_messages_keep_sessions_out_of_the_archive(self):
+        ChatSession.objects.update(is_active=False)
+        persist_turn(self.user, 'idle', 'hello again', 'hi', {'intent': 'greeting'})
+        self.assertTrue(ChatSession.objects.get(session_id='idle').is_active)
+
+        write_archive = retention.write_archive
+        def write_during_a_turn(user_id, sessions, records, archived_at):
+            entries = write_archive(user_id, sessions, records, archived_at)
+            if user_id == self.user.pk:
+                persist_turn(self.user, 'old', 'still there?', 'yes', {'intent': 'other'})
+            return entries
+        with mock.patch('chatbot.retention.write_archive', side_effect=write_during_a_turn):
+            self.sweep()
+        self.assertEqual(ChatSession.objects.get(session_id='old').messages.count(), 8)
+        self.assertEqual(list(ChatArchive.objects.values_list('session_id', flat=True)), ['theirs'])
+
+@override_settings(CHAT_ANALYTICS_LOW_CONFIDENCE=0.5)
+class ChatAnalyticsTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='merch', email='merch@example.com', password='secret-pass', is_staff=True
+        )
+        self.client.force_login(self.staff)
+        self.session = ChatSession.objects.create(user=self.staff, session_id='analytics')
+        self.electronics = Category.objects.get(name='Electronics')
+        self.now = timezone.now()
+
+    def log(self, intent_type, confidence=0.9, hours_ago=0, result_count=None, **parameters):
+        intent = UserIntent.objects.create(
+            session=self.session, intent_type=intent_type, confidence=confidence,
+            parameters=parameters, result_count=result_count,
+        )
+        UserIntent.objects.filter(pk=intent.pk).update(created_at=self.now - timedelta(hours=hours_ago))
+
+    def fold(self, **options):
+        stdout = StringIO()
+        call_command('rollup_chat_analytics', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_each_run_folds_only_new_intents(self):
+        self.log('search', result_count=3, brand='Lumen', max_price=80, hours_ago=2)
+        self.log('search', confidence=0.3, result_count=0, category=self.electronics.pk, hours_ago=2)
+        self.log('greeting', hours_ago=1)
+        self.assertIn('Folded 3 intents', self.fold(batch_size=2))
+        self.assertIn('Folded 0 intents', self.fold())
+
+        self.log('search', result_count=0, brand='Lumen', hours_ago=2)
+        self.assertIn('Folded 1 intents', self.fold())
+        search = IntentRollup.objects.get(intent_type='search')
+        self.assertEqual(search.hour, self.now.replace(minute=0, second=0, microsecond=0) - timedelta(hours=2))
+        self.assertEqual(
+            (search.count, search.low_confidence_count, search.search_count, search.zero_result_count), (3, 1, 3, 2)
+        )
+        self.assertAlmostEqual(search.confidence_sum, 2.1)
+        terms = dict(((term.dimension, term.value), term.count) for term in SearchTermRollup.objects.all())
+        self.assertEqual(terms, {
+            ('brand', 'Lumen'): 2, ('category', str(self.electronics.pk)): 1, ('price_band', '50-100'): 1,
+        })
+
+    def test_dashboard_is_served_from_the_rollups(self):
+        for brand in ('Lumen', 'Lumen', 'Stride'):
+            self.log('search', result_count=2, brand=brand, max_price=30)
+        self.log('search', confidence=0.2, result_count=0, category=self.electronics.pk, min_price=2000)
+        self.log('help', confidence=0.4)
+        self.log('search', result_count=1, hours_ago=48)
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/chatbot/analytics/').json()
+        self.assertEqual(full_scans(queries.captured_queries, ['chatbot_userintent']), [])
+        self.assertEqual((data['turns'], data['searches']), (5, 4))
+        self.assertEqual((data['low_confidence_rate'], data['zero_result_rate']), (0.4, 0.25))
+        self.assertEqual(data['intents'][0], {
+            'intent_type': 'search', 'count': 4, 'low_confidence_rate': 0.25, 'avg_confidence': 0.725,
+        })
+        self.assertEqual(data['top_brands'], [{'brand': 'Lumen', 'count': 2}, {'brand': 'Stride', 'count': 1}])
+        self.assertEqual(data['top_categories'], [{'id': self.electronics.pk, 'name': 'Electronics', 'count': 1}])
+        self.assertEqual(data['price_bands'], [{'band': '25-50', 'count': 3}, {'band': '1000+', 'count': 1}])
+        self.assertEqual(data['folded_through'], UserIntent.objects.latest('id').id)
+
+        since = (self.now - timedelta(days=3)).isoformat()
+        self.assertEqual(self.client.get('/api/chatbot/analytics/', {'since': since}).json()['turns'], 6)
+        self.assertEqual(self.client.get('/api/chatbot/analytics/', {'since': 'last week'}).status_code, 400)
+        self.client.force_login(get_user_model().objects.create_user(
+            username='shopper', email='shopper@example.com', password='secret-pass'
+        ))
+        self.assertEqual(self.client.get('/api/chatbot/analytics/').status_code, 403)
+
+class TurnPersistenceTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='racer', email='racer@example.com', password='secret-pass'
+        )
+
+    def test_parallel_turns_share_one_session(self):
+        threads, turns, errors = 8, 5, []
+
+        def chat(worker):
+            try:
+                for turn in range(turns):
+                    persist_turn(
+                        self.user, 'shared-session', f'hello {worker}.{turn}', 'hi', {'intent': 'greeting'},
+                        intent={'intent_type': 'greeting', 'confidence': 0.9, 'parameters': {}},
+                    )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [Thread(target=chat, args=(worker,)) for worker in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual(errors, [])
+        session = ChatSession.objects.get(session_id='shared-session')
+        self.assertEqual(session.messages.count(), threads * turns * 2)
+        self.assertEqual(session.intents.count(), threads * turns)
+        self.assertGreater(session.updated_at, session.created_at)
+
+    def test_turn_is_written_in_one_transaction(self):
+        other = get_user_model().objects.create_user(
+            username='owner', email='owner@example.com', password='secret-pass'
+        )
+        ChatSession.objects.create(user=other, session_id='taken')
+        with self.assertRaises(ChatSession.DoesNotExist):
+            persist_turn(self.user, 'taken', 'hello', 'hi', {})
+        self.assertFalse(ChatMessage.objects.exists())
+
+        with self.assertNumQueries(6):  # BEGIN, upsert, session lookup, messages, intent, COMMIT
+            session, user_msg, bot_msg = persist_turn(
+                self.user, 'fresh', 'hello', 'hi', {}, intent={'intent_type': 'greeting', 'confidence': 1.0}
+            )
+        self.assertEqual(list(session.messages.all()), [user_msg, bot_msg])
+
+class AsyncChatViewTests(TestCase):
+    def setUp(self):
+        ChatbotNLP.clear_parse_cache()
+        catalog_gazetteer.invalidate()
+        self.user = get_user_model().objects.create_user(
+            username='async', email='async@example.com', password='secret-pass'
+        )
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    async def test_turns_and_history_over_the_async_views(self):
+        response = await self.async_client.post(
+            '/api/chatbot/async/message/', {'message': 'hello there', 'session_id': 'async-1'},
+            content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['intent'], 'greeting')
+
+        sessions = (await self.async_client.get('/api/chatbot/async/sessions/', headers=self.headers)).json()['sessions']
+        self.assertEqual([(s['session_id'], s['message_count']) for s in sessions], [('async-1', 2)])
+        page = (await self.async_client.get(
+            '/api/chatbot/async/sessions/async-1/messages/', {'page_size': 1}, headers=self.headers
+        )).json()
+        self.assertEqual(page['messages'][0]['message_type'], 'bot')
+        older = await self.async_client.get(
+            '/api/chatbot/async/sessions/async-1/messages/', {'before': page['previous_cursor']}, headers=self.headers
+        )
+        self.assertEqual(older.json()['messages'][0]['content'], 'hello there')
+        detail = (await self.async_client.get('/api/chatbot/async/sessions/async-1/', headers=self.headers)).json()
+        self.assertEqual(len(detail['messages']), 2)
+
+    async def test_authentication_and_validation_errors(self):
+        self.assertEqual((await self.async_client.get('/api/chatbot/async/sessions/')).status_code, 401)
+        response = await self.async_client.post(
+            '/api/chatbot/async/message/', {}, content_type='application/json', headers=self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('message', response.json())
+        self.assertEqual((await self.async_client.get('/api/chatbot/async/sessions/missing/', headers=self.headers)).status_code, 404)
+        self.assertEqual((await self.async_client.get('/api/chatbot/async/message/', headers=self.headers)).status_code, 405)
+
+class AsyncSearchTests(TransactionTestCase):
+    """Searches run in a thread pool with their own connections, so the rows have to be committed"""
+
+    def setUp(self):
+        ChatbotNLP.clear_parse_cache()
+        catalog_gazetteer.invalidate()
+        catalog_snapshot.invalidate()
+        search_cache.clear()
+        self.addCleanup(catalog_snapshot.invalidate)
+        user = get_user_model().objects.create_user(username='async-search', email='as@example.com', password='x')
+        self.headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        Product.objects.create(
+            name='Summit headlamp', description='Bright', category=Category.objects.create(name='Lighting'),
+            price=45, rating=4.4, stock_quantity=2, sku='LAMP-SUMMIT', brand='Lumen'
+        )
+
+    async def test_concurrent_searches_run_off_the_request_thread(self):
+        async def turn(session_id):
+            response = await self.async_client.post(
+                '/api/chatbot/async/message/', {'message': 'find a summit headlamp', 'session_id': session_id},
+                content_type='application/json', headers=self.headers
+            )
+            return response.json()['bot_response']['metadata']
+
+        threads = []
+
+        def reply(*args):
+            threads.append(threading.get_ident())
+            return generate_reply(*args)
+
+        with mock.patch('chatbot.async_views.generate_reply', side_effect=reply):
+            results = await asyncio.gather(*(turn(f'lamp-{index}') for index in range(4)))
+        self.assertEqual([[p['name'] for p in metadata['products']] for metadata in results],
+                         [['Summit headlamp']] * 4)
+        # Not the thread-sensitive executor, which is the main thread under the test runner
+        self.assertEqual(len(threads), 4)
+        self.assertNotIn(threading.main_thread().ident, threads)
+
+class WebSocketClient:
+    """Drives an ASGI application over a websocket scope through in-memory queues"""
+
+    def __init__(self, application, path, query_string=''):
+        self.inbox, self.outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {'type': 'websocket', 'path': path, 'query_string': query_string.encode(), 'headers': []}
+        self.task = asyncio.ensure_future(application(scope, self.inbox.get, self.outbox.put))
+
+    async def connect(self):
+        await self.inbox.put({'type': 'websocket.connect'})
+        return await self.event()
+
+    async def event(self):
+        return await asyncio.wait_for(self.outbox.get(), timeout=5)
+
+    async def send(self, **frame):
+        await self.inbox.put({'type': 'websocket.receive', 'text': json.dumps(frame)})
+
+    async def frames_until_done(self):
+        frames = []
+        while not frames or frames[-1]['type'] not in ('done', 'pong'):
+            frames.append(json.loads((await self.event())['text']))
+        return frames
+
+    async def disconnect(self):
+        await self.inbox.put({'type': 'websocket.disconnect', 'code': 1000})
+        await asyncio.wait_for(self.task, timeout=5)
+
+class ChatWebSocketTests(TestCase):
+    def setUp(self):
+        ChatbotNLP.clear_parse_cache()
+        catalog_gazetteer.invalidate()
+        catalog_snapshot.invalidate()
+        search_cache.clear()
+        self.addCleanup(catalog_snapshot.invalidate)
+        self.user = get_user_model().objects.create_user(
+            username='socket', email='socket@example.com', password='secret-pass'
+        )
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        Product.objects.create(
+            name='Trail headlamp', category=Category.objects.get(name='Electronics'),
+            price=35, rating=4.6, stock_quantity=4, sku='LAMP-TRAIL', brand='Lumen'
+        )
+
+    async def test_turns_share_the_connection_session(self):
+        from ecommerce_backend.asgi import application
+        client = WebSocketClient(application, '/ws/chat/', f'token={self.token}&session_id=ws-1')
+        self.assertEqual(await client.connect(), {'type': 'websocket.accept'})
+        self.assertEqual(json.loads((await client.event())['text']), {'type': 'session', 'session_id': 'ws-1'})
+
+        await client.send(message='find a trail headlamp')
+        frames = await client.frames_until_done()
+        types = [frame['type'] for frame in frames]
+        self.assertEqual(types[0], 'intent')
+        self.assertEqual(types[-2:], ['product', 'done'])
+        self.assertEqual(set(frames[-2]['product']), set(COMPACT_PRODUCT_FIELDS))
+        self.assertIn('Trail headlamp', ''.join(f['delta'] for f in frames if f['type'] == 'message'))
+
+        await client.send(message='hello there')
+        frames = await client.frames_until_done()
+        self.assertEqual(frames[0]['intent'], 'greeting')
+        self.assertEqual(frames[-1]['bot_response']['message_type'], 'bot')
+        await client.send(type='ping')
+        self.assertEqual(await client.frames_until_done(), [{'type': 'pong'}])
+        await client.send(text='no message')
+        self.assertEqual(json.loads((await client.event())['text'])['type'], 'error')
+        await client.disconnect()
+
+        session = await ChatSession.objects.aget(session_id='ws-1')
+        self.assertEqual(await session.messages.acount(), 4)
+        self.assertEqual(await session.intents.acount(), 2)
+
+    async def test_turns_recreate_a_session_deleted_mid_connection(self):
+        from ecommerce_backend.asgi import application
+        client = WebSocketClient(application, '/ws/chat/', f'token={self.token}&session_id=ws-gone')
+        self.assertEqual(await client.connect(), {'type': 'websocket.accept'})
+        await client.event()
+        await ChatSession.objects.filter(session_id='ws-gone').adelete()
+
+        await client.send(message='find a trail headlamp')
+        self.assertEqual((await client.frames_until_done())[-1]['type'], 'done')
+        await client.send(message='hello there')
+        self.assertEqual((await client.frames_until_done())[-1]['type'], 'done')
+        await client.disconnect()
+
+        session = await ChatSession.objects.aget(session_id='ws-gone', user=self.user)
+        self.assertEqual(await session.messages.acount(), 4)
+
+    async def test_turn_errors_keep_the_connection_open_when_the_session_is_taken(self):
+        from ecommerce_backend.asgi import application
+        client = WebSocketClient(application, '/ws/chat/', f'token={self.token}&session_id=ws-taken')
+        self.assertEqual(await client.connect(), {'type': 'websocket.accept'})
+        await client.event()
+        other = await get_user_model().objects.acreate(username='other-socket')
+        await ChatSession.objects.filter(session_id='ws-taken').adelete()
+        await ChatSession.objects.acreate(user=other, session_id='ws-taken')
+
+        await client.send(message='hello there')
+        frame = json.loads((await client.event())['text'])
+        while frame['type'] != 'error':
+            frame = json.loads((await client.event())['text'])
+        self.assertEqual(frame['detail'], 'This chat session is no longer available.')
+        await client.send(type='ping')
+        self.assertEqual(await client.frames_until_done(), [{'type': 'pong'}])
+        await client.disconnect()
+
+    async def test_handshake_is_refused_without_a_valid_token(self):
+        from ecommerce_backend.asgi import application
+        for query_string in ('', 'token=not-a-jwt'):
+            client = WebSocketClient(application, '/ws/chat/', query_string)
+            self.assertEqual(await client.connect(), {'type': 'websocket.close', 'code': 4401})
+            await asyncio.wait_for(client.task, timeout=5)
+        client = WebSocketClient(application, '/ws/other/')
+        self.assertEqual(await client.connect(), {'type': 'websocket.close', 'code': 4404})
+
+@tag('benchmark')
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ApiBenchmarkTests(TestCase):
+    """Smoke run of the API benchmark suite; ``manage.py bench_api`` runs it at full size"""
+
+    def setUp(self):
+        search_cache.clear()
+        conversation_contexts.clear()
+        catalog_gazetteer.invalidate()
+        seed_catalog(200)
+
+    def test_every_endpoint_is_measured(self):
+        benchmark = ApiBenchmark(repeat=4, sessions=2, messages=4)
+        benchmark.prepare()
+        for cold in (False, True):
+            benchmark.cold = cold
+            results = benchmark.run()
+            self.assertEqual(set(results), {
+                'search_products', 'ProductListView', 'CategoryListView', 'get_brands', 'chat_message', 'chat_sessions',
+            })
+            for result in results.values():
+                self.assertEqual(result['requests'], 4)
+                self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+                self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+                self.assertGreater(result['bytes_per_request'], 0)
+        self.assertEqual(ChatSession.objects.filter(user__username='bench').count(), 3)
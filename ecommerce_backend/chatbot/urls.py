@@ -1,14 +1,24 @@
 from django.urls import path
+from . import async_views
 from .views import (
-    chat_message, chat_sessions, chat_session_detail,
-    reset_chat_session, delete_chat_session, product_details_for_chat
+    chat_message, chat_message_stream, chat_sessions, chat_session_detail, chat_session_messages,
+    reset_chat_session, delete_chat_session, product_details_for_chat, chat_analytics
 )
 
 urlpatterns = [
     path('message/', chat_message, name='chat-message'),
+    path('message/stream/', chat_message_stream, name='chat-message-stream'),
     path('sessions/', chat_sessions, name='chat-sessions'),
     path('sessions/<str:session_id>/', chat_session_detail, name='chat-session-detail'),
+    path('sessions/<str:session_id>/messages/', chat_session_messages, name='chat-session-messages'),
     path('sessions/<str:session_id>/reset/', reset_chat_session, name='reset-chat-session'),
     path('sessions/<str:session_id>/delete/', delete_chat_session, name='delete-chat-session'),
     path('product/<int:product_id>/', product_details_for_chat, name='product-details-chat'),
+    path('analytics/', chat_analytics, name='chat-analytics'),
+    # Async variants for ASGI servers; not faster than the views above, see async_views
+    path('async/message/', async_views.chat_message, name='async-chat-message'),
+    path('async/sessions/', async_views.chat_sessions, name='async-chat-sessions'),
+    path('async/sessions/<str:session_id>/', async_views.chat_session_detail, name='async-chat-session-detail'),
+    path('async/sessions/<str:session_id>/messages/', async_views.chat_session_messages,
+         name='async-chat-session-messages'),
 ]
\ No newline at end of file
@@ -1,67 +1,283 @@
 import re
-from typing import Dict, List, Any, Tuple
-from products.models import Category
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Any, Optional, Tuple
+from django.conf import settings
 from products.models import Product
+from .gazetteer import catalog_gazetteer, tokenize
+
+class IntentMatcher:
+    """Score every intent against a message in a single pass over its words.
+
+    Each intent is described by rules, and each rule is a sequence of terms
+    that must all appear in the message, in order. A term is a set of
+    alternative phrases separated by ``|``; ``$`` stands for a dollar amount.
+    All phrases are indexed by their first word, so a message is tokenized
+    once and each word costs one dict lookup no matter how many intents or
+    rules are registered.
+    """
+
+    TOKEN_PATTERN = re.compile(r'\$(?=[\d,])|\w+')
+
+    def __init__(self, rules: Dict[str, List[Tuple[str, ...]]]):
+        terms = []
+        for intent_rules in rules.values():
+            for rule in intent_rules:
+                for term in rule:
+                    if term not in terms:
+                        terms.append(term)
+
+        self.phrases = {}
+        for index, term in enumerate(terms):
+            for phrase in term.split('|'):
+                words = tuple(phrase.split())
+                self.phrases.setdefault(words[0], []).append((words, index))
+
+        self.intents = list(rules)
+        self.rules = [
+            (intent, tuple(terms.index(term) for term in rule))
+            for intent, intent_rules in rules.items()
+            for rule in intent_rules
+        ]
+        self.rules_by_term = {}
+        for rule in self.rules:
+            self.rules_by_term.setdefault(rule[1][0], []).append(rule)
+
+    def scan(self, message: str) -> Dict[int, Tuple[int, int]]:
+        """Map each term found in the message to (first match end, last match start)"""
+        tokens = self.TOKEN_PATTERN.findall(message)
+        spans = {}
+        for start, token in enumerate(tokens):
+            candidates = self.phrases.get(token)
+            if not candidates:
+                continue
+            for words, term in candidates:
+                end = start + len(words)
+                if len(words) == 1 or tuple(tokens[start:end]) == words:
+                    first = spans.get(term)
+                    spans[term] = (first[0], start) if first else (end, start)
+        return spans
+
+    def score(self, message: str) -> Dict[str, int]:
+        """Count the satisfied rules of every intent that matched at least once"""
+        spans = self.scan(message)
+        scores = {}
+        for term in spans:
+            for intent, rule in self.rules_by_term.get(term, ()):
+                if all(t in spans for t in rule) and all(
+                    spans[prev][0] <= spans[t][1] for prev, t in zip(rule, rule[1:])
+                ):
+                    scores[intent] = scores.get(intent, 0) + 1
+        return scores
+
+    def rank(self, message: str) -> List[Tuple[str, float]]:
+        """Return matched intents ordered by score with their confidences.
+
+        Confidence grows with the number of rules an intent satisfies and is
+        discounted by the share of evidence claimed by competing intents.
+        Ties keep the declaration order of the rules.
+        """
+        scores = self.score(message)
+        total = sum(scores.values())
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.intents.index(item[0])))
+        return [
+            (intent, round((1 - 0.5 ** (hits + 1)) * (0.5 + 0.5 * hits / total), 3))
+            for intent, hits in ranked
+        ]
+
+@dataclass(frozen=True)
+class ParsedMessage:
+    """Everything the chatbot extracts from one user message.
+
+    Built once per message by ``ChatbotNLP.parse`` and shared by intent
+    logging, product search and response generation.
+    """
+    intent: str
+    confidence: float
+    intents: Tuple[Tuple[str, float], ...] = ()
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    brands: Tuple[str, ...] = ()
+    categories: Tuple[int, ...] = ()
+    query_tokens: Tuple[str, ...] = ()
+    refinements: Tuple[str, ...] = ()
+    refers_back: bool = False
+    product_terms: Tuple[str, ...] = ()
+
+    @property
+    def asks_for_products(self) -> bool:
+        """Whether the message should be answered with products on its own.
+
+        Any ranked search intent counts, not just the top one, and so does a
+        filter naming what to filter: "cheap laptops under $900" ranks filter
+        first but is still a search.
+        """
+        ranked = {intent for intent, _ in self.intents} | {self.intent}
+        if 'search' in ranked:
+            return True
+        return 'filter' in ranked and bool(self.product_terms or self.brands or self.categories)
+
+    @property
+    def narrows_search(self) -> bool:
+        """Whether the message filters, refines or refers back to a search"""
+        return bool(self.refinements) or self.refers_back or self.intent == 'filter'
+
+    @property
+    def follow_up(self) -> bool:
+        """Whether the message reads as a refinement of the previous search.
+
+        A message naming products of its own (``product_terms``) starts a
+        new search even when it also filters or refers back.
+        """
+        return self.narrows_search and not self.product_terms
+
+    @property
+    def brand(self) -> Optional[str]:
+        return self.brands[0] if self.brands else None
+
+    @property
+    def category(self) -> Optional[int]:
+        return self.categories[0] if self.categories else None
+
+    @property
+    def query(self) -> str:
+        return ' '.join(self.query_tokens)
+
+    @property
+    def search_params(self) -> Dict[str, Any]:
+        """Search parameters in the dict form stored on UserIntent and bot metadata"""
+        params = {}
+        if self.min_price is not None:
+            params['min_price'] = self.min_price
+        if self.max_price is not None:
+            params['max_price'] = self.max_price
+        if self.brand:
+            params['brand'] = self.brand
+        if self.category is not None:
+            params['category'] = self.category
+        if self.query_tokens:
+            params['query'] = self.query
+        return params
 
 class ChatbotNLP:
     """Simple NLP processor for chatbot intent recognition"""
     
-    # Intent patterns
-    INTENT_PATTERNS = {
+    # Intent rules: each rule lists terms that must appear in order
+    INTENT_RULES = {
         'greeting': [
-            r'\b(hi|hello|hey|good morning|good afternoon|good evening)\b',
-            r'\bstart\b',
+            ('hi|hello|hey|good morning|good afternoon|good evening',),
+            ('start',),
         ],
         'search': [
-            r'\b(search|find|look for|show me|get me)\b',
-            r'\b(products?|items?)\b.*\b(with|having|contains?)\b',
-            r'\bwant\b.*\b(buy|purchase)\b',
+            ('search|find|look for|show me|get me',),
+            ('product|products|item|items', 'with|having|contain|contains'),
+            ('want', 'buy|purchase'),
         ],
         'filter': [
-            r'\b(filter|sort|order by|arrange)\b',
-            r'\b(under|below|above|over)\b.*\$([\d,]+)',
-            r'\b(cheap|expensive|budget|premium)\b',
+            ('filter|sort|order by|arrange',),
+            ('under|below|above|over', '$'),
+            ('cheap|expensive|budget|premium',),
         ],
         'details': [
-            r'\b(details?|info|information|specs?|specifications?)\b',
-            r'\btell me (about|more)\b',
+            ('detail|details|info|information|spec|specs|specification|specifications',),
+            ('tell me about|tell me more',),
         ],
         'comparison': [
-            r'\b(compare|vs|versus|difference)\b',
-            r'\b(better|best|worst)\b',
+            ('compare|vs|versus|difference',),
+            ('better|best|worst',),
         ],
         'help': [
-            r'\b(help|assist|support)\b',
-            r'\bhow (do|can) i\b',
+            ('help|assist|support',),
+            ('how do i|how can i',),
         ]
     }
     
     # Product attribute patterns
     ATTRIBUTE_PATTERNS = {
-        'price_range': r'\$?([\d,]+)\s*-\s*\$?([\d,]+)|\$?([\d,]+)\s*(to|and)\s*\$?([\d,]+)',
+        'price_range': r'\$?([\d,]+)\s*-\s*\$?([\d,]+)|\$?([\d,]+)\s*(?:to|and)\s*\$?([\d,]+)',
         'max_price': r'under\s*\$?([\d,]+)|below\s*\$?([\d,]+)|less than\s*\$?([\d,]+)',
         'min_price': r'above\s*\$?([\d,]+)|over\s*\$?([\d,]+)|more than\s*\$?([\d,]+)',
-        'brand': r'\b(apple|samsung|sony|lg|dell|hp|lenovo|asus|acer|nike|adidas|puma)\b',
-        'category': r'\b(laptop|phone|tablet|headphone|speaker|shoe|shirt|book|electronics|clothing)\b',
+    }
+
+    # Phrases that refine the previous search rather than start a new one
+    REFINEMENT_PATTERNS = {
+        'cheaper': r'\b(?:cheaper|less expensive|more affordable|lower priced)\b',
+        'pricier': r'\b(?:pricier|more expensive|higher end)\b',
+        'in_stock': r'\b(?:in stock|available)\b',
+        'top_rated': r'\b(?:better|higher|top|best) rated\b',
+    }
+    REFERS_BACK_PATTERN = r'\b(?:ones|them|those|these)\b'
+    # Query words that filter, refine or refer back rather than name a product
+    FOLLOW_UP_WORDS = {
+        'ones', 'them', 'those', 'these', 'only', 'just', 'one', 'any', 'all', 'please', 'instead', 'now',
+        'under', 'below', 'above', 'over', 'less', 'more', 'than', 'between', 'and', 'from', 'with', 'price',
+        'priced', 'cheap', 'cheaper', 'expensive', 'affordable', 'lower', 'pricier', 'higher', 'end', 'budget',
+        'premium', 'stock', 'available', 'better', 'best', 'top', 'rated', 'filter', 'sort', 'order', 'arrange',
     }
 
+    @classmethod
+    def rank_intents(cls, message: str) -> List[Tuple[str, float]]:
+        """Rank every intent the message matches, best first"""
+        return INTENT_MATCHER.rank(message.lower())
+
     @classmethod
     def detect_intent(cls, message: str) -> Tuple[str, float]:
         """Detect user intent from message"""
-        message_lower = message.lower()
-        
-        for intent, patterns in cls.INTENT_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, message_lower):
-                    return intent, 0.8
+        ranked = cls.rank_intents(message)
+        if ranked:
+            return ranked[0]
         
         return 'other', 0.3
 
+    @staticmethod
+    def normalize(message: str) -> str:
+        """Lower-case a message and collapse its whitespace"""
+        return ' '.join(message.lower().split())
+
+    @classmethod
+    def parse(cls, message: str) -> ParsedMessage:
+        """Parse a message into intent and search parameters, memoized by normalized text"""
+        # Keying on the gazetteer version retires entries resolved against an old catalog
+        return _parse_normalized(cls.normalize(message), catalog_gazetteer.version)
+
+    @classmethod
+    async def aparse(cls, message: str) -> ParsedMessage:
+        """``parse`` for async views; the gazetteer is loaded through the async ORM first"""
+        await catalog_gazetteer.arefresh()
+        return cls.parse(message)
+
+    @classmethod
+    def clear_parse_cache(cls):
+        _parse_normalized.cache_clear()
+
+    @classmethod
+    def parse_normalized(cls, message_lower: str, gazetteer_version: int = None) -> ParsedMessage:
+        """Parse an already normalized message without consulting the cache"""
+        ranked = INTENT_MATCHER.rank(message_lower)
+        intent, confidence = ranked[0] if ranked else ('other', 0.3)
+        params = cls._extract_parameters(message_lower)
+        return ParsedMessage(
+            intent=intent,
+            confidence=confidence,
+            intents=tuple(ranked),
+            min_price=params.get('min_price'),
+            max_price=params.get('max_price'),
+            brands=params.get('brands', ()),
+            categories=params.get('categories', ()),
+            query_tokens=tuple(params.get('query_tokens', ())),
+            refinements=params.get('refinements', ()),
+            refers_back=params.get('refers_back', False),
+            product_terms=params.get('product_terms', ()),
+        )
+
     @classmethod
     def extract_search_parameters(cls, message: str) -> Dict[str, Any]:
         """Extract search parameters from user message"""
+        return cls.parse(message).search_params
+
+    @classmethod
+    def _extract_parameters(cls, message_lower: str) -> Dict[str, Any]:
         params = {}
-        message_lower = message.lower()
         
         # Extract price range
         price_match = re.search(cls.ATTRIBUTE_PATTERNS['price_range'], message_lower)
@@ -74,28 +290,27 @@ class ChatbotNLP:
         # Extract max price
         max_price_match = re.search(cls.ATTRIBUTE_PATTERNS['max_price'], message_lower)
         if max_price_match:
-            params['max_price'] = int(re.sub(r'[,$]', '', max_price_match.group(1)))
+            params['max_price'] = int(re.sub(r'[,$]', '', next(g for g in max_price_match.groups() if g)))
         
         # Extract min price
         min_price_match = re.search(cls.ATTRIBUTE_PATTERNS['min_price'], message_lower)
         if min_price_match:
-            params['min_price'] = int(re.sub(r'[,$]', '', min_price_match.group(1)))
+            params['min_price'] = int(re.sub(r'[,$]', '', next(g for g in min_price_match.groups() if g)))
         
-        # Extract brand
-        brand_match = re.search(cls.ATTRIBUTE_PATTERNS['brand'], message_lower)
-        if brand_match:
-            params['brand'] = brand_match.group(1).title()
+        # Extract brands and categories in one pass over the catalog gazetteer
+        entities = catalog_gazetteer.resolve(message_lower)
+        if entities.brands:
+            params['brands'] = entities.brands
+        if entities.categories:
+            params['categories'] = entities.categories
         
-        # Extract category keywords
-        category_match = re.search(cls.ATTRIBUTE_PATTERNS['category'], message_lower)
-        if category_match:
-            category_name = category_match.group(1)
-            try:
-                category = Category.objects.filter(name__icontains=category_name).first()
-                if category:
-                    params['category'] = category.id
-            except:
-                pass
+        refinements = tuple(
+            name for name, pattern in cls.REFINEMENT_PATTERNS.items() if re.search(pattern, message_lower)
+        )
+        if refinements:
+            params['refinements'] = refinements
+        if re.search(cls.REFERS_BACK_PATTERN, message_lower):
+            params['refers_back'] = True
         
         # General search query (remove common words)
         query_words = []
@@ -106,10 +321,22 @@ class ChatbotNLP:
                 query_words.append(cleaned_word)
         
         if query_words:
-            params['query'] = ' '.join(query_words)
+            params['query_tokens'] = query_words
+        
+        # Words left once filters, prices and brands are accounted for name the products asked about
+        brand_words = {word for brand in params.get('brands', ()) for word in tokenize(brand)}
+        product_terms = tuple(
+            word for word in query_words
+            if word not in cls.FOLLOW_UP_WORDS and word not in brand_words and not word.isdigit()
+        )
+        if product_terms:
+            params['product_terms'] = product_terms
         
         return params
 
+INTENT_MATCHER = IntentMatcher(ChatbotNLP.INTENT_RULES)
+_parse_normalized = lru_cache(maxsize=settings.CHATBOT_PARSE_CACHE_SIZE)(ChatbotNLP.parse_normalized)
+
 class ChatbotResponseGenerator:
     """Generate appropriate responses for different intents"""
     
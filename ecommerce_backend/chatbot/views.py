@@ -1,15 +1,83 @@
+import json
 import uuid
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Substr
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from products.models import Product
-from products.serializers import ProductSerializer
-from .models import ChatSession, ChatMessage, UserIntent
-from .serializers import ChatSessionSerializer, ChatMessageSerializer, ChatInputSerializer
+from products.pagination import KeysetPagination
+from products.serializers import ProductFieldset, ProductSerializer
+from .analytics import dashboard, default_window, fold_intents
+from .models import ChatSession, ChatMessage
+from .persistence import persist_turn
+from .retention import SESSION_PREVIEW_LENGTH, archived_session, delete_archived_session
+from .context import Conversation
+from .search import filter_params, search_products
+from .serializers import (
+    ChatSessionSummarySerializer, ChatMessageSerializer, ChatInputSerializer
+)
 from .utils import ChatbotNLP, ChatbotResponseGenerator
 
+def searches(parsed, conversation=None):
+    return parsed.asks_for_products or (conversation is not None and conversation.follows_up(parsed))
+
+def reply_products(parsed, fieldset=None, conversation=None):
+    """Products for a search message and the parameters they were found with.
+
+    Loads the columns the reply and the cards need. With a ``conversation``
+    a follow-up message refines the previous search, and the new context
+    is saved for the next turn.
+    """
+    queryset = Product.objects.select_related('category')
+    if fieldset:
+        # Also load what the reply text quotes
+        queryset = fieldset.only(queryset, 'name', 'brand', 'price', 'rating', 'stock_quantity')
+    context = conversation.context if conversation is not None and parsed.follow_up else None
+    products, context = search_products(parsed, context, queryset=queryset)
+    if conversation is not None:
+        conversation.save(context)
+    return products, filter_params(context.filters)
+
+def product_card(product, fieldset=None):
+    return fieldset.to_representation(product) if fieldset else ProductSerializer(product).data
+
+def generate_reply(parsed, fieldset=None, conversation=None):
+    """Bot reply text and metadata for a parsed message; only searches touch the database"""
+    if parsed.intent == 'greeting':
+        return ChatbotResponseGenerator.generate_greeting_response(), {'intent': 'greeting'}
+    
+    if searches(parsed, conversation):
+        products, search_params = reply_products(parsed, fieldset, conversation)
+        return ChatbotResponseGenerator.generate_search_response(products, search_params), {
+            'intent': 'search',
+            'products': fieldset.serialize(products) if fieldset else ProductSerializer(products, many=True).data,
+            'search_params': search_params
+        }
+    
+    if parsed.intent == 'help':
+        return ChatbotResponseGenerator.generate_help_response(), {'intent': 'help'}
+    
+    return ChatbotResponseGenerator.generate_error_response(), {'intent': 'error'}
+
+def turn_payload(chat_session, user_msg, bot_msg, intent, confidence):
+    return {
+        'session_id': chat_session.session_id,
+        'user_message': ChatMessageSerializer(user_msg).data,
+        'bot_response': ChatMessageSerializer(bot_msg).data,
+        'intent': intent,
+        'confidence': confidence
+    }
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def chat_message(request):
@@ -19,124 +87,222 @@ def chat_message(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     user_message = serializer.validated_data['message']
-    session_id = serializer.validated_data.get('session_id')
-    
-    # Get or create chat session
-    if session_id:
-        try:
-            chat_session = ChatSession.objects.get(session_id=session_id, user=request.user)
-        except ChatSession.DoesNotExist:
-            chat_session = ChatSession.objects.create(
-                user=request.user,
-                session_id=session_id
-            )
-    else:
-        session_id = str(uuid.uuid4())
-        chat_session = ChatSession.objects.create(
-            user=request.user,
-            session_id=session_id
-        )
-    
-    # Save user message
-    user_msg = ChatMessage.objects.create(
-        session=chat_session,
-        message_type='user',
-        content=user_message
-    )
+    session_id = serializer.validated_data.get('session_id') or str(uuid.uuid4())
+    # Product payloads in bot metadata are compact unless ``view=full`` or ``fields`` is given
+    fieldset = ProductFieldset.from_params(serializer.validated_data, default='compact')
     
     # Process message and generate response
+    intent, confidence, turn_intent = 'other', 0.0, None
     try:
-        intent, confidence = ChatbotNLP.detect_intent(user_message)
-        
-        # Save intent
-        UserIntent.objects.create(
-            session=chat_session,
-            intent_type=intent,
-            confidence=confidence,
-            parameters=ChatbotNLP.extract_search_parameters(user_message)
-        )
-        
-        # Generate response based on intent
-        if intent == 'greeting':
-            bot_response = ChatbotResponseGenerator.generate_greeting_response()
-            bot_metadata = {'intent': 'greeting'}
-            
-        elif intent == 'search':
-            search_params = ChatbotNLP.extract_search_parameters(user_message)
-            
-            # Search products
-            queryset = Product.objects.filter(is_active=True).select_related('category')
-            
-            if 'query' in search_params:
-                from django.db.models import Q
-                query = search_params['query']
-                queryset = queryset.filter(
-                    Q(name__icontains=query) |
-                    Q(description__icontains=query) |
-                    Q(brand__icontains=query) |
-                    Q(category__name__icontains=query)
-                )
-            
-            if 'category' in search_params:
-                queryset = queryset.filter(category_id=search_params['category'])
-            if 'min_price' in search_params:
-                queryset = queryset.filter(price__gte=search_params['min_price'])
-            if 'max_price' in search_params:
-                queryset = queryset.filter(price__lte=search_params['max_price'])
-            if 'brand' in search_params:
-                queryset = queryset.filter(brand__icontains=search_params['brand'])
-            
-            products = list(queryset.order_by('-rating')[:10])
-            bot_response = ChatbotResponseGenerator.generate_search_response(products, search_params)
-            bot_metadata = {
-                'intent': 'search',
-                'products': ProductSerializer(products, many=True).data,
-                'search_params': search_params
-            }
-            
-        elif intent == 'help':
-            bot_response = ChatbotResponseGenerator.generate_help_response()
-            bot_metadata = {'intent': 'help'}
-            
-        else:
-            bot_response = ChatbotResponseGenerator.generate_error_response()
-            bot_metadata = {'intent': 'error'}
-    
+        parsed = ChatbotNLP.parse(user_message)
+        intent, confidence = parsed.intent, parsed.confidence
+        turn_intent = {'intent_type': intent, 'confidence': confidence, 'parameters': parsed.search_params}
+        bot_response, bot_metadata = generate_reply(parsed, fieldset, Conversation(request.user, session_id))
     except Exception as e:
         bot_response = "I'm experiencing some technical difficulties. Please try again in a moment."
         bot_metadata = {'intent': 'error', 'error': str(e)}
     
-    # Save bot response
-    bot_msg = ChatMessage.objects.create(
-        session=chat_session,
-        message_type='bot',
-        content=bot_response,
-        metadata=bot_metadata
-    )
+    # Save the session, both messages and the intent in one transaction
+    try:
+        chat_session, user_msg, bot_msg = persist_turn(
+            request.user, session_id, user_message, bot_response, bot_metadata, intent=turn_intent
+        )
+    except ChatSession.DoesNotExist:
+        return Response({'error': 'Chat session not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    return Response({
-        'session_id': chat_session.session_id,
-        'user_message': ChatMessageSerializer(user_msg).data,
-        'bot_response': ChatMessageSerializer(bot_msg).data,
-        'intent': intent,
-        'confidence': confidence
-    })
+    return Response(turn_payload(chat_session, user_msg, bot_msg, intent, confidence))
+
+def sse_event(event, data):
+    """One Server-Sent Events frame with a JSON payload"""
+    return f'event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n'
+
+STREAM_ERROR_REPLY = "I'm experiencing some technical difficulties. Please try again in a moment."
+
+def turn_reply(parsed, fieldset, conversation):
+    """Reply text, metadata and the products to stream as cards for one streamed turn"""
+    if parsed.intent != 'greeting' and searches(parsed, conversation):
+        products, search_params = reply_products(parsed, fieldset, conversation)
+        text = ChatbotResponseGenerator.generate_search_response(products, search_params)
+        return text, {'intent': 'search', 'products': [], 'search_params': search_params}, products
+    text, metadata = generate_reply(parsed, fieldset)
+    return text, metadata, []
+
+def text_frames(text):
+    return [sse_event('message', {'delta': chunk}) for chunk in text.splitlines(keepends=True)]
+
+def card_frame(product, fieldset, metadata):
+    """The frame for one product card, which is also collected into ``metadata``"""
+    card = product_card(product, fieldset)
+    metadata['products'].append(card)
+    return sse_event('product', card)
+
+def stored_reply(reply, failure, fieldset):
+    """Bot text and metadata to persist for a streamed turn.
+
+    A client that disconnects mid-stream still gets the whole reply in its
+    history: cards it was not sent yet are serialized here. Only a real
+    failure stores the error reply.
+    """
+    if failure is not None:
+        return STREAM_ERROR_REPLY, {'intent': 'error', 'error': str(failure)}
+    text, metadata, products = reply
+    for product in products[len(metadata.get('products', ())):]:
+        metadata['products'].append(product_card(product, fieldset))
+    return text, metadata
+
+def finish_turn(user, session_id, user_message, parsed, reply, failure, fieldset, turn_intent):
+    """Persist a streamed turn, building the reply if the client left before it was ready"""
+    if reply is None and failure is None:
+        try:
+            reply = turn_reply(parsed, fieldset, Conversation(user, session_id))
+        except Exception as e:
+            failure = e
+    bot_response, bot_metadata = stored_reply(reply, failure, fieldset)
+    persist_turn(user, session_id, user_message, bot_response, bot_metadata, intent=turn_intent)
+
+def stream_turn(user, session_id, user_message, fieldset):
+    """SSE frames for one chat turn: intent, reply text chunks, product cards, then done.
+
+    The turn is persisted once the last frame has been handed to the
+    server, or when the client disconnects mid-stream.
+    """
+    parsed, reply, failure, turn_intent = None, None, None, None
+    try:
+        parsed = ChatbotNLP.parse(user_message)
+        turn_intent = {'intent_type': parsed.intent, 'confidence': parsed.confidence, 'parameters': parsed.search_params}
+        yield sse_event('intent', {'session_id': session_id, 'intent': parsed.intent, 'confidence': parsed.confidence})
+        reply = turn_reply(parsed, fieldset, Conversation(user, session_id))
+        text, metadata, products = reply
+        yield from text_frames(text)
+        for product in products:
+            yield card_frame(product, fieldset, metadata)
+        yield sse_event('done', {'session_id': session_id})
+    except Exception as e:
+        failure = e
+        yield sse_event('error', {'detail': STREAM_ERROR_REPLY})
+    finally:
+        finish_turn(user, session_id, user_message, parsed, reply, failure, fieldset, turn_intent)
+
+async def astream_turn(user, session_id, user_message, fieldset):
+    """``stream_turn`` for ASGI servers, which only send a sync iterator once it is exhausted.
+
+    The intent and text frames go out as soon as they are ready and each
+    card is serialized and sent on its own; search, cards and the turn
+    write run through ``sync_to_async``.
+    """
+    parsed, reply, failure, turn_intent = None, None, None, None
+    try:
+        parsed = await ChatbotNLP.aparse(user_message)
+        turn_intent = {'intent_type': parsed.intent, 'confidence': parsed.confidence, 'parameters': parsed.search_params}
+        yield sse_event('intent', {'session_id': session_id, 'intent': parsed.intent, 'confidence': parsed.confidence})
+        reply = await sync_to_async(turn_reply)(parsed, fieldset, Conversation(user, session_id))
+        text, metadata, products = reply
+        for frame in text_frames(text):
+            yield frame
+        for product in products:
+            yield await sync_to_async(card_frame)(product, fieldset, metadata)
+        yield sse_event('done', {'session_id': session_id})
+    except Exception as e:
+        failure = e
+        yield sse_event('error', {'detail': STREAM_ERROR_REPLY})
+    finally:
+        await sync_to_async(finish_turn)(
+            user, session_id, user_message, parsed, reply, failure, fieldset, turn_intent
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def chat_message_stream(request):
+    """Process a chatbot message and stream the reply as Server-Sent Events"""
+    serializer = ChatInputSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    session_id = serializer.validated_data.get('session_id') or str(uuid.uuid4())
+    if ChatSession.objects.filter(session_id=session_id).exclude(user=request.user).exists():
+        return Response({'error': 'Chat session not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    fieldset = ProductFieldset.from_params(serializer.validated_data, default='compact')
+    # Under ASGI a sync iterator would be drained before the first frame is sent
+    stream = astream_turn if isinstance(request._request, ASGIRequest) else stream_turn
+    response = StreamingHttpResponse(
+        stream(request.user, session_id, serializer.validated_data['message'], fieldset),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+MESSAGE_PAGE_SIZE = 50
+
+def session_summaries(user):
+    """User's sessions annotated with message count, last message preview and last activity"""
+    last_message = ChatMessage.objects.filter(session=OuterRef('pk')).order_by('-timestamp', '-id')
+    return ChatSession.objects.filter(user=user).annotate(
+        message_count=Count('messages'),
+        last_activity=Max('messages__timestamp'),
+        last_message=Subquery(
+            last_message.annotate(preview=Substr('content', 1, SESSION_PREVIEW_LENGTH)).values('preview')[:1]
+        ),
+    )
+
+def message_paginator(params):
+    """Newest-first keyset paginator over a session's messages"""
+    try:
+        page_size = min(int(params.get('page_size', MESSAGE_PAGE_SIZE)), 200)
+    except ValueError:
+        page_size = MESSAGE_PAGE_SIZE
+    return KeysetPagination('-timestamp', max(page_size, 1))
+
+def message_page_payload(messages, previous_cursor):
+    return {
+        'messages': ChatMessageSerializer(reversed(messages), many=True).data,
+        'previous_cursor': previous_cursor,
+    }
+
+def message_page(session, request):
+    """Newest messages of a session in chronological order, plus the cursor for older ones"""
+    paginator = message_paginator(request.query_params)
+    return message_page_payload(*paginator.paginate(session.messages.all(), request.query_params.get('before')))
+
+def archived_session_payload(user, session_id):
+    """The detail payload of a session the retention sweeper archived, or None.
+
+    Archived sessions are read back whole, so every message comes in one page.
+    """
+    record = archived_session(user, session_id)
+    if record is None:
+        return None
+    record.pop('intents')
+    return {**record, 'archived': True, 'previous_cursor': None}
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_sessions(request):
-    """Get user's chat sessions"""
-    sessions = ChatSession.objects.filter(user=request.user, is_active=True)
-    serializer = ChatSessionSerializer(sessions, many=True)
+    """Get user's chat sessions as summaries, most recently updated first"""
+    sessions = session_summaries(request.user).filter(is_active=True).order_by('-updated_at')
+    serializer = ChatSessionSummarySerializer(sessions, many=True)
     return Response({'sessions': serializer.data})
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def chat_session_detail(request, session_id):
-    """Get specific chat session with messages"""
+    """Get a chat session summary with its latest page of messages, or an archived session in full"""
+    session = session_summaries(request.user).filter(session_id=session_id).first()
+    if session is None:
+        payload = archived_session_payload(request.user, session_id)
+        if payload is None:
+            raise Http404
+        return Response(payload)
+    return Response({**ChatSessionSummarySerializer(session).data, **message_page(session, request)})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def chat_session_messages(request, session_id):
+    """Page backward through a session's messages; pass ``before`` to fetch older ones"""
     session = get_object_or_404(ChatSession, session_id=session_id, user=request.user)
-    serializer = ChatSessionSerializer(session)
-    return Response(serializer.data)
+    return Response(message_page(session, request))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -145,6 +311,7 @@ def reset_chat_session(request, session_id):
     session = get_object_or_404(ChatSession, session_id=session_id, user=request.user)
     session.messages.all().delete()
     session.intents.all().delete()
+    Conversation(request.user, session_id).forget()
     
     # Create welcome message
     ChatMessage.objects.create(
@@ -160,8 +327,11 @@ def reset_chat_session(request, session_id):
 @permission_classes([IsAuthenticated])
 def delete_chat_session(request, session_id):
     """Delete a chat session"""
-    session = get_object_or_404(ChatSession, session_id=session_id, user=request.user)
-    session.delete()
+    deleted, _ = ChatSession.objects.filter(session_id=session_id, user=request.user).delete()
+    archived = delete_archived_session(request.user, session_id)
+    if not deleted and not archived:
+        raise Http404
+    Conversation(request.user, session_id).forget()
     return Response({'message': 'Chat session deleted successfully'})
 
 @api_view(['GET'])
@@ -195,4 +365,27 @@ def product_details_for_chat(request, product_id):
         return Response(
             {'error': 'Product not found'}, 
             status=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+        )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def chat_analytics(request):
+    """Intent and search figures per hour from the analytics rollups; ``since``/``until`` default to the last day"""
+    since, until = default_window(timezone.now())
+    for name in ('since', 'until'):
+        if request.query_params.get(name):
+            value = parse_datetime(request.query_params[name])
+            if value is None:
+                return Response({'error': f'{name} must be an ISO 8601 datetime'}, status=status.HTTP_400_BAD_REQUEST)
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            since, until = (value, until) if name == 'since' else (since, value)
+    try:
+        top = min(max(int(request.query_params.get('top', 10)), 1), 100)
+    except ValueError:
+        top = 10
+
+    if settings.CHAT_ANALYTICS_FOLD_ON_READ:
+        # Keeps the figures live between scheduled runs; a backlog is left to rollup_chat_analytics
+        fold_intents(max_batches=1)
+    return Response(dashboard(since, until, top))
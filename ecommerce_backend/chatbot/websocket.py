@@ -0,0 +1,177 @@
+# WebSocket chat channel: a pure ASGI application, routed from ecommerce_backend/asgi.py.
+# The JWT is checked and the session loaded once at connect; each turn afterwards only
+# parses, searches and appends its two messages.
+import json
+import uuid
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, close_old_connections
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+from authentication.authentication import AsyncJWTAuthentication
+from products.serializers import ProductFieldset
+from .context import Conversation
+from .models import ChatSession
+from .persistence import append_turn, upsert_session
+from .serializers import ChatInputSerializer, ChatMessageSerializer
+from .utils import ChatbotNLP, ChatbotResponseGenerator
+from .views import generate_reply, product_card, reply_products, searches
+
+CHAT_WEBSOCKET_PATH = '/ws/chat/'
+
+# Close codes in the 4000-4999 range reserved for applications
+CLOSE_BAD_REQUEST = 4400
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+authenticator = AsyncJWTAuthentication()
+
+class WebSocketClosed(Exception):
+    pass
+
+class ChatConnection:
+    """State kept in memory for the lifetime of one WebSocket connection"""
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.params = {key: values[-1] for key, values in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.user = None
+        self.session = None
+        self.fieldset = None
+        self.conversation = None
+
+    async def push(self, frame_type, **data):
+        await self.send({'type': 'websocket.send', 'text': json.dumps({'type': frame_type, **data}, cls=JSONEncoder)})
+
+    async def close(self, code):
+        await self.send({'type': 'websocket.close', 'code': code})
+
+    async def next_frame(self):
+        """The next text frame from the client; raises WebSocketClosed on disconnect"""
+        while True:
+            event = await self.receive()
+            if event['type'] == 'websocket.disconnect':
+                raise WebSocketClosed
+            if event['type'] == 'websocket.receive':
+                return event.get('text') or (event.get('bytes') or b'').decode()
+
+    def raw_token(self):
+        # Browsers cannot set headers on a WebSocket handshake, so a ``token`` query parameter is accepted too
+        if self.params.get('token'):
+            return self.params['token'].encode()
+        for name, value in self.scope.get('headers', []):
+            if name == b'authorization':
+                return authenticator.get_raw_token(value)
+        return None
+
+    async def authenticate(self):
+        raw_token = self.raw_token()
+        if raw_token is None:
+            return False
+        try:
+            self.user = await authenticator.aget_user(authenticator.get_validated_token(raw_token))
+        except APIException:
+            return False
+        return True
+
+    async def connect(self):
+        """Authenticate, load the session and accept; returns False once the handshake was refused"""
+        if (await self.receive())['type'] != 'websocket.connect':
+            return False
+        if not await self.authenticate():
+            await self.close(CLOSE_UNAUTHORIZED)
+            return False
+        try:
+            self.fieldset = ProductFieldset.from_params(self.params, default='compact')
+        except ValidationError:
+            await self.close(CLOSE_BAD_REQUEST)
+            return False
+        try:
+            session_id = self.params.get('session_id') or str(uuid.uuid4())
+            self.session = await sync_to_async(upsert_session)(self.user, session_id)
+            self.conversation = Conversation(self.user, self.session.session_id)
+        except ChatSession.DoesNotExist:
+            await self.close(CLOSE_NOT_FOUND)
+            return False
+        await self.send({'type': 'websocket.accept'})
+        await self.push('session', session_id=self.session.session_id)
+        return True
+
+    async def handle(self, text):
+        """Run one turn and push its frames: intent, reply text chunks, product cards, then done"""
+        try:
+            frame = json.loads(text)
+            if frame.get('type') == 'ping':
+                await self.push('pong')
+                return
+        except (ValueError, AttributeError):
+            await self.push('error', detail='Malformed JSON frame.')
+            return
+        serializer = ChatInputSerializer(data={**frame, 'session_id': self.session.session_id})
+        if not serializer.is_valid():
+            await self.push('error', detail=serializer.errors)
+            return
+
+        user_message = serializer.validated_data['message']
+        intent, confidence, turn_intent = 'other', 0.0, None
+        bot_response = "I'm experiencing some technical difficulties. Please try again in a moment."
+        bot_metadata = {'intent': 'error'}
+        try:
+            parsed = await ChatbotNLP.aparse(user_message)
+            intent, confidence = parsed.intent, parsed.confidence
+            turn_intent = {'intent_type': intent, 'confidence': confidence, 'parameters': parsed.search_params}
+            await self.push('intent', intent=intent, confidence=confidence)
+
+            if intent != 'greeting' and searches(parsed, self.conversation):
+                products, search_params = await sync_to_async(reply_products)(parsed, self.fieldset, self.conversation)
+                text = ChatbotResponseGenerator.generate_search_response(products, search_params)
+                metadata = {'intent': 'search', 'products': [], 'search_params': search_params}
+            else:
+                products = []
+                text, metadata = generate_reply(parsed, self.fieldset)
+            for chunk in text.splitlines(keepends=True):
+                await self.push('message', delta=chunk)
+            for product in products:
+                card = product_card(product, self.fieldset)
+                metadata['products'].append(card)
+                await self.push('product', product=card)
+            bot_response, bot_metadata = text, metadata
+        except Exception as e:
+            bot_metadata = {'intent': 'error', 'error': str(e)}
+            await self.push('error', detail=bot_response)
+
+        try:
+            self.session, user_msg, bot_msg = await sync_to_async(append_turn)(
+                self.session, user_message, bot_response, bot_metadata, intent=turn_intent
+            )
+        except (ChatSession.DoesNotExist, IntegrityError):
+            # The session could not be written or recreated, e.g. its id now belongs to another user
+            await self.push('error', detail='This chat session is no longer available.')
+            return
+        await self.push(
+            'done',
+            user_message=ChatMessageSerializer(user_msg).data,
+            bot_response=ChatMessageSerializer(bot_msg).data,
+        )
+
+    async def run(self):
+        await sync_to_async(close_old_connections)()
+        try:
+            if not await self.connect():
+                return
+            while True:
+                await self.handle(await self.next_frame())
+        except WebSocketClosed:
+            pass
+        finally:
+            await sync_to_async(close_old_connections)()
+
+async def chat_websocket(scope, receive, send):
+    """ASGI application for ``websocket`` scopes"""
+    if scope['path'] != CHAT_WEBSOCKET_PATH:
+        await receive()
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    await ChatConnection(scope, receive, send).run()
@@ -2,6 +2,7 @@
 ASGI config for ecommerce_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP requests go to Django; WebSocket connections go to the chat channel.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +14,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_backend.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_application = get_asgi_application()
+
+from chatbot.websocket import chat_websocket  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await chat_websocket(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
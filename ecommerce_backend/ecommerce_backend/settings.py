@@ -121,4 +121,61 @@ CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8080",
 ]
 
-CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file
+CORS_ALLOW_CREDENTIALS = True
+
+# Cache Configuration
+# Local memory per process by default; CACHE_BACKEND=file with CACHE_LOCATION on a shared
+# directory lets workers share cached payloads. Either way the catalog version that keys
+# them is kept in the database, see products/cache.py.
+CACHE_BACKEND = config('CACHE_BACKEND', default='locmem')
+CACHES = {
+    'default': {
+        'BACKEND': {
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+        }[CACHE_BACKEND],
+        'LOCATION': config('CACHE_LOCATION', default='ecommerce-backend'),
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    }
+}
+
+# Catalog Configuration
+CATALOG_SNAPSHOT_ENABLED = config('CATALOG_SNAPSHOT_ENABLED', default=True, cast=bool)
+CATALOG_SNAPSHOT_MAX_AGE = config('CATALOG_SNAPSHOT_MAX_AGE', default=300, cast=int)
+CATALOG_CACHE_ALIAS = 'default'
+# Seconds a worker reuses the catalog version it last read: after a product write, other workers
+# serve responses cached under the previous version for at most this long
+CATALOG_VERSION_MAX_AGE = config('CATALOG_VERSION_MAX_AGE', default=2, cast=float)
+PRODUCT_COUNT_CACHE_TIMEOUT = config('PRODUCT_COUNT_CACHE_TIMEOUT', default=600, cast=int)
+PRODUCT_COUNT_EXACT_LIMIT = config('PRODUCT_COUNT_EXACT_LIMIT', default=10000, cast=int)
+PRODUCT_COUNT_SAMPLE_SIZE = config('PRODUCT_COUNT_SAMPLE_SIZE', default=5000, cast=int)
+SEARCH_CACHE_MAX_ENTRIES = config('SEARCH_CACHE_MAX_ENTRIES', default=1024, cast=int)
+SEARCH_CACHE_MAX_IDS = config('SEARCH_CACHE_MAX_IDS', default=1000, cast=int)
+PRODUCT_PAYLOAD_CACHE_TIMEOUT = config('PRODUCT_PAYLOAD_CACHE_TIMEOUT', default=600, cast=int)
+CATALOG_HTTP_CACHE_TIMEOUT = config('CATALOG_HTTP_CACHE_TIMEOUT', default=600, cast=int)
+CATALOG_HTTP_MAX_AGE = config('CATALOG_HTTP_MAX_AGE', default=0, cast=int)
+PRODUCT_ASSET_DIR = 'products'
+PRODUCT_THUMBNAIL_SIZE = (320, 320)
+PRODUCT_FACET_PRICE_EDGES = [25, 50, 100, 250, 500, 1000]
+
+# Chatbot Configuration
+CHATBOT_PARSE_CACHE_SIZE = config('CHATBOT_PARSE_CACHE_SIZE', default=4096, cast=int)
+CHATBOT_GAZETTEER_MAX_AGE = config('CHATBOT_GAZETTEER_MAX_AGE', default=300, cast=int)
+CHAT_TURN_WRITE_ATTEMPTS = config('CHAT_TURN_WRITE_ATTEMPTS', default=10, cast=int)
+# Conversation context for follow-up searches: 'local' keeps it in process, 'cache' shares it
+# between workers through CHAT_CONTEXT_CACHE_ALIAS
+CHAT_CONTEXT_STORE = config('CHAT_CONTEXT_STORE', default='local')
+CHAT_CONTEXT_CACHE_ALIAS = 'default'
+CHAT_CONTEXT_TTL = config('CHAT_CONTEXT_TTL', default=1800, cast=int)
+CHAT_CONTEXT_MAX_ENTRIES = config('CHAT_CONTEXT_MAX_ENTRIES', default=10000, cast=int)
+CHAT_CONTEXT_MAX_CANDIDATES = config('CHAT_CONTEXT_MAX_CANDIDATES', default=500, cast=int)
+# Retention: sessions idle for CHAT_SESSION_IDLE_DAYS are marked inactive; inactive sessions idle for
+# CHAT_ARCHIVE_AFTER_DAYS are moved into gzipped JSONL files under CHAT_ARCHIVE_DIR in default storage
+CHAT_SESSION_IDLE_DAYS = config('CHAT_SESSION_IDLE_DAYS', default=30, cast=int)
+CHAT_ARCHIVE_AFTER_DAYS = config('CHAT_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+CHAT_ARCHIVE_DIR = 'chat-archive'
+# Analytics rollups: intents below CHAT_ANALYTICS_LOW_CONFIDENCE count as low confidence; the read
+# endpoint folds up to one batch of new intents first when CHAT_ANALYTICS_FOLD_ON_READ is set
+CHAT_ANALYTICS_LOW_CONFIDENCE = config('CHAT_ANALYTICS_LOW_CONFIDENCE', default=0.5, cast=float)
+CHAT_ANALYTICS_BATCH_SIZE = config('CHAT_ANALYTICS_BATCH_SIZE', default=5000, cast=int)
+CHAT_ANALYTICS_FOLD_ON_READ = config('CHAT_ANALYTICS_FOLD_ON_READ', default=True, cast=bool)
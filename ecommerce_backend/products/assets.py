@@ -0,0 +1,76 @@
+import base64
+import binascii
+import hashlib
+import io
+import re
+from typing import Optional
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+ASSET_NAME_PATTERN = re.compile(r'^[0-9a-f]{32}(?:-thumb)?\.(?:jpg|png|gif|webp)$')
+DATA_URI_PATTERN = re.compile(r'^data:[\w.+/-]*(?:;[\w.+=-]+)*;base64,', re.IGNORECASE)
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+class AssetError(ValueError):
+    pass
+
+def is_data_uri(value: Optional[str]) -> bool:
+    return bool(value) and DATA_URI_PATTERN.match(value) is not None
+
+def asset_path(name: str) -> str:
+    return f'{settings.PRODUCT_ASSET_DIR}/{name}'
+
+def asset_url(name: str) -> str:
+    return reverse('product-asset', args=[name])
+
+def thumbnail_name(name: str) -> str:
+    return f'{name.split(".")[0]}-thumb.jpg'
+
+def thumbnail_url(image_url: Optional[str]) -> Optional[str]:
+    """Thumbnail URL for a stored asset URL; other image URLs are returned unchanged"""
+    name = (image_url or '').rsplit('/', 1)[-1]
+    if ASSET_NAME_PATTERN.match(name) and image_url == asset_url(name):
+        return asset_url(thumbnail_name(name))
+    return image_url
+
+def decode_data_uri(uri: str) -> bytes:
+    match = DATA_URI_PATTERN.match(uri or '')
+    if not match:
+        raise AssetError('Not a base64 data URI')
+    try:
+        return base64.b64decode(uri[match.end():], validate=False)
+    except (binascii.Error, ValueError) as e:
+        raise AssetError(f'Invalid base64 payload: {e}')
+
+def make_thumbnail(image: Image.Image) -> bytes:
+    thumbnail = ImageOps.fit(image.convert('RGB'), tuple(settings.PRODUCT_THUMBNAIL_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    thumbnail.save(buffer, 'JPEG', quality=85, optimize=True)
+    return buffer.getvalue()
+
+def store_image(content: bytes) -> str:
+    """Store image bytes under their content hash with a thumbnail; return the asset name"""
+    try:
+        image = Image.open(io.BytesIO(content))
+        image.load()
+    except (UnidentifiedImageError, OSError) as e:
+        raise AssetError(f'Unreadable image: {e}')
+    extension = EXTENSIONS.get(image.format)
+    if extension is None:
+        raise AssetError(f'Unsupported image format: {image.format}')
+
+    name = f'{hashlib.sha256(content).hexdigest()[:32]}.{extension}'
+    # Content-addressed: an existing file already holds these exact bytes
+    if not default_storage.exists(asset_path(name)):
+        default_storage.save(asset_path(name), ContentFile(content))
+    if not default_storage.exists(asset_path(thumbnail_name(name))):
+        default_storage.save(asset_path(thumbnail_name(name)), ContentFile(make_thumbnail(image)))
+    return name
+
+def store_data_uri(uri: str) -> str:
+    """Move an inline ``data:`` image into the asset store and return its URL"""
+    return asset_url(store_image(decode_data_uri(uri)))
@@ -0,0 +1,116 @@
+"""Helpers shared by the benchmark management commands.
+
+Benchmarks run against a throwaway test database so seeding large synthetic
+catalogs never touches the development data.
+"""
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import Category, Product
+
+CATEGORY_NAMES = [
+    'Laptops', 'Phones', 'Headphones', 'Cameras', 'Shoes', 'Jackets',
+    'Watches', 'Kitchen Appliances', 'Furniture', 'Books', 'Toys', 'Sports',
+]
+ADJECTIVES = [
+    'wireless', 'portable', 'premium', 'compact', 'smart', 'classic', 'ultra',
+    'lightweight', 'waterproof', 'ergonomic', 'vintage', 'professional',
+]
+NOUNS = [
+    'laptop', 'phone', 'headphones', 'camera', 'sneakers', 'jacket', 'watch',
+    'blender', 'chair', 'novel', 'drone', 'backpack', 'speaker', 'tablet',
+]
+FILLER = [
+    'with', 'great', 'battery', 'life', 'durable', 'design', 'fast', 'charging',
+    'comfortable', 'fit', 'stainless', 'steel', 'bluetooth', 'noise', 'cancelling',
+    'high', 'resolution', 'display', 'cotton', 'leather', 'warranty', 'included',
+]
+
+@contextmanager
+def isolated_database(verbosity=0, name=None):
+    """Create a fresh test database for the duration of the block, optionally at the file ``name``"""
+    old_name = connection.settings_dict['NAME']
+    if name:
+        connection.settings_dict['TEST']['NAME'] = name
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+def seed_catalog(size, seed=42, batch_size=5000, brands=500):
+    """Bulk insert ``size`` synthetic products spread over CATEGORY_NAMES"""
+    rng = random.Random(seed)
+    categories = [Category.objects.get_or_create(name=name)[0] for name in CATEGORY_NAMES]
+    brand_names = [f'Brand{index:04d}' for index in range(brands)]
+    start = Product.objects.count()
+
+    batch = []
+    for index in range(start, start + size):
+        noun = rng.choice(NOUNS)
+        batch.append(Product(
+            name=f'{rng.choice(ADJECTIVES).title()} {noun.title()} {index}',
+            description=' '.join(rng.choices(FILLER, k=12) + [noun]),
+            category=rng.choice(categories),
+            price=Decimal(rng.randint(500, 300000)) / 100,
+            stock_quantity=rng.choice([0, 0, 5, 10, 25, 100]),
+            sku=f'BENCH-{index:08d}',
+            brand=rng.choice(brand_names),
+            rating=Decimal(rng.randint(0, 500)) / 100,
+            featured=rng.random() < 0.05,
+            is_active=rng.random() < 0.95,
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Product.objects.bulk_create(batch)
+
+def time_call(func, repeat=20):
+    """Run func repeatedly and return sorted latencies in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return sorted(timings)
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure_requests(send, requests, repeat=50, before=None):
+    """Send ``requests`` round-robin ``repeat`` times through ``send`` and summarize them.
+
+    Reports latency percentiles in milliseconds, database queries per
+    request and response body bytes per request. ``before`` runs untimed
+    ahead of each request. Any error status fails the run, so a broken
+    endpoint cannot pass for a fast one.
+    """
+    timings, queries, sizes = [], 0, 0
+    for index in range(repeat):
+        request = requests[index % len(requests)]
+        if before is not None:
+            before()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = send(request)
+            timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            raise AssertionError(f'{request!r} returned {response.status_code}: {response.content[:200]!r}')
+        queries += len(captured)
+        sizes += len(response.content)
+    timings.sort()
+    return {
+        'requests': repeat,
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'queries_per_request': round(queries / repeat, 2),
+        'bytes_per_request': round(sizes / repeat),
+    }
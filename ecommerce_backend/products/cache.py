@@ -0,0 +1,84 @@
+"""Catalog version: the number every catalog cache key and ETag embeds, so product writes retire them.
+
+The version is a row in the database rather than a cache entry, so a
+write in one worker retires cached responses in all of them even when
+``CATALOG_CACHE_ALIAS`` is per-process, and bumping it is one atomic
+``UPDATE``, so concurrent bumps are never lost. Each process reuses the
+value it last read for up to ``CATALOG_VERSION_MAX_AGE`` seconds: that is
+how long other workers may keep serving ETags, search results and counts
+cached under the old version after a write. The writing process sees its
+own bump at once.
+"""
+import threading
+import time
+from typing import Optional, Tuple
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import CatalogVersion
+
+CATALOG_VERSION_NAME = 'catalog'
+
+def catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+def clock_version() -> int:
+    return int(time.time() * 1000)
+
+class SharedCatalogVersion:
+    """The database catalog version with a per-process copy that expires after ``max_age`` seconds.
+
+    Bumps move the version to the current millisecond, or one past it when
+    that is higher, so a bump rolled back with its transaction is not
+    reissued later for different content.
+    """
+
+    def __init__(self, max_age: float):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # (version, read at) swapped as one tuple
+        self._state: Optional[Tuple[int, float]] = None
+
+    def _remember(self, version: int) -> int:
+        with self._lock:
+            self._state = (version, time.monotonic())
+        return version
+
+    def _read(self) -> int:
+        rows = CatalogVersion.objects.filter(name=CATALOG_VERSION_NAME)
+        version = rows.values_list('value', flat=True).first()
+        if version is None:
+            version = CatalogVersion.objects.get_or_create(
+                name=CATALOG_VERSION_NAME, defaults={'value': clock_version()}
+            )[0].value
+        return self._remember(version)
+
+    def get(self) -> int:
+        state = self._state
+        if state is None or time.monotonic() - state[1] > self.max_age:
+            return self._read()
+        return state[0]
+
+    def bump(self) -> int:
+        rows = CatalogVersion.objects.filter(name=CATALOG_VERSION_NAME)
+        values = {'value': Greatest(F('value') + 1, clock_version()), 'updated_at': timezone.now()}
+        if not rows.update(**values):
+            self._read()
+            rows.update(**values)
+        return self._read()
+
+    def forget(self):
+        """Drop this process's copy; the next read goes to the database"""
+        with self._lock:
+            self._state = None
+
+catalog_version = SharedCatalogVersion(max_age=settings.CATALOG_VERSION_MAX_AGE)
+
+def get_catalog_version() -> int:
+    """Current catalog version; embedded in cache keys so product writes retire them"""
+    return catalog_version.get()
+
+def bump_catalog_version() -> int:
+    return catalog_version.bump()
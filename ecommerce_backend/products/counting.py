@@ -0,0 +1,83 @@
+import hashlib
+import json
+import random
+from typing import Any, Dict, Optional, Tuple
+from django.conf import settings
+from django.db.models import Count, Max, Min
+from .cache import catalog_cache, get_catalog_version
+from .models import Product
+
+class ResultCounter:
+    """Total counts for filtered product searches.
+
+    Exact counts are cached per normalized filter signature under the
+    catalog version, so any product write invalidates them. When an exact
+    count would mean scanning more than ``exact_limit`` rows, ``estimate``
+    extrapolates from the matches inside a random window of product ids
+    instead, and flags the result as an estimate.
+    """
+
+    def __init__(self, timeout: int, exact_limit: int, sample_size: int):
+        self.timeout = timeout
+        self.exact_limit = exact_limit
+        self.sample_size = sample_size
+
+    @staticmethod
+    def signature(filters: Dict[str, Any]) -> str:
+        normalized = {}
+        for key, value in filters.items():
+            if value is None or value == '':
+                continue
+            if isinstance(value, str):
+                value = ' '.join(value.lower().split())
+            normalized[key] = str(value)
+        return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+    def _key(self, filters: Dict[str, Any]) -> str:
+        return f'products:count:{get_catalog_version()}:{self.signature(filters)}'
+
+    def exact(self, queryset, filters: Dict[str, Any]) -> int:
+        key = self._key(filters)
+        cached = catalog_cache().get(key)
+        if cached is not None and not cached[1]:
+            return cached[0]
+        count = queryset.order_by().count()
+        catalog_cache().set(key, (count, False), self.timeout)
+        return count
+
+    def estimate(self, queryset, filters: Dict[str, Any]) -> Tuple[int, bool]:
+        """Return (count, is_estimate), counting exactly only while it is cheap"""
+        key = self._key(filters)
+        cached = catalog_cache().get(key)
+        if cached is not None:
+            return cached
+
+        queryset = queryset.order_by()
+        capped = queryset.values('id')[:self.exact_limit + 1].count()
+        if capped <= self.exact_limit:
+            result = (capped, False)
+        else:
+            result = (max(self._sampled_count(queryset) or capped, capped), True)
+        catalog_cache().set(key, result, self.timeout)
+        return result
+
+    def _sampled_count(self, queryset) -> Optional[int]:
+        active = Product.objects.filter(is_active=True)
+        bounds = active.aggregate(low=Min('id'), high=Max('id'))
+        total = self.exact(active, {'scope': 'active'})
+        if not total or bounds['low'] is None:
+            return None
+        span = max(1, int(self.sample_size * (bounds['high'] - bounds['low'] + 1) / total))
+        start = random.randint(bounds['low'], max(bounds['low'], bounds['high'] - span + 1))
+        window = {'id__gte': start, 'id__lt': start + span}
+        sampled = active.filter(**window).aggregate(n=Count('id'))['n']
+        if not sampled:
+            return None
+        matched = queryset.filter(**window).count()
+        return round(total * matched / sampled)
+
+result_counter = ResultCounter(
+    timeout=settings.PRODUCT_COUNT_CACHE_TIMEOUT,
+    exact_limit=settings.PRODUCT_COUNT_EXACT_LIMIT,
+    sample_size=settings.PRODUCT_COUNT_SAMPLE_SIZE,
+)
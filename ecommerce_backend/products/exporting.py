@@ -0,0 +1,104 @@
+"""Catalog export: the product table streamed as NDJSON or CSV in constant memory.
+
+Rows come from a ``.values_list()`` projection read with ``.iterator()``,
+so no model instances are built and only one chunk of rows is held at a
+time. Output is produced in batches of encoded rows, optionally through an
+incremental gzip compressor, for ``StreamingHttpResponse`` or a file.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, Optional
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .assets import thumbnail_url
+from .models import Product
+from .serializers import format_datetime, format_decimal
+
+FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# Same names and formatting as ProductSerializer, so a feed row matches the API's product payload
+EXPORT_FIELDS = [
+    'id', 'sku', 'name', 'description', 'category', 'category_name', 'price', 'stock_quantity', 'in_stock',
+    'brand', 'rating', 'image_url', 'thumbnail_url', 'is_active', 'featured', 'created_at', 'updated_at',
+]
+COLUMNS = [
+    'id', 'sku', 'name', 'description', 'category_id', 'category__name', 'price', 'stock_quantity',
+    'brand', 'rating', 'image_url', 'is_active', 'featured', 'created_at', 'updated_at',
+]
+
+def parse_since(value: str):
+    """An ``updated_since`` value as an aware datetime; naive values are in the current time zone"""
+    try:
+        since = parse_datetime(value)
+    except ValueError:
+        since = None
+    if since is None:
+        raise ValueError('updated_since must be an ISO 8601 datetime')
+    return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+def export_queryset(updated_since=None):
+    """Active products by id; with ``updated_since``, every product changed since then by change time.
+
+    Incremental feeds include deactivated products (``is_active`` false) so
+    consumers can drop them.
+    """
+    if updated_since is None:
+        queryset = Product.objects.filter(is_active=True).order_by('id')
+    else:
+        queryset = Product.objects.filter(updated_at__gte=updated_since).order_by('updated_at', 'id')
+    return queryset.values_list(*COLUMNS)
+
+def export_rows(queryset, chunk_size: int = 2000) -> Iterator[list]:
+    """Rows in ``EXPORT_FIELDS`` order"""
+    for (pk, sku, name, description, category_id, category_name, price, stock_quantity,
+         brand, rating, image_url, is_active, featured, created_at, updated_at) in queryset.iterator(chunk_size):
+        yield [
+            pk, sku, name, description, category_id, category_name, format_decimal(price), stock_quantity,
+            stock_quantity > 0, brand, format_decimal(rating), image_url, thumbnail_url(image_url),
+            is_active, featured, format_datetime(created_at), format_datetime(updated_at),
+        ]
+
+def encode(rows: Iterable[list], file_format: str, batch_size: int = 500) -> Iterator[bytes]:
+    """Encoded rows joined into batches of ``batch_size``; CSV starts with a header row"""
+    buffer = io.StringIO()
+    if file_format == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False))
+            buffer.write('\n')
+    pending = 0
+    for row in rows:
+        write(row)
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into one gzip member as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def stream_catalog(file_format: str, updated_since=None, compress: bool = False,
+                   chunk_size: int = 2000) -> Iterator[bytes]:
+    chunks = encode(export_rows(export_queryset(updated_since), chunk_size), file_format)
+    return gzip_stream(chunks) if compress else chunks
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
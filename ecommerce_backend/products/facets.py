@@ -0,0 +1,55 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Sequence
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+
+def price_bucket(edges: Sequence[Decimal]) -> Case:
+    """Bucket index of a product price: 0 below the first edge, len(edges) above the last"""
+    return Case(
+        *[When(price__lt=edge, then=Value(index)) for index, edge in enumerate(edges)],
+        default=Value(len(edges)),
+        output_field=IntegerField(),
+    )
+
+def facet_counts(queryset, edges: Sequence[Decimal] = None) -> Dict[str, Any]:
+    """Brand, category, price and stock facets for a filtered product queryset.
+
+    Everything comes from one grouped query over (brand, category, price
+    bucket); the individual facets are folded from those groups here.
+    """
+    edges = [Decimal(str(edge)) for edge in (edges or settings.PRODUCT_FACET_PRICE_EDGES)]
+    groups = (
+        queryset.order_by()
+        .annotate(bucket=price_bucket(edges))
+        .values('brand', 'category_id', 'category__name', 'bucket')
+        .annotate(count=Count('id'), in_stock=Sum(Case(
+            When(stock_quantity__gt=0, then=Value(1)), default=Value(0), output_field=IntegerField()
+        )))
+    )
+
+    brands: Dict[str, int] = {}
+    categories: Dict[int, Dict[str, Any]] = {}
+    buckets = [0] * (len(edges) + 1)
+    in_stock = 0
+    for group in groups:
+        brands[group['brand']] = brands.get(group['brand'], 0) + group['count']
+        category = categories.setdefault(
+            group['category_id'], {'id': group['category_id'], 'name': group['category__name'], 'count': 0}
+        )
+        category['count'] += group['count']
+        buckets[group['bucket']] += group['count']
+        in_stock += group['in_stock']
+
+    bounds = [None, *edges, None]
+    return {
+        'brands': [
+            {'brand': brand, 'count': count}
+            for brand, count in sorted(brands.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'categories': sorted(categories.values(), key=lambda item: (-item['count'], item['name'])),
+        'price_ranges': [
+            {'min': bounds[index], 'max': bounds[index + 1], 'count': count}
+            for index, count in enumerate(buckets)
+        ],
+        'in_stock': in_stock,
+    }
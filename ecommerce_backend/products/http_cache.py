@@ -0,0 +1,56 @@
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from .cache import catalog_cache, get_catalog_version
+
+def response_key(request) -> str:
+    """Identify a public catalog response by path, normalized query string and Accept header"""
+    query = urlencode(sorted((key, value) for key, values in request.GET.lists() for value in values))
+    parts = [request.get_host(), request.path, query, request.META.get('HTTP_ACCEPT', '')]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+def if_none_match(request):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return {tag.strip() for tag in header.split(',') if tag.strip()}
+
+def cache_catalog_response(view):
+    """Cache a public catalog view's rendered response under the catalog version.
+
+    The ETag is derived from the catalog version, so a matching
+    ``If-None-Match`` is answered with 304 before the view runs, and every
+    product or category write retires both the ETags and the cached bodies.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+
+        key = response_key(request)
+        etag = '"%s"' % hashlib.sha1(f'{get_catalog_version()}:{key}'.encode()).hexdigest()
+        tags = if_none_match(request)
+        if etag in tags or '*' in tags:
+            response = HttpResponseNotModified()
+        else:
+            cache = catalog_cache()
+            cache_key = f'products:http:{etag[1:-1]}'
+            cached = cache.get(cache_key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                if response.status_code != 200:
+                    return response
+                cache.set(cache_key, (response.content, response['Content-Type']),
+                          settings.CATALOG_HTTP_CACHE_TIMEOUT)
+
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.CATALOG_HTTP_MAX_AGE)
+        patch_vary_headers(response, ['Accept'])
+        return response
+    return wrapped
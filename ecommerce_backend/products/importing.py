@@ -0,0 +1,248 @@
+"""Bulk catalog import: stream CSV or JSONL rows into ``Product`` upserts keyed by sku.
+
+Rows are read lazily, validated and written one chunk at a time, so
+memory stays bounded by the chunk size whatever the file size. Each chunk
+is one ``bulk_create(update_conflicts=True)`` in its own transaction and a
+checkpoint records how many rows are done, so a failed run can resume
+where it stopped. ``bulk_create`` skips model signals; ``finish_import``
+rebuilds what they would have maintained.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from django.db import transaction
+from django.dispatch import Signal
+from .assets import AssetError, is_data_uri, store_data_uri
+from .cache import bump_catalog_version
+from .models import Category, Product
+from .search_index import search_index
+from .snapshot import catalog_snapshot
+from .stats import create_category_stats, rebuild_catalog_stats
+
+FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+REQUIRED_FIELDS = ('sku', 'name', 'price', 'category')
+UPDATE_FIELDS = [
+    'name', 'description', 'category', 'price', 'stock_quantity', 'brand', 'rating',
+    'image_url', 'is_active', 'featured', 'updated_at',
+]
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+# Sent once an import has finished, for caches outside this app that bulk writes bypass
+catalog_imported = Signal()
+
+class CatalogImportError(ValueError):
+    pass
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith('.gz') else path
+    try:
+        return FORMATS[os.path.splitext(name)[1].lower()]
+    except KeyError:
+        raise CatalogImportError(f'Cannot tell the format of {path}; expected .csv, .jsonl or .ndjson (optionally .gz)')
+
+def open_text(path: str):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+def read_rows(stream, file_format: str) -> Iterator[dict]:
+    """Yield raw rows as dicts; a malformed JSONL line is yielded as a CatalogImportError"""
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield CatalogImportError(f'invalid JSON: {e}')
+            continue
+        yield row if isinstance(row, dict) else CatalogImportError('expected a JSON object')
+
+def _text(row: dict, name: str, max_length: Optional[int] = None, default: str = '') -> str:
+    value = row.get(name)
+    value = default if value is None else str(value).strip()
+    if max_length is not None and len(value) > max_length:
+        raise CatalogImportError(f'{name} is longer than {max_length} characters')
+    return value
+
+def _decimal(row: dict, name: str, low, high=None, default=None) -> Decimal:
+    value = row.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise CatalogImportError(f'{name} is required')
+        return Decimal(default)
+    try:
+        number = Decimal(str(value)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise CatalogImportError(f'{name} is not a number: {value!r}')
+    if number < low or (high is not None and number > high):
+        raise CatalogImportError(f'{name} is out of range: {value!r}')
+    return number
+
+def _integer(row: dict, name: str) -> int:
+    value = row.get(name)
+    if value in (None, ''):
+        return 0
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise CatalogImportError(f'{name} is not an integer: {value!r}')
+    if number < 0:
+        raise CatalogImportError(f'{name} cannot be negative')
+    return number
+
+def _boolean(row: dict, name: str, default: bool) -> bool:
+    value = row.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise CatalogImportError(f'{name} is not a boolean: {value!r}')
+
+def clean_row(row: dict) -> dict:
+    """Validate one raw row into ``Product`` field values; the category stays a name"""
+    missing = [name for name in REQUIRED_FIELDS if row.get(name) in (None, '')]
+    if missing:
+        raise CatalogImportError(f'missing {", ".join(missing)}')
+    image_url = _text(row, 'image_url') or None
+    if is_data_uri(image_url):
+        try:
+            image_url = store_data_uri(image_url)
+        except AssetError as e:
+            raise CatalogImportError(f'image_url: {e}')
+    return {
+        'sku': _text(row, 'sku', 50),
+        'name': _text(row, 'name', 200),
+        'description': _text(row, 'description'),
+        'category': _text(row, 'category', 100),
+        'price': _decimal(row, 'price', 0, Decimal('99999999.99')),
+        'stock_quantity': _integer(row, 'stock_quantity'),
+        'brand': _text(row, 'brand', 100),
+        'rating': _decimal(row, 'rating', 0, 5, default=0),
+        'image_url': image_url,
+        'is_active': _boolean(row, 'is_active', True),
+        'featured': _boolean(row, 'featured', False),
+    }
+
+class CategoryMap:
+    """Category ids by name, loaded once; names not seen before are created a chunk at a time"""
+
+    def __init__(self):
+        self.ids = {name.casefold(): pk for pk, name in Category.objects.values_list('id', 'name')}
+        self.created = 0
+
+    def resolve(self, names: Iterable[str]) -> Dict[str, int]:
+        missing = {name.casefold(): name for name in names if name.casefold() not in self.ids}
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing.values()], ignore_conflicts=True)
+            # Re-read rather than trust bulk_create, which cannot return ids for ignored conflicts
+            new_ids = []
+            for pk, name in Category.objects.filter(name__in=missing.values()).values_list('id', 'name'):
+                self.ids[name.casefold()] = pk
+                new_ids.append(pk)
+            create_category_stats(new_ids)
+            self.created += len(new_ids)
+        return self.ids
+
+def upsert_products(rows: List[dict], categories: CategoryMap) -> int:
+    """Insert or update cleaned rows by sku; a sku repeated within the chunk keeps its last row"""
+    by_sku = {row['sku']: row for row in rows}
+    ids = categories.resolve(row['category'] for row in by_sku.values())
+    products = []
+    for row in by_sku.values():
+        values = dict(row)
+        values['category_id'] = ids[values.pop('category').casefold()]
+        products.append(Product(**values))
+    Product.objects.bulk_create(
+        products, update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS,
+    )
+    return len(products)
+
+@dataclass
+class Checkpoint:
+    """Progress of an import, saved after every committed chunk"""
+    source: str
+    size: int
+    rows: int = 0
+    imported: int = 0
+    errors: int = 0
+    path: Optional[str] = field(default=None, repr=False)
+
+    @classmethod
+    def start(cls, source: str, path: Optional[str], resume: bool) -> 'Checkpoint':
+        checkpoint = cls(source=os.path.abspath(source), size=os.path.getsize(source), path=path)
+        if resume and path and os.path.exists(path):
+            with open(path) as stream:
+                saved = json.load(stream)
+            if saved['source'] != checkpoint.source or saved['size'] != checkpoint.size:
+                raise CatalogImportError(f'{path} belongs to a different or changed file; start over without --resume')
+            checkpoint.rows, checkpoint.imported, checkpoint.errors = saved['rows'], saved['imported'], saved['errors']
+        return checkpoint
+
+    def save(self):
+        if not self.path:
+            return
+        state = asdict(self)
+        del state['path']
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as stream:
+            json.dump(state, stream)
+        os.replace(temporary, self.path)
+
+    def remove(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+def import_chunks(rows: Iterator, checkpoint: Checkpoint, chunk_size: int,
+                  categories: CategoryMap) -> Iterator[Tuple[int, List[Tuple[int, str]]]]:
+    """Import ``rows`` after the checkpoint, yielding (rows imported, row errors) per committed chunk.
+
+    Errors carry the 1-based data row number: the CSV header and blank
+    JSONL lines are not counted, and a CSV row with quoted line breaks
+    counts once, so it is not the line number in the file. The checkpoint
+    is saved only after the chunk's transaction commits.
+    """
+    for _ in islice(rows, checkpoint.rows):
+        pass
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        cleaned, errors = [], []
+        for offset, row in enumerate(chunk, start=checkpoint.rows + 1):
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                cleaned.append(clean_row(row))
+            except CatalogImportError as e:
+                errors.append((offset, str(e)))
+        with transaction.atomic():
+            imported = upsert_products(cleaned, categories) if cleaned else 0
+        checkpoint.rows += len(chunk)
+        checkpoint.imported += imported
+        checkpoint.errors += len(errors)
+        checkpoint.save()
+        yield imported, errors
+
+def finish_import():
+    """Bring everything the product signals maintain up to date after a bulk import"""
+    with transaction.atomic():
+        search_index.rebuild()
+        rebuild_catalog_stats()
+    catalog_snapshot.invalidate()
+    bump_catalog_version()
+    catalog_imported.send(sender=Product)
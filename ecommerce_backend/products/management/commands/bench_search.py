@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from products.benchmarking import isolated_database, percentile, seed_catalog, time_call
+from products.models import Product
+from products.search_index import search_index
+
+QUERIES = ['wireless headphones', 'laptop', 'waterproof jacket leather', 'smart watch bluetooth']
+
+class Command(BaseCommand):
+    help = 'Compare full-text index search latency with icontains scans as the catalog grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Catalog sizes to measure (e.g. 1000 100000 1000000)')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if not search_index.available:
+            raise CommandError('The full-text search index requires the SQLite backend')
+
+        with isolated_database():
+            seeded = 0
+            for size in sorted(options['sizes']):
+                self.stdout.write(f'Seeding {size:,} products...')
+                seed_catalog(size - seeded, seed=size)
+                seeded = size
+                search_index.rebuild()
+
+                for label, build in (('fts5', self.fts_page), ('icontains', self.icontains_page)):
+                    timings = []
+                    for query in QUERIES:
+                        timings += time_call(lambda: build(query), repeat=options['repeat'])
+                    timings.sort()
+                    self.stdout.write(
+                        f'  {size:>9,} {label:>9}: p50 {percentile(timings, 0.5):8.2f} ms  '
+                        f'p95 {percentile(timings, 0.95):8.2f} ms'
+                    )
+
+    @staticmethod
+    def base_queryset():
+        return Product.objects.filter(is_active=True, price__lte=1500).select_related('category')
+
+    def fts_page(self, query):
+        queryset = search_index.search(self.base_queryset(), query)
+        return list(queryset.order_by('search_rank', '-rating', 'id')[:20])
+
+    def icontains_page(self, query):
+        queryset = self.base_queryset().filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(brand__icontains=query) |
+            Q(category__name__icontains=query)
+        )
+        return list(queryset.order_by('-rating', 'id')[:20])
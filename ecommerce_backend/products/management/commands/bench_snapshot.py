@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.benchmarking import isolated_database, percentile, seed_catalog, time_call
+from products.models import Category, Product
+from products.snapshot import catalog_snapshot
+
+class Command(BaseCommand):
+    help = 'Compare catalog snapshot filtering and top-k ranking with the equivalent ORM queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000],
+                            help='Catalog sizes to measure')
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if not catalog_snapshot.enabled:
+            raise CommandError('The catalog snapshot is disabled or NumPy is not installed')
+
+        with isolated_database():
+            seeded = 0
+            for size in sorted(options['sizes']):
+                self.stdout.write(f'Seeding {size:,} products...')
+                seed_catalog(size - seeded, seed=size)
+                seeded = size
+                catalog_snapshot.invalidate()
+                timings = time_call(catalog_snapshot.columns, repeat=1)
+                self.stdout.write(f'  snapshot build: {timings[0]:,.0f} ms')
+
+                category = Category.objects.get(name='Laptops').id
+                cases = [
+                    ('-rating, in stock', {'in_stock': True, 'order_by': '-rating'}),
+                    ('price band, price', {'min_price': 100, 'max_price': 500, 'order_by': 'price'}),
+                    ('category+brand, -created_at', {'category': category, 'brand': 'brand00', 'order_by': '-created_at'}),
+                ]
+                for label, filters in cases:
+                    for path, run in (('snapshot', self.snapshot_page), ('orm', self.orm_page)):
+                        timings = time_call(lambda: run(filters), repeat=options['repeat'])
+                        self.stdout.write(
+                            f'  {size:>9,} {label:<28} {path:>8}: p50 {percentile(timings, 0.5):8.2f} ms  '
+                            f'p95 {percentile(timings, 0.95):8.2f} ms'
+                        )
+
+    @staticmethod
+    def snapshot_page(filters):
+        ids, total = catalog_snapshot.query(limit=20, **filters)
+        return catalog_snapshot.hydrate(ids), total
+
+    @staticmethod
+    def orm_page(filters):
+        queryset = Product.objects.filter(is_active=True).select_related('category')
+        if 'category' in filters:
+            queryset = queryset.filter(category_id=filters['category'])
+        if 'min_price' in filters:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if 'max_price' in filters:
+            queryset = queryset.filter(price__lte=filters['max_price'])
+        if 'brand' in filters:
+            queryset = queryset.filter(brand__icontains=filters['brand'])
+        if filters.get('in_stock'):
+            queryset = queryset.filter(stock_quantity__gt=0)
+        queryset = queryset.order_by(filters['order_by'], 'id')
+        return list(queryset[:20]), queryset.count()
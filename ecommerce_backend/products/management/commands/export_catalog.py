@@ -0,0 +1,41 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from products.exporting import FORMATS, parse_since, stream_catalog
+
+class Command(BaseCommand):
+    help = 'Write the active catalog, or every product changed since a point in time, as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson')
+        parser.add_argument('--output', default='-', help='File to write, or - for stdout')
+        parser.add_argument('--updated-since', help='ISO 8601 datetime; include inactive products changed since')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output (implied by a .gz output file)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time')
+
+    def handle(self, *args, **options):
+        updated_since = None
+        if options['updated_since']:
+            try:
+                updated_since = parse_since(options['updated_since'])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        exported_at = timezone.now()
+        chunks = stream_catalog(options['format'], updated_since, compress=compress, chunk_size=options['chunk_size'])
+        size = 0
+        stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+                size += len(chunk)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {size / 1024:,.1f} KiB to {output}; pass --updated-since {exported_at.isoformat()} '
+                f'to export the next changes'
+            ))
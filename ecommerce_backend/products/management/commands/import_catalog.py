@@ -0,0 +1,60 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from products.importing import (
+    CatalogImportError, CategoryMap, Checkpoint, detect_format, finish_import, import_chunks, open_text, read_rows,
+)
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL product feed into the catalog, upserting by sku'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file: .csv, .jsonl or .ndjson, optionally gzipped')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Override the format taken from the extension')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows validated and upserted per transaction')
+        parser.add_argument('--checkpoint', help='Progress file (default: <path>.checkpoint)')
+        parser.add_argument('--resume', action='store_true',
+                            help='Skip the rows an earlier, interrupted run already committed')
+        parser.add_argument('--max-errors', type=int, default=1000,
+                            help='Abort once this many rows failed validation')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+        try:
+            file_format = options['format'] or detect_format(path)
+            checkpoint = Checkpoint.start(path, options['checkpoint'] or f'{path}.checkpoint', options['resume'])
+        except (CatalogImportError, OSError) as e:
+            raise CommandError(str(e))
+        if checkpoint.rows:
+            self.stdout.write(f'Resuming after row {checkpoint.rows:,}')
+
+        categories = CategoryMap()
+        started, resumed_at, errors_before = time.perf_counter(), checkpoint.rows, checkpoint.errors
+        try:
+            with open_text(path) as stream:
+                for imported, errors in import_chunks(read_rows(stream, file_format), checkpoint,
+                                                      options['chunk_size'], categories):
+                    for row, message in errors:
+                        self.stderr.write(f'Data row {row}: {message}')
+                    # Only this run's errors count, so a resumed import is not aborted by the last one's
+                    if checkpoint.errors - errors_before > options['max_errors']:
+                        raise CommandError(
+                            f'Aborted after {checkpoint.errors - errors_before} invalid rows'
+                        )
+                    if options['verbosity'] > 1:
+                        rate = (checkpoint.rows - resumed_at) / (time.perf_counter() - started)
+                        self.stdout.write(f'{checkpoint.rows:>12,} rows  {rate:>10,.0f} rows/s')
+            elapsed = time.perf_counter() - started
+        finally:
+            # Committed chunks, this run's or an interrupted earlier one's, stay; make them searchable
+            if checkpoint.rows:
+                finish_import()
+
+        checkpoint.remove()
+        rate = (checkpoint.rows - resumed_at) / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {checkpoint.imported:,} of {checkpoint.rows:,} rows ({rate:,.0f} rows/s), '
+            f'{checkpoint.errors:,} invalid, {categories.created} new categories'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.cache import bump_catalog_version
+from products.models import BrandStats, CategoryStats
+from products.stats import rebuild_catalog_stats
+
+class Command(BaseCommand):
+    help = 'Recompute the materialized category and brand aggregates from the product table'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_catalog_stats()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt stats for {CategoryStats.objects.count()} categories and {BrandStats.objects.count()} brands'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from products.cache import bump_catalog_version
+from products.search_index import search_index
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text product search index from the product table'
+
+    def handle(self, *args, **options):
+        if not search_index.available:
+            raise CommandError('The full-text search index requires the SQLite backend')
+        with transaction.atomic():
+            count = search_index.rebuild()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} active products'))
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5('
+        "name, description, brand, category_name, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'INSERT INTO products_product_fts (rowid, name, description, brand, category_name) '
+        'SELECT p.id, p.name, p.description, p.brand, c.name '
+        'FROM products_product p JOIN products_category c ON c.id = p.category_id '
+        'WHERE p.is_active'
+    )
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS products_product_fts')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_u_populate_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:25
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Avg, Count, Max, Min, Q
+import django.db.models.deletion
+
+
+def populate_stats(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+    CategoryStats = apps.get_model('products', 'CategoryStats')
+    BrandStats = apps.get_model('products', 'BrandStats')
+    aggregates = {
+        'product_count': Count('id'),
+        'in_stock_count': Count('id', filter=Q(stock_quantity__gt=0)),
+        'min_price': Min('price'),
+        'max_price': Max('price'),
+        'avg_rating': Avg('rating'),
+    }
+    for key, model in (('category_id', CategoryStats), ('brand', BrandStats)):
+        rows = Product.objects.filter(is_active=True).order_by().values(key).annotate(**aggregates)
+        for row in rows:
+            if row['avg_rating'] is not None:
+                row['avg_rating'] = Decimal(row['avg_rating']).quantize(Decimal('0.01'))
+            model.objects.create(**row)
+    for category in Category.objects.filter(stats__isnull=True):
+        CategoryStats.objects.create(category=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BrandStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('avg_rating', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('brand', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Brand stats',
+                'ordering': ['brand'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('in_stock_count', models.PositiveIntegerField(default=0)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('avg_rating', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='products.category')),
+            ],
+            options={
+                'verbose_name_plural': 'Category stats',
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
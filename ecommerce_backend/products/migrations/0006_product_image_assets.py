@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_catalog_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image_url',
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .assets import thumbnail_url
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -22,7 +23,7 @@ class Product(models.Model):
     brand = models.CharField(max_length=100)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0, 
                                 validators=[MinValueValidator(0), MaxValueValidator(5)])
-    image_url = models.URLField(blank=True, null=True)
+    image_url = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -30,10 +31,69 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # Partial on is_active, which every catalog query filters on; SQLite cannot use a
+        # bare boolean term as an index prefix, but it can pick an index whose WHERE matches it
+        indexes = [
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True), name='product_active_created_idx'),
+            models.Index(fields=['price'], condition=models.Q(is_active=True), name='product_active_price_idx'),
+            models.Index(fields=['-rating'], condition=models.Q(is_active=True), name='product_active_rating_idx'),
+            models.Index(fields=['name'], condition=models.Q(is_active=True), name='product_active_name_idx'),
+            models.Index(fields=['category', 'price'], condition=models.Q(is_active=True),
+                         name='product_active_category_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_active=True, featured=True),
+                         name='product_featured_idx'),
+            models.Index(fields=['stock_quantity'], condition=models.Q(is_active=True), name='product_active_stock_idx'),
+            # Incremental syncs read every row changed since a point in time, active or not
+            models.Index(fields=['updated_at'], name='product_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     @property
     def in_stock(self):
-        return self.stock_quantity > 0
\ No newline at end of file
+        return self.stock_quantity > 0
+
+    @property
+    def thumbnail_url(self):
+        return thumbnail_url(self.image_url)
+
+class CatalogStats(models.Model):
+    """Aggregates over active products, maintained by products.stats"""
+    product_count = models.PositiveIntegerField(default=0)
+    in_stock_count = models.PositiveIntegerField(default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class CategoryStats(CatalogStats):
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+
+    class Meta:
+        verbose_name_plural = "Category stats"
+
+    def __str__(self):
+        return f"{self.category_id}: {self.product_count} products"
+
+class BrandStats(CatalogStats):
+    brand = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['brand']
+        verbose_name_plural = "Brand stats"
+
+    def __str__(self):
+        return f"{self.brand}: {self.product_count} products"
+
+class CatalogVersion(models.Model):
+    """Counter shared by every worker; bumped on each catalog write, see products.cache"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
\ No newline at end of file
@@ -0,0 +1,92 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+
+class KeysetPagination:
+    """Cursor pagination keyed on the active sort field plus the product id.
+
+    Each page continues strictly after the (sort value, id) of the previous
+    page's last row, so page N costs the same index seek as page 1 and rows
+    do not shift when the catalog is edited mid-scroll. ``relevance`` keys on
+    the ``search_rank`` column selected by the full-text index. Cursors are
+    opaque URL-safe tokens bound to the sort they were issued for.
+    """
+
+    invalid_cursor_message = 'Invalid cursor'
+    datetime_fields = ('created_at', 'updated_at', 'timestamp')
+
+    def __init__(self, sort_by: str, page_size: int):
+        self.sort_by = sort_by
+        self.page_size = page_size
+        self.field = 'search_rank' if sort_by == 'relevance' else sort_by.lstrip('-')
+        self.descending = sort_by.startswith('-')
+
+    def encode_cursor(self, obj) -> str:
+        value = getattr(obj, self.field)
+        if self.field in self.datetime_fields:
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = json.dumps({'s': self.sort_by, 'v': value, 'id': obj.pk}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token: str):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+            if payload['s'] != self.sort_by:
+                raise ValueError
+            value, last_id = payload['v'], int(payload['id'])
+            if self.field in self.datetime_fields:
+                value = parse_datetime(value)
+                if value is None:
+                    raise ValueError
+            elif self.field in ('price', 'rating'):
+                value = Decimal(value)
+            elif self.field == 'search_rank':
+                value = float(value)
+            elif not isinstance(value, str):
+                raise ValueError
+        except (KeyError, TypeError, ValueError, InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+        return value, last_id
+
+    def order(self, queryset):
+        if self.descending:
+            return queryset.order_by(f'-{self.field}', '-id')
+        return queryset.order_by(self.field, 'id')
+
+    def seek(self, queryset, value, last_id):
+        """Restrict the queryset to rows after (value, last_id) in sort order"""
+        if self.field == 'search_rank':
+            rank_sql = queryset.query.extra_select['search_rank'][0]
+            return queryset.extra(
+                where=[f'(({rank_sql}) > %s OR (({rank_sql}) = %s AND products_product.id > %s))'],
+                params=[value, value, last_id],
+            )
+        if self.descending:
+            return queryset.filter(Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'id__lt': last_id}))
+        return queryset.filter(Q(**{f'{self.field}__gt': value}) | Q(**{self.field: value, 'id__gt': last_id}))
+
+    def page_queryset(self, queryset, cursor: str = None):
+        """The ordered, seeked queryset holding one page plus a look-ahead row"""
+        queryset = self.order(queryset)
+        if cursor:
+            queryset = self.seek(queryset, *self.decode_cursor(cursor))
+        return queryset[:self.page_size + 1]
+
+    def split(self, rows):
+        if len(rows) > self.page_size:
+            rows = rows[:self.page_size]
+            return rows, self.encode_cursor(rows[-1])
+        return rows, None
+
+    def paginate(self, queryset, cursor: str = None):
+        """Return (page rows, cursor for the next page or None)"""
+        return self.split(list(self.page_queryset(queryset, cursor)))
+
+    async def apaginate(self, queryset, cursor: str = None):
+        """``paginate`` through the async ORM"""
+        return self.split([row async for row in self.page_queryset(queryset, cursor)])
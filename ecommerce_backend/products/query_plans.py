@@ -0,0 +1,34 @@
+"""Query plan inspection for the index regression tests and benchmarks.
+
+SQLite only: each captured statement is run through ``EXPLAIN QUERY PLAN``
+and the plan rows that read a whole table without an index are reported.
+"""
+import re
+from typing import Dict, Iterable, List
+from django.db import connection
+
+FULL_SCAN = re.compile(r'^SCAN (?P<table>\w+)(?: AS \w+)?$')
+
+def explain(sql: str) -> List[str]:
+    """The ``detail`` column of SQLite's query plan for a statement"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[3] for row in cursor.fetchall()]
+
+def full_scans(queries: Iterable[Dict[str, str]], tables: Iterable[str]) -> List[str]:
+    """Plan rows that scan one of ``tables`` end to end, with the statement they belong to.
+
+    ``queries`` are ``connection.queries``-style dicts, e.g. from
+    ``CaptureQueriesContext``. Writes and transaction statements are skipped.
+    """
+    tables = set(tables)
+    scans = []
+    for query in queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        for detail in explain(sql):
+            match = FULL_SCAN.match(detail)
+            if match and match['table'] in tables:
+                scans.append(f'{detail}: {sql}')
+    return scans
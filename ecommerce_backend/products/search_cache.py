@@ -0,0 +1,138 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from django.conf import settings
+from .cache import catalog_cache, get_catalog_version
+from .models import Product
+from .serializers import ProductSerializer
+
+@dataclass(frozen=True)
+class SearchResult:
+    """Ranked ids of a search, at most ``SEARCH_CACHE_MAX_IDS`` of them, and the total when known"""
+    ids: Tuple[int, ...]
+    total: Optional[int]
+
+    @property
+    def complete(self) -> bool:
+        return self.total is not None and len(self.ids) >= self.total
+
+    @classmethod
+    def of(cls, queryset, limit: int) -> 'SearchResult':
+        """The first ``limit`` ids of an ordered queryset; the total is only known if they are all of them"""
+        ids = list(queryset.values_list('id', flat=True)[:limit + 1])
+        return cls(tuple(ids[:limit]), len(ids) if len(ids) <= limit else None)
+
+def search_params(filters: Dict[str, Any], order_by: str, match_any: bool = False) -> Dict[str, Any]:
+    """The parameters a search is cached under, in the same shape for every caller"""
+    query = filters.get('query')
+    return {
+        'query': query,
+        'match': ('any' if match_any else 'all') if query else None,
+        'category': filters.get('category'),
+        'min_price': filters.get('min_price'),
+        'max_price': filters.get('max_price'),
+        'brand': filters.get('brand'),
+        # in_stock=false means no stock filter
+        'in_stock': filters.get('in_stock') or None,
+        'featured': filters.get('featured'),
+        'order_by': order_by,
+    }
+
+class SearchResultCache:
+    """Product search results shared by the search endpoint and the chatbot.
+
+    Results are keyed by a normalized form of the search parameters and
+    hold ranked product ids plus the total count, in an in-process LRU.
+    Each entry remembers the catalog version it was computed under, so a
+    product write retires every entry at once. Product payloads are cached
+    per product in the catalog cache, also under the catalog version, so a
+    page of results is rendered without loading the products again.
+    """
+
+    PAYLOAD_KEY = 'products:payload:{version}:{id}'
+
+    def __init__(self, max_entries: int, max_ids: int, payload_timeout: int):
+        self.max_entries = max_entries
+        self.max_ids = max_ids
+        self.payload_timeout = payload_timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.counters = dict.fromkeys(('hits', 'misses', 'evictions', 'payload_hits', 'payload_misses'), 0)
+
+    @staticmethod
+    def normalize(value):
+        if isinstance(value, str):
+            return ' '.join(value.lower().split())
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return format(Decimal(str(value)).normalize(), 'f')
+        return value
+
+    @classmethod
+    def signature(cls, params: Dict[str, Any]) -> str:
+        normalized = {
+            key: cls.normalize(value) for key, value in params.items() if value is not None and value != ''
+        }
+        return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+    def get(self, params: Dict[str, Any], search: Callable[[int], SearchResult]) -> SearchResult:
+        """The cached result for ``params``, or ``search(max_ids)`` stored under the current version"""
+        key = self.signature(params)
+        version = get_catalog_version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return entry[1]
+            self.counters['misses'] += 1
+
+        result = search(self.max_ids)
+        with self._lock:
+            self._entries[key] = (version, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters['evictions'] += 1
+        return result
+
+    def payloads(self, ids: Sequence[int]) -> List[dict]:
+        """Full ``ProductSerializer`` payloads for ids, in order, loading only the uncached ones"""
+        version = get_catalog_version()
+        keys = {pk: self.PAYLOAD_KEY.format(version=version, id=pk) for pk in ids}
+        cache = catalog_cache()
+        cached = cache.get_many(list(keys.values()))
+        missing = [pk for pk in ids if keys[pk] not in cached]
+        if missing:
+            products = Product.objects.select_related('category').in_bulk(missing)
+            loaded = {keys[pk]: dict(ProductSerializer(product).data) for pk, product in products.items()}
+            cache.set_many(loaded, self.payload_timeout)
+            cached.update(loaded)
+        with self._lock:
+            self.counters['payload_hits'] += len(ids) - len(missing)
+            self.counters['payload_misses'] += len(missing)
+        return [cached[keys[pk]] for pk in ids if keys[pk] in cached]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters, entries=len(self._entries))
+        lookups = counters['hits'] + counters['misses']
+        payloads = counters['payload_hits'] + counters['payload_misses']
+        counters['hit_rate'] = round(counters['hits'] / lookups, 3) if lookups else None
+        counters['payload_hit_rate'] = round(counters['payload_hits'] / payloads, 3) if payloads else None
+        return counters
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for name in self.counters:
+                self.counters[name] = 0
+
+search_cache = SearchResultCache(
+    max_entries=settings.SEARCH_CACHE_MAX_ENTRIES,
+    max_ids=settings.SEARCH_CACHE_MAX_IDS,
+    payload_timeout=settings.PRODUCT_PAYLOAD_CACHE_TIMEOUT,
+)
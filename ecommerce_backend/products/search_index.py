@@ -0,0 +1,145 @@
+import re
+from typing import Iterable, List, Optional
+from django.db import connection
+from django.db.models import Q
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+class ProductSearchIndex:
+    """Full-text index over active products backed by an SQLite FTS5 table.
+
+    The table mirrors name, description, brand and category name with the
+    product id as rowid. It is kept current by the signals in
+    ``products.signals`` and rebuilt by ``manage.py rebuild_search_index``.
+    Matching rows are ranked with BM25 and joined back to the product table,
+    so the usual ORM filters still apply on top. On other database backends
+    the old ``icontains`` filters are used instead.
+    """
+
+    table = 'products_product_fts'
+    # BM25 column weights for name, description, brand and category_name
+    weights = (10.0, 1.0, 5.0, 3.0)
+
+    SELECT_ACTIVE_SQL = (
+        'SELECT p.id, p.name, p.description, p.brand, c.name '
+        'FROM products_product p JOIN products_category c ON c.id = p.category_id '
+        'WHERE p.is_active'
+    )
+
+    @property
+    def available(self) -> bool:
+        return connection.vendor == 'sqlite'
+
+    @property
+    def rank_sql(self) -> str:
+        return f'bm25({self.table}, {", ".join(str(weight) for weight in self.weights)})'
+
+    @classmethod
+    def match_expression(cls, query: str, match_any: bool = False) -> Optional[str]:
+        """Build an FTS5 query matching every word (or any word) of the query as a prefix"""
+        tokens = TOKEN_PATTERN.findall(query.lower())
+        if not tokens:
+            return None
+        return (' OR ' if match_any else ' ').join(f'"{token}"*' for token in tokens)
+
+    def create_table(self, cursor):
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5('
+            "name, description, brand, category_name, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+
+    def index_products(self, product_ids: Iterable[int]):
+        """(Re)index the given products; inactive or missing ones are just removed"""
+        product_ids = list(product_ids)
+        if not self.available or not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', product_ids)
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description, brand, category_name) '
+                f'{self.SELECT_ACTIVE_SQL} AND p.id IN ({placeholders})',
+                product_ids
+            )
+
+    def remove_products(self, product_ids: Iterable[int]):
+        product_ids = list(product_ids)
+        if not self.available or not product_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', product_ids)
+
+    def index_category(self, category_id: int):
+        """Reindex every product of a category, e.g. after it was renamed"""
+        if not self.available:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid IN '
+                '(SELECT id FROM products_product WHERE category_id = %s)',
+                [category_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description, brand, category_name) '
+                f'{self.SELECT_ACTIVE_SQL} AND p.category_id = %s',
+                [category_id]
+            )
+
+    def rebuild(self) -> int:
+        """Repopulate the whole index from the product table and return its size"""
+        if not self.available:
+            return 0
+        with connection.cursor() as cursor:
+            self.create_table(cursor)
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description, brand, category_name) '
+                f'{self.SELECT_ACTIVE_SQL}'
+            )
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+    def search_ids(self, query: str, limit: Optional[int] = None, match_any: bool = False) -> List[int]:
+        """Return ids of matching products, best BM25 rank first"""
+        expression = self.match_expression(query, match_any)
+        if not self.available or expression is None:
+            return []
+        sql = f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s ORDER BY {self.rank_sql}'
+        params = [expression]
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def search(self, queryset, query: str, match_any: bool = False):
+        """Restrict a Product queryset to matches and select their rank as ``search_rank``.
+
+        Lower ranks are better, so order by ``search_rank`` ascending. Without
+        a usable query the queryset is returned with a constant rank.
+        """
+        expression = self.match_expression(query, match_any)
+        if expression is None:
+            return queryset.extra(select={'search_rank': '0'})
+        if not self.available:
+            words = query.split() if match_any else [query]
+            condition = Q()
+            for word in words:
+                condition |= (
+                    Q(name__icontains=word) |
+                    Q(description__icontains=word) |
+                    Q(brand__icontains=word) |
+                    Q(category__name__icontains=word)
+                )
+            return queryset.filter(condition).extra(select={'search_rank': '0'})
+        return queryset.extra(
+            select={'search_rank': self.rank_sql},
+            tables=[self.table],
+            where=[f'{self.table}.rowid = products_product.id', f'{self.table} MATCH %s'],
+            params=[expression],
+        )
+
+search_index = ProductSearchIndex()
@@ -1,28 +1,121 @@
+from operator import attrgetter
+from typing import Iterable, List, Optional
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, Category
+from .models import Product, Category, BrandStats, CategoryStats
 
 class CategorySerializer(serializers.ModelSerializer):
-    product_count = serializers.SerializerMethodField()
+    product_count = serializers.IntegerField(source='stats.product_count', default=0, read_only=True)
+    in_stock_count = serializers.IntegerField(source='stats.in_stock_count', default=0, read_only=True)
+    min_price = serializers.DecimalField(source='stats.min_price', max_digits=10, decimal_places=2,
+                                         default=None, read_only=True)
+    max_price = serializers.DecimalField(source='stats.max_price', max_digits=10, decimal_places=2,
+                                         default=None, read_only=True)
+    avg_rating = serializers.DecimalField(source='stats.avg_rating', max_digits=3, decimal_places=2,
+                                          default=None, read_only=True)
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'description', 'product_count', 'created_at']
+        fields = ['id', 'name', 'description', 'product_count', 'in_stock_count',
+                  'min_price', 'max_price', 'avg_rating', 'created_at']
 
-    def get_product_count(self, obj):
-        return obj.products.filter(is_active=True).count()
+class BrandStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BrandStats
+        fields = ['brand', 'product_count', 'in_stock_count', 'min_price', 'max_price', 'avg_rating']
 
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     in_stock = serializers.ReadOnlyField()
+    thumbnail_url = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
         fields = [
             'id', 'name', 'description', 'category', 'category_name', 'price',
-            'stock_quantity', 'sku', 'brand', 'rating', 'image_url',
+            'stock_quantity', 'sku', 'brand', 'rating', 'image_url', 'thumbnail_url',
             'is_active', 'featured', 'in_stock', 'created_at', 'updated_at'
         ]
 
+COMPACT_PRODUCT_FIELDS = [
+    'id', 'name', 'category', 'category_name', 'price', 'brand', 'rating', 'in_stock', 'featured',
+    'thumbnail_url'
+]
+
+def format_decimal(value, places: int = 2) -> Optional[str]:
+    return None if value is None else f'{value:.{places}f}'
+
+def format_datetime(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+class ProductFieldset:
+    """A subset of ``ProductSerializer`` fields rendered without DRF field machinery.
+
+    Products are loaded with ``.only()`` for the requested columns and each
+    value is formatted the way the matching serializer field formats it, so
+    the output is identical to the full serializer restricted to ``fields``.
+    """
+
+    COLUMNS = {
+        'category': 'category', 'category_name': 'category__name', 'in_stock': 'stock_quantity',
+        'thumbnail_url': 'image_url',
+    }
+    FORMATTERS = {
+        'category': attrgetter('category_id'),
+        'category_name': lambda product: product.category.name,
+        'price': lambda product: format_decimal(product.price),
+        'rating': lambda product: format_decimal(product.rating),
+        'in_stock': lambda product: product.stock_quantity > 0,
+        'created_at': lambda product: format_datetime(product.created_at),
+        'updated_at': lambda product: format_datetime(product.updated_at),
+    }
+
+    def __init__(self, fields: Iterable[str]):
+        self.fields = list(dict.fromkeys(fields))
+        self.formatters = [(field, self.FORMATTERS.get(field) or attrgetter(field)) for field in self.fields]
+
+    @classmethod
+    def from_params(cls, params, default: str = 'full') -> Optional['ProductFieldset']:
+        """Fieldset for ``fields=a,b`` or ``view=compact``; None selects the full serializer"""
+        if params.get('fields'):
+            fields = [field.strip() for field in params['fields'].split(',') if field.strip()]
+            unknown = sorted(set(fields) - set(ProductSerializer.Meta.fields))
+            if unknown:
+                raise serializers.ValidationError({'fields': [f'Unknown product fields: {", ".join(unknown)}.']})
+            return cls(fields)
+        view = params.get('view') or default
+        if view == 'compact':
+            return cls(COMPACT_PRODUCT_FIELDS)
+        if view != 'full':
+            raise serializers.ValidationError({'view': ['Expected "full" or "compact".']})
+        return None
+
+    def only(self, queryset, *extra: str):
+        """Restrict a product queryset to the columns this fieldset reads"""
+        columns = {'id', *extra}
+        for field in self.fields:
+            columns.add(self.COLUMNS.get(field, field))
+        if 'category_name' in self.fields:
+            columns.add('category')
+        else:
+            queryset = queryset.select_related(None)
+        return queryset.only(*columns)
+
+    def to_representation(self, product) -> dict:
+        return {field: format(product) for field, format in self.formatters}
+
+    def serialize(self, products: Iterable) -> List[dict]:
+        return [self.to_representation(product) for product in products]
+
+    def project(self, payloads: Iterable[dict]) -> List[dict]:
+        """Restrict full serializer payloads to this fieldset"""
+        return [{field: payload[field] for field in self.fields} for payload in payloads]
+
+SORT_CHOICES = ['relevance', 'name', '-name', 'price', '-price', 'rating', '-rating', 'created_at', '-created_at']
+
 class ProductSearchSerializer(serializers.Serializer):
     query = serializers.CharField(required=False, allow_blank=True)
     category = serializers.IntegerField(required=False)
@@ -32,7 +125,7 @@ class ProductSearchSerializer(serializers.Serializer):
     in_stock = serializers.BooleanField(required=False)
     featured = serializers.BooleanField(required=False)
     sort_by = serializers.ChoiceField(
-        choices=['name', '-name', 'price', '-price', 'rating', '-rating', 'created_at', '-created_at'],
-        required=False,
-        default='-created_at'
-    )
\ No newline at end of file
+        choices=SORT_CHOICES,
+        required=False
+    )
+    facets = serializers.BooleanField(required=False, default=False)
\ No newline at end of file
@@ -0,0 +1,59 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .assets import AssetError, is_data_uri, store_data_uri
+from .cache import bump_catalog_version
+from .models import Category, Product
+from .search_index import search_index
+from .snapshot import catalog_snapshot
+from .stats import create_category_stats, refresh_brand_stats, refresh_category_stats
+
+@receiver(post_save, sender=Product)
+def sync_product(sender, instance, **kwargs):
+    search_index.index_products([instance.pk])
+    catalog_snapshot.apply(instance)
+
+@receiver(post_delete, sender=Product)
+def forget_product(sender, instance, **kwargs):
+    search_index.remove_products([instance.pk])
+    catalog_snapshot.discard(instance.pk)
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, created, **kwargs):
+    if not created:
+        search_index.index_category(instance.pk)
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def bump_version(sender, **kwargs):
+    bump_catalog_version()
+
+@receiver(pre_save, sender=Product)
+def remember_stats_keys(sender, instance, **kwargs):
+    """Stash the stored category and brand so moving a product refreshes both sides"""
+    instance._previous_stats_keys = None
+    if instance.pk:
+        instance._previous_stats_keys = Product.objects.filter(pk=instance.pk).values_list('category_id', 'brand').first()
+
+@receiver([post_save, post_delete], sender=Product)
+def refresh_stats(sender, instance, **kwargs):
+    categories, brands = {instance.category_id}, {instance.brand}
+    previous = getattr(instance, '_previous_stats_keys', None)
+    if previous:
+        categories.add(previous[0])
+        brands.add(previous[1])
+    refresh_category_stats(categories)
+    refresh_brand_stats(brands)
+
+@receiver(post_save, sender=Category)
+def add_category_stats(sender, instance, created, **kwargs):
+    if created:
+        create_category_stats([instance.pk])
+
+@receiver(pre_save, sender=Product)
+def store_inline_image(sender, instance, **kwargs):
+    """Move an inline data URI into the asset store before the row is written"""
+    if is_data_uri(instance.image_url):
+        try:
+            instance.image_url = store_data_uri(instance.image_url)
+        except AssetError:
+            pass
@@ -0,0 +1,306 @@
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from django.conf import settings
+from django.utils import timezone
+from .models import Product
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; callers fall back to the ORM
+    np = None
+
+class _Columns:
+    """One generation of snapshot arrays, sorted by product id"""
+
+    def __init__(self, ids, price, rating, stock, category, featured, brand, created, brands):
+        self.ids = ids
+        self.price = price
+        self.rating = rating
+        self.stock = stock
+        self.category = category
+        self.featured = featured
+        self.brand = brand
+        self.created = created
+        self.alive = np.ones(len(ids), dtype=bool)
+        self.brands = brands
+        self.brand_codes = {name: code for code, name in enumerate(brands)}
+
+    def brand_code(self, name: str) -> int:
+        if name not in self.brand_codes:
+            self.brand_codes[name] = len(self.brands)
+            self.brands.append(name)
+        return self.brand_codes[name]
+
+    def rows_of(self, ids):
+        """Map product ids to row numbers, -1 where the id is not in the snapshot"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    def row_of(self, product_id: int) -> Optional[int]:
+        row = int(self.rows_of([product_id])[0])
+        return row if row >= 0 else None
+
+class CatalogSnapshot:
+    """Read-optimized columnar copy of the active catalog held as NumPy arrays.
+
+    Filters run as vectorized boolean masks and sorted pages come from a
+    partial sort of the matching rows, so only the ids of the winning page
+    are hydrated from the database. Product signals patch rows in place or
+    queue new ones. Every ``max_age`` seconds the snapshot also pulls rows
+    updated since its last sync, so changes made by other workers converge
+    without a full rebuild; a full rebuild only happens when the active
+    product count no longer matches, e.g. after deletes elsewhere.
+    """
+
+    FIELDS = ('id', 'price', 'rating', 'stock_quantity', 'category_id', 'featured', 'brand', 'created_at')
+    ORDERINGS = {
+        'price': ('price', False), '-price': ('price', True),
+        'rating': ('rating', False), '-rating': ('rating', True),
+        'created_at': ('created', False), '-created_at': ('created', True),
+    }
+
+    def __init__(self, max_age: float, enabled: bool = True):
+        self.max_age = max_age
+        self.enabled = enabled and np is not None
+        self._lock = threading.Lock()
+        self._columns = None
+        self._pending = {}
+        self._synced_at = None
+        self._checked_at = 0.0
+
+    def supports(self, order_by: str) -> bool:
+        return self.enabled and order_by in self.ORDERINGS
+
+    def invalidate(self):
+        with self._lock:
+            self._columns = None
+            self._pending = {}
+
+    @staticmethod
+    def _row(product) -> Tuple:
+        return (
+            product.id, float(product.price), float(product.rating), product.stock_quantity,
+            product.category_id, product.featured, product.brand, product.created_at.timestamp(),
+        )
+
+    def _build(self, rows: Iterable[Tuple]) -> _Columns:
+        ids, price, rating, stock, category, featured, brand, created = [], [], [], [], [], [], [], []
+        brands, brand_codes = [], {}
+        for row in rows:
+            ids.append(row[0])
+            price.append(row[1])
+            rating.append(row[2])
+            stock.append(row[3])
+            category.append(row[4])
+            featured.append(row[5])
+            if row[6] not in brand_codes:
+                brand_codes[row[6]] = len(brands)
+                brands.append(row[6])
+            brand.append(brand_codes[row[6]])
+            created.append(row[7])
+        ids = np.array(ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        return _Columns(
+            ids[order], np.array(price, dtype=np.float64)[order],
+            np.array(rating, dtype=np.float64)[order], np.array(stock, dtype=np.int64)[order],
+            np.array(category, dtype=np.int64)[order], np.array(featured, dtype=bool)[order],
+            np.array(brand, dtype=np.int32)[order], np.array(created, dtype=np.float64)[order], brands,
+        )
+
+    def _load(self) -> _Columns:
+        queryset = Product.objects.filter(is_active=True).order_by('id').values_list(*self.FIELDS)
+        return self._build(
+            (pk, float(price), float(rating), stock, category, featured, brand, created.timestamp())
+            for pk, price, rating, stock, category, featured, brand, created in queryset.iterator(chunk_size=10000)
+        )
+
+    @staticmethod
+    def _merge(columns: _Columns, pending: Dict[int, Tuple]) -> _Columns:
+        """Append queued rows and drop dead ones with array concatenation"""
+        added = list(pending.values())
+        live = columns.alive
+        brands = list(columns.brands)
+        brand_codes = dict(columns.brand_codes)
+        for row in added:
+            if row[6] not in brand_codes:
+                brand_codes[row[6]] = len(brands)
+                brands.append(row[6])
+
+        def combine(existing, values, dtype):
+            return np.concatenate([existing[live], np.array(values, dtype=dtype)])
+
+        ids = combine(columns.ids, [row[0] for row in added], np.int64)
+        order = np.argsort(ids, kind='stable')
+        arrays = [
+            ids,
+            combine(columns.price, [row[1] for row in added], np.float64),
+            combine(columns.rating, [row[2] for row in added], np.float64),
+            combine(columns.stock, [row[3] for row in added], np.int64),
+            combine(columns.category, [row[4] for row in added], np.int64),
+            combine(columns.featured, [row[5] for row in added], bool),
+            combine(columns.brand, [brand_codes[row[6]] for row in added], np.int32),
+            combine(columns.created, [row[7] for row in added], np.float64),
+        ]
+        return _Columns(*(array[order] for array in arrays), brands)
+
+    def columns(self) -> _Columns:
+        """Return the current arrays, loading, syncing or folding in queued rows as needed"""
+        columns = self._columns
+        if columns is not None and not self._pending and time.monotonic() - self._checked_at <= self.max_age:
+            return columns
+        with self._lock:
+            if self._columns is None:
+                self._synced_at = timezone.now()
+                self._columns = self._load()
+                self._pending = {}
+                self._checked_at = time.monotonic()
+            elif time.monotonic() - self._checked_at > self.max_age:
+                self._sync()
+            if self._pending:
+                self._columns = self._merge(self._columns, self._pending)
+                self._pending = {}
+            return self._columns
+
+    def _sync(self):
+        synced_at = timezone.now()
+        changed = Product.objects.filter(updated_at__gte=self._synced_at).only(
+            'id', 'price', 'rating', 'stock_quantity', 'category_id', 'featured', 'brand', 'created_at', 'is_active'
+        )
+        for product in changed.iterator(chunk_size=2000):
+            self._apply(product)
+        alive = int(self._columns.alive.sum()) + len(self._pending)
+        if Product.objects.filter(is_active=True).count() != alive:
+            self._columns = self._load()
+            self._pending = {}
+        self._synced_at = synced_at
+        self._checked_at = time.monotonic()
+
+    def apply(self, product):
+        """Reflect a saved product: patch its row, queue it if new, or drop it if inactive"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._columns is not None:
+                self._apply(product)
+
+    def _apply(self, product):
+        columns = self._columns
+        row = columns.row_of(product.id)
+        if not product.is_active:
+            self._pending.pop(product.id, None)
+            if row is not None:
+                columns.alive[row] = False
+        elif row is not None:
+            columns.price[row] = float(product.price)
+            columns.rating[row] = float(product.rating)
+            columns.stock[row] = product.stock_quantity
+            columns.category[row] = product.category_id
+            columns.featured[row] = product.featured
+            columns.brand[row] = columns.brand_code(product.brand)
+            columns.created[row] = product.created_at.timestamp()
+            columns.alive[row] = True
+        else:
+            self._pending[product.id] = self._row(product)
+
+    def discard(self, product_id: int):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending.pop(product_id, None)
+            if self._columns is not None:
+                row = self._columns.row_of(product_id)
+                if row is not None:
+                    self._columns.alive[row] = False
+
+    def query(self, category=None, min_price=None, max_price=None, brand=None, in_stock=None,
+              featured=None, ids: Optional[Sequence[int]] = None, order_by: str = '-rating',
+              offset: int = 0, limit: int = 20) -> Tuple[List[int], int]:
+        """Return (ids of the requested page, total matches) for the given filters.
+
+        ``brand`` matches case-insensitively as a substring, like ``icontains``.
+        When ``ids`` is given only those products are considered, and
+        ``order_by='relevance'`` keeps their order. Ties sort by id.
+        """
+        columns = self.columns()
+        if ids is not None:
+            candidates = columns.rows_of(ids)
+            candidates = candidates[candidates >= 0]
+        else:
+            candidates = None
+
+        mask = columns.alive.copy()
+        if category is not None:
+            mask &= columns.category == int(category)
+        if min_price is not None:
+            mask &= columns.price >= float(min_price)
+        if max_price is not None:
+            mask &= columns.price <= float(max_price)
+        if brand:
+            needle = brand.lower()
+            codes = [code for code, name in enumerate(columns.brands) if needle in name.lower()]
+            mask &= np.isin(columns.brand, codes)
+        if in_stock:
+            mask &= columns.stock > 0
+        if featured is not None:
+            mask &= columns.featured == bool(featured)
+
+        rows = candidates[mask[candidates]] if candidates is not None else np.flatnonzero(mask)
+        total = len(rows)
+        end = min(offset + limit, total)
+        if offset >= end:
+            return [], total
+        if order_by == 'relevance' and candidates is not None:
+            return columns.ids[rows[offset:end]].tolist(), total
+
+        column, descending = self.ORDERINGS[order_by]
+        keys = getattr(columns, column)[rows]
+        if descending:
+            keys = -keys
+        if end < total:
+            # Keep everything up to the end-th key, including ties, then sort just those
+            threshold = np.partition(keys, end - 1)[end - 1]
+            selected = keys <= threshold
+            rows, keys = rows[selected], keys[selected]
+        order = np.lexsort((columns.ids[rows], keys))[offset:end]
+        return columns.ids[rows[order]].tolist(), total
+
+    @staticmethod
+    def hydrate(ids: Sequence[int], queryset=None) -> List[Product]:
+        """Load products for ids with one in_bulk query, preserving the id order"""
+        queryset = queryset if queryset is not None else Product.objects.select_related('category')
+        products = queryset.in_bulk(ids)
+        return [products[pk] for pk in ids if pk in products]
+
+class SnapshotResults:
+    """Lazy, sliceable result list so Django paginators can page a snapshot query"""
+
+    def __init__(self, snapshot: CatalogSnapshot, queryset=None, **filters):
+        self.snapshot = snapshot
+        self.queryset = queryset
+        self.filters = filters
+        self._total = None
+
+    def count(self) -> int:
+        if self._total is None:
+            self._total = self.snapshot.query(limit=0, **self.filters)[1]
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        ids, self._total = self.snapshot.query(offset=start, limit=max(stop - start, 0), **self.filters)
+        return self.snapshot.hydrate(ids, self.queryset)
+
+catalog_snapshot = CatalogSnapshot(
+    max_age=settings.CATALOG_SNAPSHOT_MAX_AGE,
+    enabled=settings.CATALOG_SNAPSHOT_ENABLED,
+)
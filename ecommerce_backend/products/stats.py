@@ -0,0 +1,70 @@
+from decimal import Decimal
+from typing import Iterable
+from django.db.models import Avg, Count, Max, Min, Q
+from django.utils import timezone
+from .models import BrandStats, Category, CategoryStats, Product
+
+AGGREGATES = {
+    'product_count': Count('id'),
+    'in_stock_count': Count('id', filter=Q(stock_quantity__gt=0)),
+    'min_price': Min('price'),
+    'max_price': Max('price'),
+    'avg_rating': Avg('rating'),
+}
+EMPTY = {'product_count': 0, 'in_stock_count': 0, 'min_price': None, 'max_price': None, 'avg_rating': None}
+
+def _aggregate(key: str, values: Iterable):
+    """Aggregate active products grouped by ``key`` for the given key values"""
+    rows = (
+        Product.objects.filter(is_active=True, **{f'{key}__in': list(values)})
+        .order_by().values(key).annotate(**AGGREGATES)
+    )
+    result = {}
+    for row in rows:
+        if row['avg_rating'] is not None:
+            row['avg_rating'] = Decimal(row['avg_rating']).quantize(Decimal('0.01'))
+        result[row.pop(key)] = row
+    return result
+
+def create_category_stats(category_ids: Iterable[int]):
+    """Add empty stats rows for categories that have none"""
+    CategoryStats.objects.bulk_create(
+        [CategoryStats(category_id=pk) for pk in category_ids], ignore_conflicts=True
+    )
+
+def refresh_category_stats(category_ids: Iterable[int]):
+    """Recompute the existing stats rows of the given categories.
+
+    Rows are only updated, never created here, so cascaded product deletes
+    cannot resurrect the row of a category that is being deleted.
+    """
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if not category_ids:
+        return
+    aggregates = _aggregate('category_id', category_ids)
+    for category_id in category_ids:
+        CategoryStats.objects.filter(category_id=category_id).update(
+            updated_at=timezone.now(), **aggregates.get(category_id, EMPTY)
+        )
+
+def refresh_brand_stats(brands: Iterable[str]):
+    """Recompute the stats rows of the given brands, dropping brands without active products"""
+    brands = {brand for brand in brands if brand}
+    if not brands:
+        return
+    aggregates = _aggregate('brand', brands)
+    for brand in brands:
+        if brand in aggregates:
+            BrandStats.objects.update_or_create(brand=brand, defaults=aggregates[brand])
+        else:
+            BrandStats.objects.filter(brand=brand).delete()
+
+def rebuild_catalog_stats():
+    """Recompute every stats row from the product table"""
+    BrandStats.objects.exclude(
+        brand__in=Product.objects.filter(is_active=True).values('brand')
+    ).delete()
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    create_category_stats(category_ids)
+    refresh_category_stats(category_ids)
+    refresh_brand_stats(Product.objects.filter(is_active=True).values_list('brand', flat=True).distinct())
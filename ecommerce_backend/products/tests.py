@@ -1,3 +1,739 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from .cache import SharedCatalogVersion
+from .importing import upsert_products
+from .models import Category, CategoryStats, Product
+from .serializers import COMPACT_PRODUCT_FIELDS, ProductSerializer
+from .counting import result_counter
+from .query_plans import full_scans
+from .search_cache import search_cache
+from .search_index import search_index
+from .snapshot import catalog_snapshot
 
-# Create your tests here.
+class ProductSearchIndexTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.audio = Category.objects.create(name='Audio')
+        self.speaker = Product.objects.create(
+            name='Bluetooth Speaker', description='Portable speaker with deep bass',
+            category=self.audio, price=59, sku='BS-1', brand='SoundWave', rating=4.0
+        )
+        self.cable = Product.objects.create(
+            name='Audio Cable', description='Works with any bluetooth speaker dock',
+            category=self.audio, price=9, sku='AC-1', brand='Wires', rating=4.9
+        )
+
+    def test_words_match_in_any_order_ranked_by_relevance(self):
+        self.assertEqual(search_index.search_ids('speaker bluetooth'), [self.speaker.id, self.cable.id])
+        self.assertEqual(search_index.search_ids('speakers soundwave'), [self.speaker.id])
+
+    def test_index_follows_product_and_category_changes(self):
+        self.cable.is_active = False
+        self.cable.save()
+        self.assertEqual(search_index.search_ids('bluetooth'), [self.speaker.id])
+
+        self.audio.name = 'Hifi'
+        self.audio.save()
+        self.assertEqual(search_index.search_ids('hifi'), [self.speaker.id])
+
+        self.speaker.delete()
+        self.assertEqual(search_index.search_ids('bluetooth'), [])
+
+    def test_search_endpoint_ranks_matches_and_applies_filters(self):
+        response = self.client.post('/api/products/search/', {'query': 'bluetooth speaker'}, format='json')
+        self.assertEqual([p['id'] for p in response.data['products']], [self.speaker.id, self.cable.id])
+
+        response = self.client.post('/api/products/search/', {'query': 'bluetooth', 'max_price': 20}, format='json')
+        self.assertEqual(response.data['total_count'], 1)
+        self.assertEqual(response.data['products'][0]['id'], self.cable.id)
+
+    def test_rebuild_restores_a_cleared_index(self):
+        search_index.remove_products([self.speaker.id, self.cable.id])
+        self.assertEqual(search_index.rebuild(), Product.objects.filter(is_active=True).count())
+        self.assertEqual(len(search_index.search_ids('bluetooth')), 2)
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        catalog_snapshot.invalidate()
+        Product.objects.all().delete()
+        self.shoes = Category.objects.create(name='Shoes')
+        self.products = [
+            Product.objects.create(
+                name=f'Runner {index}', description='Running shoe', category=self.shoes,
+                price=price, rating=rating, stock_quantity=stock, sku=f'RUN-{index}', brand=brand
+            )
+            for index, (price, rating, stock, brand) in enumerate([
+                (120, 4.5, 3, 'Stride'), (80, 4.8, 0, 'Stride'), (60, 3.9, 10, 'Pace'),
+                (200, 4.8, 1, 'Pace'), (95, 4.1, 7, 'Stridex'),
+            ])
+        ]
+
+    def ids(self, *indexes):
+        return [self.products[index].id for index in indexes]
+
+    def test_filters_and_top_k_ordering(self):
+        self.assertEqual(catalog_snapshot.query(order_by='-rating'), (self.ids(1, 3, 0, 4, 2), 5))
+        self.assertEqual(catalog_snapshot.query(order_by='-rating', limit=2), (self.ids(1, 3), 5))
+        self.assertEqual(catalog_snapshot.query(order_by='-rating', offset=1, limit=2), (self.ids(3, 0), 5))
+        self.assertEqual(
+            catalog_snapshot.query(brand='stride', in_stock=True, max_price=150, order_by='price'),
+            (self.ids(4, 0), 2)
+        )
+        self.assertEqual(
+            catalog_snapshot.query(ids=self.ids(2, 3, 1), min_price=70, order_by='relevance'),
+            (self.ids(3, 1), 2)
+        )
+
+    def test_follows_product_changes(self):
+        catalog_snapshot.columns()
+        self.products[2].price = 500
+        self.products[2].save()
+        self.products[3].is_active = False
+        self.products[3].save()
+        self.products[0].delete()
+        added = Product.objects.create(
+            name='Trail', description='Trail shoe', category=self.shoes,
+            price=150, rating=5, stock_quantity=2, sku='TRAIL-1', brand='Summit'
+        )
+        self.assertEqual(catalog_snapshot.query(order_by='-price'), ([self.products[2].id, added.id] + self.ids(4, 1), 4))
+
+    def test_syncs_changes_made_without_signals(self):
+        catalog_snapshot.columns()
+        Product.objects.filter(id=self.products[2].id).update(price=999, updated_at=timezone.now())
+        self.addCleanup(setattr, catalog_snapshot, 'max_age', catalog_snapshot.max_age)
+        catalog_snapshot.max_age = 0
+        self.assertEqual(catalog_snapshot.query(order_by='-price', limit=1), (self.ids(2), 5))
+
+    def test_product_list_pages_through_the_snapshot(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/products/', {'sort_by': 'price'})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual([p['id'] for p in response.data['results']], self.ids(2, 1, 4, 0, 3))
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        catalog_snapshot.invalidate()
+        Product.objects.all().delete()
+        self.bags = Category.objects.create(name='Bags')
+        for index in range(7):
+            Product.objects.create(
+                name=f'Tote bag {index % 3}', description='Canvas tote' + ' canvas' * index, category=self.bags,
+                price=10 + index % 4, rating=index % 2, sku=f'TOTE-{index}', brand='Carry'
+            )
+
+    def walk(self, fetch):
+        ids, cursor = [], ''
+        while cursor is not None:
+            cursor, page = fetch(cursor)
+            ids += [product['id'] for product in page]
+        return ids
+
+    def test_listing_walks_every_sort_without_gaps(self):
+        for sort_by in ['name', '-name', 'price', '-price', 'rating', '-rating', 'created_at', '-created_at']:
+            expected = list(Product.objects.order_by(
+                *([sort_by, 'id'] if not sort_by.startswith('-') else [sort_by, '-id'])
+            ).values_list('id', flat=True))
+
+            def fetch(cursor):
+                data = self.client.get('/api/products/', {'sort_by': sort_by, 'cursor': cursor, 'page_size': 3}).data
+                return data['next_cursor'], data['results']
+
+            self.assertEqual(self.walk(fetch), expected, sort_by)
+
+    def test_search_cursor_by_relevance(self):
+        def fetch(cursor):
+            data = self.client.post(
+                f'/api/products/search/?page_size=2&cursor={cursor}', {'query': 'canvas'}, format='json'
+            ).data
+            return data['next_cursor'], data['products']
+
+        self.assertEqual(self.walk(fetch), search_index.search_ids('canvas'))
+
+    def test_pages_do_not_shift_when_rows_are_inserted(self):
+        first = self.client.get('/api/products/', {'sort_by': 'price', 'cursor': '', 'page_size': 3}).data
+        Product.objects.create(name='Cheap tote', description='Tote', category=self.bags, price=1, sku='TOTE-X', brand='Carry')
+        second = self.client.get('/api/products/', {'sort_by': 'price', 'cursor': first['next_cursor'], 'page_size': 3}).data
+        last_price = Decimal(first['results'][-1]['price'])
+        self.assertTrue(all(Decimal(product['price']) >= last_price for product in second['results']))
+
+    def test_rejects_foreign_or_garbled_cursors(self):
+        cursor = self.client.get('/api/products/', {'sort_by': 'price', 'cursor': '', 'page_size': 3}).data['next_cursor']
+        self.assertEqual(self.client.get('/api/products/', {'sort_by': 'name', 'cursor': cursor}).status_code, 404)
+        self.assertEqual(self.client.get('/api/products/', {'cursor': 'garbage'}).status_code, 404)
+
+class ResultCountTests(TestCase):
+    def setUp(self):
+        search_cache.clear()
+        self.lamps = Category.objects.create(name='Lamps')
+        for index in range(6):
+            Product.objects.create(
+                name=f'Desk lamp {index}', description='LED lamp', category=self.lamps,
+                price=20 + index, sku=f'LAMP-{index}', brand='Glow'
+            )
+
+    def search(self, count=None, **body):
+        url = '/api/products/search/' + (f'?count={count}' if count else '')
+        return self.client.post(url, {'category': self.lamps.id, **body}, format='json').data
+
+    def test_exact_counts_are_cached_until_the_catalog_changes(self):
+        self.assertEqual(self.search(query='Lamp')['total_count'], 6)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search(query='  lamp ')['total_count'], 6)
+
+        Product.objects.filter(sku='LAMP-0').get().delete()
+        self.assertEqual(self.search(query='lamp')['total_count'], 5)
+
+    def test_estimates_are_flagged_above_the_exact_limit(self):
+        self.addCleanup(setattr, result_counter, 'exact_limit', result_counter.exact_limit)
+        self.addCleanup(setattr, search_cache, 'max_ids', search_cache.max_ids)
+        # Only count separately when the cached ids do not cover every match
+        search_cache.max_ids = 2
+        result_counter.exact_limit = 10
+        data = self.search(count='estimate')
+        self.assertEqual((data['total_count'], data['is_estimate']), (6, False))
+
+        result_counter.exact_limit = 3
+        data = self.search(count='estimate', max_price=100)
+        self.assertTrue(data['is_estimate'])
+        self.assertGreaterEqual(data['total_count'], 4)
+
+    def test_counting_can_be_skipped(self):
+        self.addCleanup(setattr, search_cache, 'max_ids', search_cache.max_ids)
+        search_cache.max_ids = 2
+        with self.assertNumQueries(2):  # ids for the cache, then the page past them
+            data = self.search(count='none')
+        self.assertIsNone(data['total_count'])
+        self.assertEqual(len(data['products']), 6)
+
+class SearchResultCacheTests(TestCase):
+    def setUp(self):
+        search_cache.clear()
+        self.addCleanup(search_cache.clear)
+        catalog_snapshot.invalidate()
+        self.addCleanup(catalog_snapshot.invalidate)
+        self.client = APIClient()
+        self.mugs = Category.objects.create(name='Mugs')
+        for index in range(4):
+            Product.objects.create(
+                name=f'Enamel mug {index}', description='Camp mug', category=self.mugs,
+                price=10 + index * 10, rating=3 + index / 2, sku=f'MUG-{index}', brand='Tinware'
+            )
+
+    def search(self, **body):
+        return self.client.post('/api/products/search/?page_size=2', body, format='json').data
+
+    def test_pages_and_equivalent_parameters_share_one_entry(self):
+        first = self.search(query='Enamel  MUG', max_price='40.00', sort_by='price')
+        self.assertEqual([p['sku'] for p in first['products']], ['MUG-0', 'MUG-1'])
+        with self.assertNumQueries(1):  # the second page's products; the ids and total are cached
+            second = self.client.post(
+                '/api/products/search/?page_size=2&page=2',
+                {'query': 'enamel mug', 'max_price': 40, 'sort_by': 'price'}, format='json'
+            ).data
+        self.assertEqual([p['sku'] for p in second['products']], ['MUG-2', 'MUG-3'])
+        self.assertEqual(second['total_count'], 4)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search(query='enamel mug', max_price=40, sort_by='price'), first)
+        self.assertEqual(search_cache.stats()['hits'], 2)
+
+    def test_chat_searches_share_entries_with_the_endpoint(self):
+        from chatbot.search import search_products as chat_search
+        from chatbot.utils import ParsedMessage
+        self.search(category=self.mugs.id, max_price=25, sort_by='-rating')
+        products, _ = chat_search(
+            ParsedMessage(intent='search', confidence=1.0, max_price=25, categories=(self.mugs.id,))
+        )
+        self.assertEqual([product.sku for product in products], ['MUG-1', 'MUG-0'])
+        self.assertEqual((search_cache.stats()['hits'], search_cache.stats()['misses']), (1, 1))
+
+    def test_product_writes_retire_entries_and_payloads(self):
+        self.search(sort_by='price')
+        Product.objects.filter(sku='MUG-0').get().save(update_fields=['name'])
+        mug = Product.objects.get(sku='MUG-1')
+        mug.price = 5
+        mug.save()
+        data = self.search(sort_by='price')
+        self.assertEqual([(p['sku'], p['price']) for p in data['products']], [('MUG-1', '5.00'), ('MUG-0', '10.00')])
+        self.assertEqual(search_cache.stats()['misses'], 2)
+
+    def test_stats_are_for_staff(self):
+        from django.contrib.auth import get_user_model
+        staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='secret-pass', is_staff=True
+        )
+        self.assertIn(self.client.get('/api/products/search/stats/').status_code, (401, 403))
+        self.search(query='mug')
+        self.search(query='mug')
+        self.client.force_authenticate(staff)
+        stats = self.client.get('/api/products/search/stats/').data
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+        self.assertEqual(stats['payload_hit_rate'], 0.5)
+
+class CatalogStatsTests(TestCase):
+    def setUp(self):
+        self.tents = Category.objects.create(name='Tents')
+        self.stoves = Category.objects.create(name='Stoves')
+        self.tent = Product.objects.create(
+            name='Dome tent', description='2 person', category=self.tents,
+            price=150, rating=4.2, stock_quantity=2, sku='TENT-1', brand='Basecamp'
+        )
+        Product.objects.create(
+            name='Tunnel tent', description='4 person', category=self.tents,
+            price=300, rating=4.7, stock_quantity=0, sku='TENT-2', brand='Basecamp'
+        )
+
+    def stats(self, name):
+        categories = self.client.get('/api/products/categories/').json()['results']
+        return next(category for category in categories if category['name'] == name)
+
+    def test_category_listing_reads_the_aggregates(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/categories/', {'page': 1})
+        tents = self.stats('Tents')
+        self.assertEqual((tents['product_count'], tents['in_stock_count']), (2, 1))
+        self.assertEqual((tents['min_price'], tents['max_price'], tents['avg_rating']), ('150.00', '300.00', '4.45'))
+        self.assertEqual(self.stats('Stoves')['product_count'], 0)
+
+    def test_moving_a_product_updates_both_sides(self):
+        self.tent.category = self.stoves
+        self.tent.brand = 'Flame'
+        self.tent.save()
+        self.assertEqual(self.stats('Tents')['product_count'], 1)
+        self.assertEqual(self.stats('Stoves')['max_price'], '150.00')
+
+        brands = self.client.get('/api/products/brands/', {'stats': 'true'}).json()['brands']
+        by_name = {brand['brand']: brand for brand in brands}
+        self.assertEqual((by_name['Basecamp']['product_count'], by_name['Flame']['product_count']), (1, 1))
+
+    def test_rebuild_repairs_drift(self):
+        Product.objects.filter(brand='Basecamp').update(is_active=False)
+        self.assertIn('Basecamp', self.client.get('/api/products/brands/').json()['brands'])
+        call_command('rebuild_catalog_stats', stdout=StringIO())
+        self.assertNotIn('Basecamp', self.client.get('/api/products/brands/').json()['brands'])
+        self.assertEqual(self.stats('Tents')['product_count'], 0)
+
+class SearchFacetTests(TestCase):
+    def setUp(self):
+        self.jackets = Category.objects.create(name='Jackets')
+        self.boots = Category.objects.create(name='Boots')
+        rows = [
+            ('Rain jacket', self.jackets, 80, 3, 'Northwind'),
+            ('Down jacket', self.jackets, 320, 0, 'Northwind'),
+            ('Hiking boots', self.boots, 140, 5, 'Trailhead'),
+            ('Rain boots', self.boots, 45, 2, 'Northwind'),
+        ]
+        for index, (name, category, price, stock, brand) in enumerate(rows):
+            Product.objects.create(
+                name=name, description='Outdoor gear', category=category, price=price,
+                stock_quantity=stock, sku=f'GEAR-{index}', brand=brand
+            )
+
+    def test_facets_follow_the_result_set_in_one_query(self):
+        search_cache.clear()
+        with self.assertNumQueries(3):  # ranked ids, the page's products, then the facets
+            data = self.client.post(
+                '/api/products/search/?count=none', {'query': 'rain', 'facets': True}, format='json'
+            ).data
+        facets = data['facets']
+        self.assertEqual(facets['brands'], [{'brand': 'Northwind', 'count': 2}])
+        self.assertEqual([(c['name'], c['count']) for c in facets['categories']], [('Boots', 1), ('Jackets', 1)])
+        self.assertEqual(facets['in_stock'], 2)
+        counts = {(bucket['min'], bucket['max']): bucket['count'] for bucket in facets['price_ranges']}
+        self.assertEqual((counts[(Decimal(25), Decimal(50))], counts[(Decimal(50), Decimal(100))]), (1, 1))
+        self.assertEqual(sum(counts.values()), 2)
+
+    def test_facets_are_opt_in(self):
+        data = self.client.post('/api/products/search/', {'query': 'jacket'}, format='json').data
+        self.assertNotIn('facets', data)
+
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        self.bags = Category.objects.create(name='Bags')
+        self.bag = Product.objects.create(
+            name='Daypack', description='20 litre', category=self.bags,
+            price=60, sku='BAG-1', brand='Carryall', featured=True
+        )
+
+    def test_etag_revalidation_skips_the_database(self):
+        first = self.client.get('/api/products/featured/')
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            revalidated = self.client.get('/api/products/featured/', HTTP_IF_NONE_MATCH=etag)
+            cached = self.client.get('/api/products/featured/')
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['ETag'], etag)
+
+    def test_query_string_order_does_not_matter(self):
+        first = self.client.get('/api/products/?brand=Carryall&featured=true')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products/?featured=true&brand=Carryall')
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_catalog_writes_change_the_etag(self):
+        url = f'/api/products/{self.bag.id}/'
+        etag = self.client.get(url)['ETag']
+        self.bag.price = 55
+        self.bag.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['price'], '55.00')
+
+    def test_other_workers_see_a_write_within_the_version_max_age(self):
+        this_worker, other_worker = SharedCatalogVersion(max_age=2), SharedCatalogVersion(max_age=2)
+        with mock.patch('products.cache.time.monotonic', return_value=1000.0):
+            version = other_worker.get()
+            bumped = this_worker.bump()
+            self.assertGreater(bumped, version)
+            self.assertEqual(other_worker.get(), version)
+            # Concurrent bumps from different workers are not lost
+            self.assertGreater(other_worker.bump(), bumped)
+        with mock.patch('products.cache.time.monotonic', return_value=1002.5):
+            self.assertEqual(this_worker.get(), other_worker.get())
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        catalog_snapshot.invalidate()
+        self.addCleanup(catalog_snapshot.invalidate)
+        self.cameras = Category.objects.create(name='Cameras')
+        for index in range(3):
+            Product.objects.create(
+                name=f'Mirrorless camera {index}', description='x' * 2000, category=self.cameras,
+                price=Decimal('899.5') + index, rating=Decimal('4.1'), stock_quantity=index, sku=f'CAM-{index}',
+                brand='Shutter', featured=True, image_url='data:image/png;base64,' + 'A' * 4000
+            )
+
+    def test_compact_view_matches_the_full_serializer(self):
+        full = self.client.get('/api/products/', {'category': self.cameras.id}).json()['results']
+        compact = self.client.get('/api/products/', {'category': self.cameras.id, 'view': 'compact'}).json()['results']
+        self.assertEqual(compact, [{field: row[field] for field in COMPACT_PRODUCT_FIELDS} for row in full])
+
+    def test_fields_are_selected_on_every_listing(self):
+        created_at = ProductSerializer(Product.objects.get(sku='CAM-2')).data['created_at']
+        for response in [
+            self.client.get('/api/products/', {'fields': 'sku,price,created_at', 'sort_by': '-price'}),
+            self.client.get('/api/products/', {'fields': 'sku,price,created_at', 'sort_by': '-price', 'cursor': ''}),
+            self.client.post('/api/products/search/?fields=sku,price,created_at',
+                             {'query': 'mirrorless', 'sort_by': '-price'}, content_type='application/json'),
+            self.client.get('/api/products/featured/', {'fields': 'sku,price,created_at'}),
+        ]:
+            rows = response.json().get('results') or response.json()['products']
+            self.assertEqual(rows[0], {'sku': 'CAM-2', 'price': '901.50', 'created_at': created_at})
+            self.assertLess(len(response.content), 2000)
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get('/api/products/featured/', {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'][0])
+
+def data_uri(color, size=(640, 480), image_format='PNG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return f'data:image/{image_format.lower()};base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+class ProductAssetTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.shoes = Category.objects.create(name='Shoes')
+
+    def create(self, sku, image_url):
+        return Product.objects.create(
+            name='Runner', description='Road shoe', category=self.shoes,
+            price=90, sku=sku, brand='Stride', image_url=image_url
+        )
+
+    def test_inline_images_are_stored_by_content_hash(self):
+        product = self.create('SHOE-1', data_uri('red'))
+        self.assertRegex(product.image_url, r'^/api/products/assets/[0-9a-f]{32}\.png$')
+        self.assertEqual(self.create('SHOE-2', data_uri('red')).image_url, product.image_url)
+
+        response = self.client.get(product.image_url)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(Image.open(BytesIO(b''.join(response.streaming_content))).size, (640, 480))
+
+        thumbnail = self.client.get(product.thumbnail_url)
+        self.assertEqual(Image.open(BytesIO(b''.join(thumbnail.streaming_content))).size, (320, 320))
+        revalidated = self.client.get(product.thumbnail_url, HTTP_IF_NONE_MATCH=thumbnail['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_unknown_assets_are_not_found(self):
+        self.assertEqual(self.client.get('/api/products/assets/..%2Fsettings.py').status_code, 404)
+        self.assertEqual(self.client.get('/api/products/assets/' + '0' * 32 + '.png').status_code, 404)
+
+    def test_command_moves_existing_inline_images(self):
+        products = [self.create(f'SHOE-{index}', None) for index in range(3)]
+        Product.objects.filter(sku='SHOE-0').update(image_url=data_uri('blue', image_format='JPEG'))
+        Product.objects.filter(sku='SHOE-1').update(image_url=data_uri('green'))
+        Product.objects.filter(sku='SHOE-2').update(image_url='data:image/png;base64,bm90IGFuIGltYWdl')
+
+        stdout, stderr = StringIO(), StringIO()
+        call_command('migrate_product_images', batch_size=1, stdout=stdout, stderr=stderr)
+        self.assertIn('1 failed', stdout.getvalue())
+        self.assertFalse(Product.objects.exclude(sku='SHOE-2').filter(image_url__startswith='data:').exists())
+        self.assertIn(f'Product {products[2].id}', stderr.getvalue())
+        self.assertTrue(Product.objects.get(sku='SHOE-0').image_url.endswith('.jpg'))
+        self.assertTrue(Product.objects.get(sku='SHOE-2').image_url.startswith('data:'))
+
+class QueryPlanTests(TestCase):
+    """Every catalog view's SQL must reach products through an index, never a full table scan"""
+
+    LIST_URLS = [
+        '/api/products/',
+        '/api/products/?category={category}&sort_by=price',
+        '/api/products/?min_price=10&max_price=100&sort_by=-rating',
+        '/api/products/?featured=true',
+        '/api/products/?in_stock=true&sort_by=created_at',
+        '/api/products/?cursor=&sort_by=price',
+        '/api/products/?cursor=&sort_by=name',
+        '/api/products/featured/',
+        '/api/products/{product}/',
+    ]
+
+    def setUp(self):
+        # Exercise the SQL the views generate rather than the in-memory snapshot and caches
+        self.addCleanup(setattr, catalog_snapshot, 'enabled', catalog_snapshot.enabled)
+        catalog_snapshot.enabled = False
+        search_cache.clear()
+        self.lights = Category.objects.create(name='Lights')
+        self.lantern = Product.objects.create(
+            name='Camp lantern', description='LED', category=self.lights, price=30, sku='LANTERN-1', brand='Glow'
+        )
+
+    def assert_no_full_scans(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(full_scans(queries.captured_queries, ['products_product']), [])
+
+    def test_catalog_views_use_indexes(self):
+        for url in self.LIST_URLS:
+            url = url.format(category=self.lights.id, product=self.lantern.id)
+            with self.subTest(url=url):
+                self.assert_no_full_scans(lambda: self.client.get(url))
+
+    def test_search_uses_indexes(self):
+        searches = [
+            {'query': 'lantern'},
+            {'query': 'lantern', 'facets': True},
+            {'category': self.lights.id, 'max_price': 500},
+            {'in_stock': True, 'sort_by': 'price'},
+            {'featured': True, 'sort_by': '-rating'},
+            {},
+        ]
+        for body in searches:
+            with self.subTest(body=body):
+                search_cache.clear()
+                self.assert_no_full_scans(
+                    lambda: self.client.post('/api/products/search/', body, content_type='application/json')
+                )
+
+    def test_catalog_sync_reads_changed_rows_through_an_index(self):
+        changed = Product.objects.filter(updated_at__gte=timezone.now())
+        with CaptureQueriesContext(connection) as queries:
+            list(changed)
+        self.assertEqual(full_scans(queries.captured_queries, ['products_product']), [])
+
+class ImportCatalogTests(TestCase):
+    HEADER = 'sku,name,description,category,price,stock_quantity,brand,rating,featured\n'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.tents = Category.objects.create(name='Tents')
+        Product.objects.create(
+            name='Dome tent', description='2 person', category=self.tents,
+            price=150, rating=4.2, stock_quantity=2, sku='TENT-1', brand='Basecamp'
+        )
+        catalog_snapshot.invalidate()
+        search_cache.clear()
+
+    def feed(self, name, text):
+        path = os.path.join(self.directory, name)
+        with (gzip.open(path, 'wt') if name.endswith('.gz') else open(path, 'w')) as stream:
+            stream.write(text)
+        return path
+
+    def run_import(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', path, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_csv_rows_are_upserted_by_sku(self):
+        created_at = Product.objects.get(sku='TENT-1').created_at
+        count = Product.objects.count()
+        path = self.feed('feed.csv', self.HEADER + (
+            'TENT-1,Dome tent,2 person,tents,139.00,8,Basecamp,4.3,true\n'
+            'STOVE-1,Camp stove,"Folding\ngas stove",Stoves,45.50,3,Flame,4.6,\n'
+            'STOVE-2,Bad stove,,Stoves,cheap,1,Flame,4.0,\n'
+            ',No sku,,Stoves,10,1,Flame,4.0,\n'
+        ))
+        stdout, stderr = self.run_import(path, chunk_size=2)
+        self.assertIn('Imported 2 of 4 rows', stdout)
+        self.assertIn('1 new categories', stdout)
+        self.assertIn("Data row 3: price is not a number: 'cheap'", stderr)
+        self.assertIn('Data row 4: missing sku', stderr)
+        self.assertFalse(os.path.exists(f'{path}.checkpoint'))
+
+        tent = Product.objects.get(sku='TENT-1')
+        self.assertEqual((tent.price, tent.stock_quantity, tent.featured), (Decimal('139.00'), 8, True))
+        self.assertEqual((tent.category, tent.created_at), (self.tents, created_at))
+        self.assertEqual(Product.objects.count(), count + 1)
+
+        # Everything the save signals maintain is rebuilt afterwards
+        stoves = Category.objects.get(name='Stoves')
+        self.assertEqual(CategoryStats.objects.get(category=stoves).product_count, 1)
+        results = self.client.post('/api/products/search/', {'query': 'folding stove'},
+                                   content_type='application/json').json()['products']
+        self.assertEqual([product['sku'] for product in results], ['STOVE-1'])
+        self.assertEqual(self.client.get('/api/products/', {'category': stoves.id}).json()['count'], 1)
+
+    def test_gzipped_jsonl_keeps_the_last_row_per_sku(self):
+        rows = [
+            {'sku': 'LAMP-1', 'name': 'Headlamp', 'category': 'Lights', 'price': 20, 'brand': 'Glow'},
+            {'sku': 'LAMP-1', 'name': 'Headlamp', 'category': 'Lights', 'price': '18.5', 'brand': 'Glow',
+             'is_active': False},
+        ]
+        path = self.feed('feed.jsonl.gz', '\n'.join(json.dumps(row) for row in rows) + '\n\nnot json\n')
+        stdout, stderr = self.run_import(path)
+        self.assertIn('Imported 1 of 3 rows', stdout)
+        self.assertIn('Data row 3: invalid JSON', stderr)
+        lamp = Product.objects.get(sku='LAMP-1')
+        self.assertEqual((lamp.price, lamp.is_active), (Decimal('18.50'), False))
+
+    def test_failed_import_resumes_from_the_checkpoint(self):
+        path = self.feed('feed.csv', self.HEADER + ''.join(
+            f'BAG-{index},Dry bag {index},,Bags,{10 + index},1,Seal,4.0,\n' for index in range(5)
+        ))
+        with mock.patch('products.importing.upsert_products', side_effect=[2, RuntimeError('disk full')]):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, chunk_size=2)
+        with open(f'{path}.checkpoint') as stream:
+            self.assertEqual(json.load(stream)['rows'], 2)
+
+        with mock.patch('products.importing.upsert_products', wraps=upsert_products) as upsert:
+            stdout, _ = self.run_import(path, chunk_size=2, resume=True)
+        self.assertIn('Resuming after row 2', stdout)
+        self.assertEqual([len(call.args[0]) for call in upsert.call_args_list], [2, 1])
+        self.assertEqual(sorted(Product.objects.filter(brand='Seal').values_list('sku', flat=True)),
+                         ['BAG-2', 'BAG-3', 'BAG-4'])
+
+        self.feed('feed.csv', self.HEADER)
+        with open(f'{path}.checkpoint', 'w') as stream:
+            json.dump({'source': os.path.abspath(path), 'size': 1, 'rows': 2, 'imported': 2, 'errors': 0}, stream)
+        with self.assertRaises(CommandError):
+            self.run_import(path, resume=True)
+
+    def test_aborted_import_leaves_committed_rows_searchable_and_resumable(self):
+        path = self.feed('feed.csv', self.HEADER + (
+            'ROPE-1,Climbing rope,Dynamic rope,Ropes,120,2,Knot,4.5,\n'
+            'ROPE-2,Bad rope,,Ropes,free,1,Knot,4.0,\n'
+            'ROPE-3,Bad rope,,Ropes,gratis,1,Knot,4.0,\n'
+            'ROPE-4,Static rope,Static line,Ropes,90,2,Knot,4.1,\n'
+        ))
+        with self.assertRaisesMessage(CommandError, 'Aborted after 2 invalid rows'):
+            self.run_import(path, chunk_size=3, max_errors=1)
+        results = self.client.post('/api/products/search/', {'query': 'climbing rope'},
+                                   content_type='application/json').json()['products']
+        self.assertEqual([product['sku'] for product in results], ['ROPE-1'])
+
+        # The earlier run's errors do not count against the resumed one
+        stdout, _ = self.run_import(path, chunk_size=3, max_errors=1, resume=True)
+        self.assertIn('Imported 2 of 4 rows', stdout)
+        self.assertIn('2 invalid', stdout)
+        self.assertTrue(Product.objects.filter(sku='ROPE-4').exists())
+
+    def test_chunk_size_must_be_positive(self):
+        path = self.feed('feed.csv', self.HEADER)
+        for chunk_size in (0, -5):
+            with self.assertRaisesMessage(CommandError, '--chunk-size must be at least 1'):
+                self.run_import(path, chunk_size=chunk_size)
+
+class CatalogExportTests(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user('feeds', email='feeds@example.com', password='x', is_staff=True)
+        self.client.force_login(self.staff)
+        self.boots = Category.objects.create(name='Boots')
+        self.boot = Product.objects.create(
+            name='Hiking boot', description='Waterproof, "grippy" sole', category=self.boots,
+            price=120, rating=4.5, stock_quantity=3, sku='BOOT-1', brand='Trail'
+        )
+        self.retired = Product.objects.create(
+            name='Old boot', description='Discontinued', category=self.boots,
+            price=60, sku='BOOT-2', brand='Trail', is_active=False
+        )
+
+    def export(self, file_format='ndjson', **params):
+        response = self.client.get(f'/api/products/export.{file_format}', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_rows_match_the_product_payload(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = {row['sku']: row for row in map(json.loads, body.decode().splitlines())}
+        self.assertEqual(len(rows), Product.objects.filter(is_active=True).count())
+        self.assertNotIn('BOOT-2', rows)
+        self.assertEqual(rows['BOOT-1'], json.loads(json.dumps(ProductSerializer(self.boot).data)))
+
+    def test_csv_and_gzip(self):
+        _, body = self.export('csv')
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        boot = next(row for row in rows if row['sku'] == 'BOOT-1')
+        self.assertEqual((boot['description'], boot['category_name'], boot['price']),
+                         ('Waterproof, "grippy" sole', 'Boots', '120.00'))
+
+        response = self.client.get('/api/products/export.csv', HTTP_ACCEPT_ENCODING='br, gzip;q=0.8')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), body)
+
+    def test_updated_since_includes_deactivated_products(self):
+        since = timezone.now()
+        self.boot.is_active = False
+        self.boot.save()
+        with CaptureQueriesContext(connection) as queries:
+            _, body = self.export(updated_since=since.isoformat())
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([(row['sku'], row['is_active']) for row in rows], [('BOOT-1', False)])
+        self.assertEqual(full_scans(queries.captured_queries, ['products_product']), [])
+
+        self.assertEqual(self.client.get('/api/products/export.ndjson', {'updated_since': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/products/export.xml').status_code, 404)
+
+    def test_export_is_for_staff(self):
+        self.client.logout()
+        self.assertEqual(self.client.get('/api/products/export.ndjson').status_code, 401)
+        self.client.force_login(get_user_model().objects.create_user('shopper', email='shopper@example.com', password='x'))
+        self.assertEqual(self.client.get('/api/products/export.ndjson').status_code, 403)
+
+    def test_command_writes_a_gzipped_file(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'catalog.ndjson.gz')
+        stdout = StringIO()
+        call_command('export_catalog', output=path, chunk_size=1, stdout=stdout)
+        self.assertIn('--updated-since', stdout.getvalue())
+        with gzip.open(path, 'rt') as stream:
+            skus = [json.loads(line)['sku'] for line in stream]
+        self.assertEqual(skus, list(Product.objects.filter(is_active=True).order_by('id').values_list('sku', flat=True)))
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     CategoryListView, ProductListView, ProductDetailView,
-    search_products, get_brands, get_featured_products
+    search_products, search_cache_stats, get_brands, get_featured_products, product_asset, export_products
 )
 
 urlpatterns = [
@@ -9,6 +9,9 @@ urlpatterns = [
     path('', ProductListView.as_view(), name='product-list'),
     path('<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
     path('search/', search_products, name='product-search'),
+    path('search/stats/', search_cache_stats, name='product-search-stats'),
     path('brands/', get_brands, name='product-brands'),
     path('featured/', get_featured_products, name='featured-products'),
+    path('assets/<str:name>', product_asset, name='product-asset'),
+    path('export.<str:file_format>', export_products, name='product-export'),
 ]
\ No newline at end of file
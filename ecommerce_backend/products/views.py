@@ -1,22 +1,43 @@
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from django.db.models import Q
-from .models import Product, Category
-from .serializers import ProductSerializer, CategorySerializer, ProductSearchSerializer
+from rest_framework.utils.urls import replace_query_param
+from .assets import ASSET_NAME_PATTERN, CONTENT_TYPES, asset_path
+from .counting import result_counter
+from .exporting import FORMATS, accepts_gzip, parse_since, stream_catalog
+from .facets import facet_counts
+from .http_cache import cache_catalog_response
+from .models import Product, Category, BrandStats
+from .pagination import KeysetPagination
+from .search_cache import SearchResult, search_cache, search_params
+from .search_index import search_index
+from .snapshot import SnapshotResults, catalog_snapshot
+from .serializers import (
+    ProductSerializer, CategorySerializer, ProductSearchSerializer, BrandStatsSerializer, ProductFieldset,
+    SORT_CHOICES
+)
 
+@method_decorator(cache_catalog_response, name='dispatch')
 class CategoryListView(generics.ListAPIView):
-    queryset = Category.objects.all()
+    queryset = Category.objects.select_related('stats').order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [AllowAny]
 
+@method_decorator(cache_catalog_response, name='dispatch')
 class ProductListView(generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
+    fieldset = None
     
     def get_queryset(self):
         queryset = Product.objects.filter(is_active=True).select_related('category')
+        if self.fieldset:
+            queryset = self.fieldset.only(queryset, self.request.query_params.get('sort_by', '-created_at').lstrip('-'))
         
         # Filter parameters
         category = self.request.query_params.get('category')
@@ -42,11 +63,72 @@ class ProductListView(generics.ListAPIView):
             
         return queryset.order_by(sort_by)
 
+    def get_snapshot_results(self):
+        """Serve the request from the catalog snapshot when it supports the filters and order"""
+        params = self.request.query_params
+        sort_by = params.get('sort_by', '-created_at')
+        if not catalog_snapshot.supports(sort_by):
+            return None
+        try:
+            category = int(params['category']) if params.get('category') else None
+            min_price = float(params['min_price']) if params.get('min_price') else None
+            max_price = float(params['max_price']) if params.get('max_price') else None
+        except ValueError:
+            return None
+        queryset = Product.objects.select_related('category')
+        return SnapshotResults(
+            catalog_snapshot,
+            queryset=self.fieldset.only(queryset) if self.fieldset else queryset,
+            category=category,
+            min_price=min_price,
+            max_price=max_price,
+            brand=params.get('brand') or None,
+            in_stock=params.get('in_stock') == 'true',
+            featured=True if params.get('featured') == 'true' else None,
+            order_by=sort_by,
+        )
+
+    def list(self, request, *args, **kwargs):
+        # ``fields=a,b`` or ``view=compact`` select a sparse representation
+        self.fieldset = ProductFieldset.from_params(request.query_params)
+        if 'cursor' in request.query_params:
+            return self.list_by_cursor(request)
+        results = self.get_snapshot_results()
+        if results is None:
+            results = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(results)
+        return self.get_paginated_response(serialize_products(page, self.fieldset))
+
+    def list_by_cursor(self, request):
+        """Keyset-paginated listing, selected by passing ``cursor`` (empty for the first page)"""
+        sort_by = request.query_params.get('sort_by', '-created_at')
+        if sort_by not in SORT_CHOICES or sort_by == 'relevance':
+            return Response({'sort_by': ['Unsupported ordering for cursor pagination.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.paginator.page_size)), 100)
+        except ValueError:
+            page_size = self.paginator.page_size
+        paginator = KeysetPagination(sort_by, max(page_size, 1))
+        products, next_cursor = paginator.paginate(self.get_queryset(), request.query_params['cursor'])
+        return Response({
+            'next': replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor) if next_cursor else None,
+            'next_cursor': next_cursor,
+            'results': serialize_products(products, self.fieldset),
+        })
+
+@method_decorator(cache_catalog_response, name='dispatch')
 class ProductDetailView(generics.RetrieveAPIView):
     queryset = Product.objects.filter(is_active=True)
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
 
+def serialize_products(products, fieldset=None):
+    """Full serializer output, or the sparse fieldset representation when one was requested"""
+    if fieldset:
+        return fieldset.serialize(products)
+    return ProductSerializer(products, many=True).data
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def search_products(request):
@@ -56,17 +138,13 @@ def search_products(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     data = serializer.validated_data
+    fieldset = ProductFieldset.from_params(request.query_params)
     queryset = Product.objects.filter(is_active=True).select_related('category')
     
-    # Text search across multiple fields
+    # Full-text search across name, description, brand and category
     query = data.get('query', '').strip()
     if query:
-        queryset = queryset.filter(
-            Q(name__icontains=query) |
-            Q(description__icontains=query) |
-            Q(brand__icontains=query) |
-            Q(category__name__icontains=query)
-        )
+        queryset = search_index.search(queryset, query)
     
     # Apply filters
     if 'category' in data:
@@ -83,39 +161,139 @@ def search_products(request):
     if 'featured' in data:
         queryset = queryset.filter(featured=data['featured'])
     
-    # Sort results
-    sort_by = data.get('sort_by', '-created_at')
-    queryset = queryset.order_by(sort_by)
+    # Sort results, best matches first unless another order is requested
+    sort_by = data.get('sort_by') or ('relevance' if query else '-created_at')
+    if sort_by == 'relevance' and not query:
+        sort_by = '-rating'
+    page_size = min(int(request.query_params.get('page_size', 10)), 50)
+    
+    # Keyset pagination: pass ``cursor`` (empty for the first page)
+    if 'cursor' in request.query_params:
+        paginator = KeysetPagination(sort_by, page_size)
+        if fieldset:
+            queryset = fieldset.only(queryset, *([] if sort_by == 'relevance' else [paginator.field]))
+        products, next_cursor = paginator.paginate(queryset, request.query_params['cursor'])
+        return Response({
+            'products': serialize_products(products, fieldset),
+            'next_cursor': next_cursor,
+            'page_size': page_size,
+        })
+    
+    if sort_by == 'relevance':
+        queryset = queryset.order_by('search_rank', '-rating', 'id')
+    else:
+        queryset = queryset.order_by(sort_by, 'id')
     
     # Pagination
-    page_size = min(int(request.query_params.get('page_size', 10)), 50)
     page = int(request.query_params.get('page', 1))
     start = (page - 1) * page_size
     end = start + page_size
     
-    total_count = queryset.count()
-    products = queryset[start:end]
+    # Ranked ids and the total come from the shared search cache; pages past the cached ids query directly
+    count_filters = {key: value for key, value in data.items() if key not in ('sort_by', 'facets')}
+    result = search_cache.get(
+        search_params(count_filters, sort_by),
+        lambda limit: SearchResult.of(queryset, limit)
+    )
+    if end <= len(result.ids) or result.complete:
+        payloads = search_cache.payloads(result.ids[start:end])
+        products = fieldset.project(payloads) if fieldset else payloads
+    else:
+        products = serialize_products((fieldset.only(queryset) if fieldset else queryset)[start:end], fieldset)
     
-    return Response({
-        'products': ProductSerializer(products, many=True).data,
+    # Totals: cached exact count by default, ``count=estimate`` for a cheap estimate, ``count=none`` to skip
+    count_mode = request.query_params.get('count', 'exact')
+    is_estimate = False
+    if count_mode == 'none':
+        total_count = None
+    elif result.total is not None:
+        total_count = result.total
+    elif count_mode == 'estimate':
+        total_count, is_estimate = result_counter.estimate(queryset, count_filters)
+    else:
+        total_count = result_counter.exact(queryset, count_filters)
+    
+    response = {
+        'products': products,
         'total_count': total_count,
+        'is_estimate': is_estimate,
         'page': page,
         'page_size': page_size,
-        'total_pages': (total_count + page_size - 1) // page_size
-    })
+        'total_pages': (total_count + page_size - 1) // page_size if total_count is not None else None
+    }
+    # Filter sidebar counts for the whole result set, on request
+    if data.get('facets'):
+        response['facets'] = facet_counts(queryset)
+    return Response(response)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def search_cache_stats(request):
+    """Hit and eviction counters of the shared search result cache"""
+    return Response(search_cache.stats())
 
+@cache_catalog_response
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_brands(request):
-    """Get list of all available brands"""
-    brands = Product.objects.filter(is_active=True).values_list('brand', flat=True).distinct().order_by('brand')
-    return Response({'brands': list(brands)})
+    """Get list of all available brands, with their aggregates when ``stats=true``"""
+    brands = BrandStats.objects.filter(product_count__gt=0).order_by('brand')
+    if request.query_params.get('stats') == 'true':
+        return Response({'brands': BrandStatsSerializer(brands, many=True).data})
+    return Response({'brands': list(brands.values_list('brand', flat=True))})
 
+@cache_catalog_response
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_featured_products(request):
     """Get featured products"""
-    products = Product.objects.filter(is_active=True, featured=True).select_related('category')[:10]
+    fieldset = ProductFieldset.from_params(request.query_params)
+    products = Product.objects.filter(is_active=True, featured=True).select_related('category')
+    if fieldset:
+        products = fieldset.only(products)
     return Response({
-        'products': ProductSerializer(products, many=True).data
-    })
\ No newline at end of file
+        'products': serialize_products(products[:10], fieldset)
+    })
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def product_asset(request, name):
+    """Serve a content-addressed product image; its URL changes whenever its bytes do"""
+    if not ASSET_NAME_PATTERN.match(name) or not default_storage.exists(asset_path(name)):
+        raise Http404
+    etag = f'"{name}"'
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(
+            default_storage.open(asset_path(name)), content_type=CONTENT_TYPES[name.rsplit('.', 1)[1]]
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export_products(request, file_format):
+    """Stream the active catalog, or every product changed since ``updated_since``, as NDJSON or CSV"""
+    if file_format not in FORMATS:
+        raise Http404
+    updated_since = None
+    if request.query_params.get('updated_since'):
+        try:
+            updated_since = parse_since(request.query_params['updated_since'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Taken before the first row is read; the next incremental export starts here
+    exported_at = timezone.now()
+    compress = accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING'))
+    response = StreamingHttpResponse(
+        stream_catalog(file_format, updated_since, compress=compress), content_type=FORMATS[file_format]
+    )
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="catalog-{exported_at:%Y%m%dT%H%M%SZ}.{file_format}"'
+    response['X-Exported-At'] = exported_at.isoformat()
+    return response